@@ -0,0 +1 @@
+"""Benchmarks of epr on synthetic project directories."""
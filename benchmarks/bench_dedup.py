@@ -0,0 +1,154 @@
+"""Times duplicate detection of a card against the import index.
+
+Usage:
+    python -m benchmarks.bench_dedup --sizes 100 1000 --mean-kb 4096 --output dedup.json
+
+For every size a card of random files is imported into an empty index, then an
+identical copy of the card is checked, every file is a duplicate and is hashed in
+full together with its imported original, and finally a card of new files, which the
+size and partial hash steps let through reading little of them. The results are
+written as JSON, one record per size and case. hashed_bytes are the bytes read to
+find the duplicates, the first import adds only the partial hashes to the index.
+"""
+
+# Standard library imports
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import tempfile
+import timeit
+from datetime import UTC, datetime
+
+
+# Local application imports
+from abk_epr.dedup import DedupStage, ImportIndex
+from benchmarks.bench_epr import epr_version, revision
+
+
+SCHEMA_VERSION = 1
+DEFAULT_SIZES = [100, 1000]
+CASES = ["first_import", "same_card", "new_card"]
+
+
+def write_card(card_dir: str, file_count: int, mean_kb: int, rng: random.Random) -> list[str]:
+    """Writes file_count files of random content and size around mean_kb."""
+    os.makedirs(card_dir)
+    files = []
+    for index in range(file_count):
+        file_name = os.path.join(card_dir, f"IMG_{index:05}.CR2")
+        size = rng.randint(mean_kb * 512, mean_kb * 1536)
+        with open(file_name, "wb") as media_file:
+            media_file.write(rng.randbytes(size))
+        files.append(file_name)
+    return files
+
+
+def time_case(stage: DedupStage, files: list[str], record: bool) -> tuple[float, int, int]:
+    """Filters files, records the new ones if asked, returns seconds, duplicates and bytes."""
+    duplicates_before, hashed_before = stage.duplicate_count, stage.hashed_bytes
+    start = timeit.default_timer()
+    new_files = stage.filter(files)
+    if record:
+        for file_name in new_files:
+            stage.record(file_name, file_name)
+        stage.finish()
+    seconds = timeit.default_timer() - start
+    return seconds, stage.duplicate_count - duplicates_before, stage.hashed_bytes - hashed_before
+
+
+def bench_size(
+    work_dir: str, file_count: int, mean_kb: int, seed: int, logger: logging.Logger
+) -> list[dict]:
+    """Imports a card of file_count files, checks a copy and a new card, returns the records."""
+    size_dir = os.path.join(work_dir, str(file_count))
+    rng = random.Random(seed)  # noqa: S311
+    card = write_card(os.path.join(size_dir, "card"), file_count, mean_kb, rng)
+    copy_dir = os.path.join(size_dir, "copy")
+    shutil.copytree(os.path.dirname(card[0]), copy_dir)
+    copy = [os.path.join(copy_dir, os.path.basename(f)) for f in card]
+    new_card = write_card(os.path.join(size_dir, "new"), file_count, mean_kb, rng)
+    total_bytes = sum(os.path.getsize(f) for f in card)
+    records = []
+    index = ImportIndex(logger=logger, db_path=os.path.join(size_dir, "imports.sqlite3"))
+    stage = DedupStage(logger=logger, index=index)
+    try:
+        for case, files in zip(CASES, [card, copy, new_card], strict=True):
+            record = case == "first_import"
+            seconds, duplicates, hashed_bytes = time_case(stage, files, record)
+            logger.info(f"{file_count} files, {case}: {seconds:.3f} s, {duplicates} duplicates")
+            records.append(
+                {
+                    "files": file_count,
+                    "case": case,
+                    "seconds": round(seconds, 6),
+                    "files_per_second": round(file_count / seconds, 1) if seconds > 0 else None,
+                    "duplicates": duplicates,
+                    "hashed_bytes": hashed_bytes,
+                    "card_bytes": total_bytes,
+                }
+            )
+    finally:
+        stage.close()
+    return records
+
+
+def run(sizes: list[int], mean_kb: int, seed: int, work_dir: str | None = None) -> dict:
+    """Runs the benchmark for all sizes and returns the result document."""
+    logger = logging.getLogger("benchmarks")
+    results: list[dict] = []
+    base_dir = tempfile.mkdtemp(prefix="epr_bench_dedup_", dir=work_dir)
+    try:
+        for file_count in sizes:
+            results.extend(bench_size(base_dir, file_count, mean_kb, seed, logger))
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+    return {
+        "schema": SCHEMA_VERSION,
+        "epr_version": epr_version(),
+        "revision": revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+        "mean_kb": mean_kb,
+        "created": datetime.now(UTC).isoformat(timespec="seconds"),
+        "results": results,
+    }
+
+
+def format_table(document: dict) -> str:
+    """Formats the results as a text table, one row per size and case."""
+    rows = [f"{'files':>8}  {'case':<14}{'files/s':>12}{'hashed MB':>12}{'duplicates':>12}"]
+    for record in document["results"]:
+        files_per_second = record["files_per_second"] or 0.0
+        rows.append(
+            f"{record['files']:>8}  {record['case']:<14}{files_per_second:>12.1f}"
+            f"{record['hashed_bytes'] / 1024 / 1024:>12.1f}{record['duplicates']:>12}"
+        )
+    return "\n".join(rows)
+
+
+def main(args: list[str] | None = None) -> None:
+    """Parses the command line and runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--mean-kb", type=int, default=1024, help="mean file size in KiB")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=None, help="directory of the generated cards")
+    parser.add_argument("-o", "--output", default=None, help="JSON file of the results")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    options = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO if options.verbose else logging.WARNING, force=True)
+    document = run(options.sizes, options.mean_kb, options.seed, options.work_dir)
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(document, output, indent=2)
+    print(format_table(document))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Times the phases of epr on synthetic project directories of growing size.
+
+Usage:
+    python -m benchmarks.bench_epr --sizes 1000 10000 100000 --output results.json
+
+Metadata is read by a stub exiftool answering the stay_open protocol, and RAW files
+are converted by a stub DNG converter, so the numbers show the cost of epr itself.
+The results are written as JSON, one record per size and phase, to compare the
+scaling between releases.
+"""
+
+# Standard library imports
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import stat
+import subprocess  # noqa: S404
+import sys
+import tempfile
+import timeit
+from collections.abc import Callable
+from datetime import UTC, datetime
+from importlib import metadata
+from typing import Any
+
+
+# Local application imports
+import abk_epr
+from abk_epr.companion_index import CompanionIndex
+from abk_epr.epr import ExifRename, ListType
+from abk_epr.exif_reader import NativeExifSession
+from abk_epr.exif_session import ExifToolPool
+from benchmarks import stub_exiftool
+from benchmarks.corpus import make_project
+from benchmarks.stub_dng import StubDngConversionStage
+
+
+SCHEMA_VERSION = 1
+DEFAULT_SIZES = [1000, 10000, 100000]
+EXIF_BACKENDS = ["stub", "native", "exiftool"]
+PHASES = ["scan", "read_metadata", "classify", "read_image_dir", "rename", "convert", "delete"]
+
+
+def write_stub_exiftool(directory: str) -> str:
+    """Writes an executable starting the stub exiftool with this interpreter."""
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(abk_epr.__file__)))
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    executable = os.path.join(directory, "exiftool")
+    with open(executable, "w") as script:
+        script.write(
+            "#!/bin/sh\n"
+            f'PYTHONPATH="{src_dir}{os.pathsep}{repo_dir}" '
+            f'exec "{sys.executable}" -m {stub_exiftool.__name__} "$@"\n'
+        )
+    os.chmod(executable, os.stat(executable).st_mode | stat.S_IXUSR)
+    return executable
+
+
+def make_exif_session(backend: str, jobs: int, executable: str | None):
+    """Returns the metadata session of a backend."""
+    if backend == "exiftool":
+        return ExifToolPool(workers=jobs)
+    pool = ExifToolPool(workers=jobs, executable=executable)
+    return NativeExifSession(fallback_session=pool) if backend == "native" else pool
+
+
+def revision() -> str:
+    """Returns the git revision of the benchmarked tree, unknown outside of a checkout."""
+    try:
+        return subprocess.run(  # noqa: S603
+            ["git", "rev-parse", "--short", "HEAD"],  # noqa: S607
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def epr_version() -> str:
+    """Returns the installed version of abk_epr, unknown when running from the source tree."""
+    try:
+        return metadata.version("abk_epr")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+class PhaseTimer:
+    """Collects the wall clock time of the phases of one run."""
+
+    def __init__(self):
+        """PhaseTimer init."""
+        self.seconds: dict[str, float] = {}
+
+    def time(self, phase: str, function: Callable, *args) -> Any:
+        """Calls function and adds its run time to phase."""
+        start = timeit.default_timer()
+        result = function(*args)
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + timeit.default_timer() - start
+        return result
+
+    async def time_async(self, phase: str, coroutine) -> Any:
+        """Awaits coroutine and adds its run time to phase."""
+        start = timeit.default_timer()
+        result = await coroutine
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + timeit.default_timer() - start
+        return result
+
+
+async def run_phases(exif_rename: ExifRename, timer: PhaseTimer) -> int:
+    """Runs the steps of move_rename_convert_images one by one and returns the renamed count.
+
+    The steps are the ones of a non streaming run: scan, read metadata and classify
+    make up _read_image_dir, then renaming with conversions queued, draining the
+    conversion stage and deleting the converted RAW files. Conversions run while
+    files are renamed, convert is the time left to drain the stage afterwards.
+    """
+    stage = exif_rename._conversion_stage
+    exif_rename.open_image_dir()
+    try:
+        files = timer.time("scan", exif_rename._scan_image_dir)
+        companion_index = timer.time(
+            "scan", CompanionIndex, files, exif_rename._supported_raw_image_ext_list
+        )
+        metadata_list = timer.time("read_metadata", exif_rename._read_metadata, files)
+        list_collection = timer.time(
+            "classify", exif_rename._group_metadata, metadata_list, companion_index
+        )
+        timer.seconds["read_image_dir"] = sum(
+            timer.seconds[phase] for phase in ["scan", "read_metadata", "classify"]
+        )
+        for key, value in list_collection.items():
+            await timer.time_async("rename", exif_rename._move_and_rename_files(key, value))
+        await timer.time_async("convert", stage.join())
+        convert_list = list(exif_rename._convert_dirs.items())
+        timer.time("delete", exif_rename._delete_org_raw_files, convert_list)
+        if ListType.RAW_IMAGE_DICT.value in list_collection and not convert_list:
+            raise RuntimeError("raw files were renamed but no conversion was queued")
+    finally:
+        exif_rename.close_image_dir()
+    return exif_rename.renamed_count
+
+
+def bench_size(
+    work_dir: str, file_count: int, backend: str, jobs: int, seed: int, logger: logging.Logger
+) -> list[dict]:
+    """Generates a project of file_count files, runs epr on it and returns the records."""
+    size_dir = os.path.join(work_dir, str(file_count))
+    os.makedirs(size_dir)
+    start = timeit.default_timer()
+    project_dir, stats = make_project(size_dir, file_count, seed)
+    logger.info(f"generated {stats.total} files in {timeit.default_timer() - start:.1f} s")
+    executable = write_stub_exiftool(size_dir)
+    timer = PhaseTimer()
+    with make_exif_session(backend, jobs, executable) as exif_session:
+        exif_rename = ExifRename(
+            logger=logger,
+            op_dir=project_dir,
+            exiftool_session=exif_session,
+            conversion_stage=StubDngConversionStage(logger=logger),
+        )
+        renamed = asyncio.run(run_phases(exif_rename, timer))
+    logger.info(f"{file_count} files: {renamed} renamed")
+    return [
+        {
+            "files": stats.total,
+            "phase": phase,
+            "seconds": round(timer.seconds.get(phase, 0.0), 6),
+            "files_per_second": (
+                round(stats.total / timer.seconds[phase], 1) if timer.seconds.get(phase) else None
+            ),
+        }
+        for phase in PHASES
+    ]
+
+
+def run(
+    sizes: list[int], backend: str, jobs: int, seed: int, work_dir: str | None = None
+) -> dict:
+    """Runs the benchmark for all sizes and returns the result document."""
+    logger = logging.getLogger("benchmarks")
+    results: list[dict] = []
+    base_dir = tempfile.mkdtemp(prefix="epr_bench_", dir=work_dir)
+    try:
+        for file_count in sizes:
+            results.extend(bench_size(base_dir, file_count, backend, jobs, seed, logger))
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+    return {
+        "schema": SCHEMA_VERSION,
+        "epr_version": epr_version(),
+        "revision": revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "exif_backend": backend,
+        "jobs": jobs,
+        "seed": seed,
+        "created": datetime.now(UTC).isoformat(timespec="seconds"),
+        "results": results,
+    }
+
+
+def format_table(document: dict) -> str:
+    """Formats the results as a text table, one row per size and column per phase."""
+    rows = [f"{'files':>8}" + "".join(f"{phase:>15}" for phase in PHASES)]
+    by_size: dict[int, dict[str, float]] = {}
+    for record in document["results"]:
+        by_size.setdefault(record["files"], {})[record["phase"]] = record["seconds"]
+    for files, seconds in by_size.items():
+        rows.append(f"{files:>8}" + "".join(f"{seconds[phase]:>14.3f}s" for phase in PHASES))
+    return "\n".join(rows)
+
+
+def main(args: list[str] | None = None) -> None:
+    """Parses the command line and runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--exif", choices=EXIF_BACKENDS, default="stub")
+    parser.add_argument("--jobs", type=int, default=1, help="exiftool processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=None, help="directory of the generated projects")
+    parser.add_argument("--exiftool-delay-ms", type=float, default=0.0)
+    parser.add_argument("-o", "--output", default=None, help="JSON file of the results")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    options = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO if options.verbose else logging.WARNING, force=True)
+    os.environ[stub_exiftool.DELAY_ENV] = str(options.exiftool_delay_ms)
+    document = run(options.sizes, options.exif, options.jobs, options.seed, options.work_dir)
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(document, output, indent=2)
+    print(format_table(document))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Measures the memory epr keeps per file between reading metadata and renaming.
+
+Usage:
+    python -m benchmarks.bench_memory --sizes 10000 100000 --output memory.json
+
+The exiftool dicts read for a synthetic project are measured with tracemalloc,
+they are what epr used to keep, normalized in place, until the files were renamed.
+They are then classified into metadata records grouped by directory, which is what
+epr keeps now, and the dicts are released. The results are written as JSON, one
+record per size and layout.
+"""
+
+# Standard library imports
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import shutil
+import tempfile
+import tracemalloc
+from datetime import UTC, datetime
+
+
+# Local application imports
+from abk_epr.companion_index import CompanionIndex
+from abk_epr.epr import ExifRename
+from benchmarks.bench_epr import epr_version, make_exif_session, revision, write_stub_exiftool
+from benchmarks.corpus import make_project
+
+
+SCHEMA_VERSION = 1
+DEFAULT_SIZES = [1000, 10000, 100000]
+LAYOUTS = ["exiftool_dict", "record"]
+
+
+def traced_bytes() -> int:
+    """Returns the bytes currently allocated, after collecting garbage."""
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def measure(exif_rename: ExifRename) -> tuple[int, dict[str, int], int]:
+    """Reads and classifies the project, returns the files, bytes per layout and the peak."""
+    exif_rename.open_image_dir()
+    try:
+        files = exif_rename._scan_image_dir()
+        companion_index = CompanionIndex(files, exif_rename._supported_raw_image_ext_list)
+        tracemalloc.start()
+        try:
+            base = traced_bytes()
+            metadata_list = exif_rename._read_metadata(files)
+            dict_bytes = traced_bytes() - base
+            list_collection = exif_rename._group_metadata(metadata_list, companion_index)
+            del metadata_list
+            record_bytes = traced_bytes() - base
+            peak = tracemalloc.get_traced_memory()[1] - base
+        finally:
+            tracemalloc.stop()
+        del list_collection
+    finally:
+        exif_rename.close_image_dir()
+    return len(files), {"exiftool_dict": dict_bytes, "record": record_bytes}, peak
+
+
+def bench_size(work_dir: str, file_count: int, seed: int, logger: logging.Logger) -> list[dict]:
+    """Generates a project of file_count files, measures it and returns the records."""
+    size_dir = os.path.join(work_dir, str(file_count))
+    os.makedirs(size_dir)
+    project_dir, _ = make_project(size_dir, file_count, seed)
+    executable = write_stub_exiftool(size_dir)
+    with make_exif_session("native", 1, executable) as exif_session:
+        exif_rename = ExifRename(logger=logger, op_dir=project_dir, exiftool_session=exif_session)
+        files, layout_bytes, peak = measure(exif_rename)
+    logger.info(f"{files} files: {layout_bytes}, peak {peak}")
+    return [
+        {
+            "files": files,
+            "layout": layout,
+            "bytes": layout_bytes[layout],
+            "bytes_per_file": round(layout_bytes[layout] / files, 1),
+            "peak_bytes": peak,
+        }
+        for layout in LAYOUTS
+    ]
+
+
+def run(sizes: list[int], seed: int, work_dir: str | None = None) -> dict:
+    """Runs the benchmark for all sizes and returns the result document."""
+    logger = logging.getLogger("benchmarks")
+    results: list[dict] = []
+    base_dir = tempfile.mkdtemp(prefix="epr_bench_memory_", dir=work_dir)
+    try:
+        for file_count in sizes:
+            results.extend(bench_size(base_dir, file_count, seed, logger))
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+    return {
+        "schema": SCHEMA_VERSION,
+        "epr_version": epr_version(),
+        "revision": revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "created": datetime.now(UTC).isoformat(timespec="seconds"),
+        "results": results,
+    }
+
+
+def format_table(document: dict) -> str:
+    """Formats the results as a text table, one row per size and column per layout."""
+    rows = [f"{'files':>8}" + "".join(f"{layout + ' B/file':>22}" for layout in LAYOUTS)]
+    by_size: dict[int, dict[str, float]] = {}
+    for record in document["results"]:
+        by_size.setdefault(record["files"], {})[record["layout"]] = record["bytes_per_file"]
+    for files, per_file in by_size.items():
+        rows.append(f"{files:>8}" + "".join(f"{per_file[layout]:>22.1f}" for layout in LAYOUTS))
+    return "\n".join(rows)
+
+
+def main(args: list[str] | None = None) -> None:
+    """Parses the command line and runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=None, help="directory of the generated projects")
+    parser.add_argument("-o", "--output", default=None, help="JSON file of the results")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    options = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO if options.verbose else logging.WARNING, force=True)
+    document = run(options.sizes, options.seed, options.work_dir)
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(document, output, indent=2)
+    print(format_table(document))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Times the start of the epr command, to keep --version and short runs fast.
+
+Usage:
+    python -m benchmarks.bench_startup --repeat 20 --output startup.json
+
+Every case starts a fresh interpreter, the way the watcher and scripts start epr.
+The interpreter alone is measured as well, so the cost of epr is the difference.
+The results are written as JSON, one record per case, and the modules taking the
+longest to import are listed with -X importtime.
+"""
+
+# Standard library imports
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess  # noqa: S404
+import sys
+import timeit
+from datetime import UTC, datetime
+
+
+# Local application imports
+import abk_epr
+from benchmarks.bench_epr import epr_version, revision
+
+
+SCHEMA_VERSION = 1
+ENTRY_POINT = "from abk_epr.cli import main; main()"
+# case -> arguments of the interpreter
+CASES = {
+    "python": ["-c", "pass"],
+    "import_cli": ["-c", "import abk_epr.cli"],
+    "version": ["-c", ENTRY_POINT, "--version"],
+    "about": ["-c", ENTRY_POINT, "--about"],
+    "help": ["-c", ENTRY_POINT, "--help"],
+    "import_epr": ["-c", "import abk_epr.epr"],
+}
+
+
+def interpreter_env() -> dict[str, str]:
+    """Returns the environment of the timed interpreters, finding abk_epr in this tree."""
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(abk_epr.__file__)))
+    python_path = os.environ.get("PYTHONPATH")
+    return {
+        **os.environ,
+        "PYTHONPATH": f"{src_dir}{os.pathsep}{python_path}" if python_path else src_dir,
+    }
+
+
+def time_case(args: list[str], repeat: int, env: dict[str, str]) -> list[float]:
+    """Starts the interpreter repeat times and returns the wall clock seconds of each."""
+    seconds = []
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        subprocess.run(  # noqa: S603
+            [sys.executable, *args], capture_output=True, check=True, env=env
+        )
+        seconds.append(timeit.default_timer() - start)
+    return seconds
+
+
+def slowest_imports(args: list[str], env: dict[str, str], count: int) -> list[dict]:
+    """Returns the count modules with the longest cumulative import time of a case."""
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        check=True,
+        text=True,
+        env=env,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            imports.append({"module": fields[2].strip(), "cumulative_us": int(fields[1])})
+    return sorted(imports, key=lambda i: i["cumulative_us"], reverse=True)[:count]
+
+
+def run(cases: list[str], repeat: int, top_imports: int) -> dict:
+    """Times all cases and returns the result document."""
+    logger = logging.getLogger("benchmarks")
+    env = interpreter_env()
+    results = []
+    for case in cases:
+        seconds = time_case(CASES[case], repeat, env)
+        logger.info(f"{case}: {statistics.median(seconds) * 1000.0:.1f} ms")
+        record = {
+            "case": case,
+            "runs": repeat,
+            "min_ms": round(min(seconds) * 1000.0, 3),
+            "median_ms": round(statistics.median(seconds) * 1000.0, 3),
+        }
+        if top_imports:
+            record["slowest_imports"] = slowest_imports(CASES[case], env, top_imports)
+        results.append(record)
+    return {
+        "schema": SCHEMA_VERSION,
+        "epr_version": epr_version(),
+        "revision": revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": datetime.now(UTC).isoformat(timespec="seconds"),
+        "results": results,
+    }
+
+
+def format_table(document: dict) -> str:
+    """Formats the results as a text table, one row per case."""
+    baseline = next((r for r in document["results"] if r["case"] == "python"), None)
+    rows = [f"{'case':<12}{'min':>12}{'median':>12}{'over python':>14}"]
+    for record in document["results"]:
+        over = record["median_ms"] - baseline["median_ms"] if baseline else None
+        rows.append(
+            f"{record['case']:<12}{record['min_ms']:>10.1f}ms{record['median_ms']:>10.1f}ms"
+            + (f"{over:>12.1f}ms" if over is not None else "")
+        )
+    return "\n".join(rows)
+
+
+def main(args: list[str] | None = None) -> None:
+    """Parses the command line and runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=20, help="interpreter starts per case")
+    parser.add_argument(
+        "--top-imports", type=int, default=0, help="list the slowest imports of every case"
+    )
+    parser.add_argument("-o", "--output", default=None, help="JSON file of the results")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    options = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO if options.verbose else logging.WARNING, force=True)
+    document = run(options.cases, options.repeat, options.top_imports)
+    if options.output:
+        with open(options.output, "w") as output:
+            json.dump(document, output, indent=2)
+    print(format_table(document))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Synthetic project directories of tiny but valid media files."""
+
+# Standard library imports
+import os
+import random
+import struct
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+
+QUICKTIME_EPOCH = datetime(1904, 1, 1)
+START_TIME = datetime(2024, 1, 1, 8, 0, 0)
+PROJECT_DIR = "20240101_benchmark"
+
+# raw extension -> (make, model, byte order, TIFF magic)
+RAW_CAMERAS = {
+    "cr2": ("Canon", "Canon EOS R5", "<", 42),
+    "nef": ("NIKON CORPORATION", "NIKON Z 9", ">", 42),
+    "arw": ("SONY", "ILCE-7M4", "<", 42),
+    "pef": ("PENTAX", "PENTAX K-3 Mark III", "<", 42),
+    "rw2": ("Panasonic", "DC-GH6", "<", 0x55),
+    "dng": ("LEICA CAMERA AG", "LEICA Q2", "<", 42),
+}
+PHONE = ("Apple", "iPhone 15 Pro")
+VIDEO_EXT = ["mp4", "mov"]
+UNSUPPORTED_FILES = ["notes.txt", "track.gpx", "edit.xmp"]
+EXCLUDED_FILES = ["Thumbs.db", ".DS_Store"]
+
+
+@dataclass(slots=True)
+class CorpusStats:
+    """Number of files per kind in a generated project directory."""
+
+    raw: int = 0
+    companion_jpeg: int = 0
+    jpeg: int = 0
+    video: int = 0
+    unsupported: int = 0
+    excluded: int = 0
+    burst: int = 0
+    by_ext: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total(self) -> int:
+        """Number of files written."""
+        return sum(
+            [
+                self.raw,
+                self.companion_jpeg,
+                self.jpeg,
+                self.video,
+                self.unsupported,
+                self.excluded,
+            ]
+        )
+
+
+def tiff(
+    make: str,
+    model: str,
+    create_date: str,
+    sub_sec: str | None = None,
+    endian: str = "<",
+    magic: int = 42,
+) -> bytes:
+    """TIFF structure with Make/Model in IFD0 and CreateDate/SubSec in the Exif IFD."""
+    ifd0_entries = [(0x010F, make), (0x0110, model)]
+    exif_entries = [(0x9004, create_date)]
+    if sub_sec is not None:
+        exif_entries.append((0x9291, sub_sec))
+    ifd0_size = 2 + 12 * (len(ifd0_entries) + 1) + 4
+    exif_offset = 8 + ifd0_size
+    data_offset = exif_offset + 2 + 12 * len(exif_entries) + 4
+    values = b""
+
+    def ifd(entries: list[tuple[int, str]], pointer: int | None) -> bytes:
+        nonlocal values
+        body = struct.pack(f"{endian}H", len(entries) + (pointer is not None))
+        for tag, text in entries:
+            value = text.encode() + b"\x00"
+            if len(value) <= 4:
+                field_value = value.ljust(4, b"\x00")
+            else:
+                field_value = struct.pack(f"{endian}I", data_offset + len(values))
+                values += value
+            body += struct.pack(f"{endian}HHI", tag, 2, len(value)) + field_value
+        if pointer is not None:
+            body += struct.pack(f"{endian}HHII", 0x8769, 4, 1, pointer)
+        return body + struct.pack(f"{endian}I", 0)
+
+    ifd0 = ifd(ifd0_entries, exif_offset)
+    exif_ifd = ifd(exif_entries, None)
+    byte_order = b"II" if endian == "<" else b"MM"
+    return byte_order + struct.pack(f"{endian}HI", magic, 8) + ifd0 + exif_ifd + values
+
+
+def jpeg(make: str, model: str, create_date: str, sub_sec: str | None = None) -> bytes:
+    """Minimal JPEG with a JFIF APP0 segment and the Exif APP1 segment."""
+    app0 = b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    app1 = b"Exif\x00\x00" + tiff(make, model, create_date, sub_sec, ">")
+    return (
+        b"\xff\xd8\xff\xe0"
+        + struct.pack(">H", len(app0) + 2)
+        + app0
+        + b"\xff\xe1"
+        + struct.pack(">H", len(app1) + 2)
+        + app1
+        + b"\xff\xda\x00\x02"
+        + b"\x00" * 64
+        + b"\xff\xd9"
+    )
+
+
+def video(created: datetime) -> bytes:
+    """Minimal QuickTime file with a movie header and an empty media data box."""
+
+    def box(box_type: bytes, payload: bytes) -> bytes:
+        return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+    seconds = int((created - QUICKTIME_EPOCH).total_seconds())
+    mvhd = box(b"mvhd", bytes(4) + struct.pack(">II", seconds, seconds) + bytes(80))
+    return box(b"ftyp", b"qt  \x00\x00\x00\x00qt  ") + box(b"moov", mvhd) + box(b"mdat", b"")
+
+
+def make_project(root: str, file_count: int, seed: int = 0) -> tuple[str, CorpusStats]:
+    """Writes a project directory with about file_count files below root.
+
+    The mix is deterministic for a seed: RAW files of several makes, half of them
+    with a companion JPEG, standalone phone JPEGs, videos with only the QuickTime
+    creation time, a few unsupported and excluded files, and bursts of files taken
+    in the same second, with and without sub seconds.
+
+    Args:
+        root (str): directory the project directory is created in
+        file_count (int): number of files to write
+        seed (int): seed of the random generator
+
+    Returns:
+        tuple[str, CorpusStats]: path of the project directory and the file counts
+    """
+    rng = random.Random(seed)  # noqa: S311
+    project_dir = os.path.join(root, PROJECT_DIR)
+    os.makedirs(project_dir)
+    stats = CorpusStats()
+    taken = START_TIME
+    index = 0
+
+    def write(file_name: str, content: bytes) -> None:
+        with open(os.path.join(project_dir, file_name), "wb") as media_file:
+            media_file.write(content)
+        ext = file_name.rsplit(".", 1)[-1].lower()
+        stats.by_ext[ext] = stats.by_ext.get(ext, 0) + 1
+
+    while stats.total < file_count:
+        index += 1
+        taken += timedelta(seconds=rng.randint(1, 30))
+        create_date = taken.strftime("%Y:%m:%d %H:%M:%S")
+        stem = f"IMG_{index:06}"
+        kind = rng.random()
+        if kind < 0.45:
+            ext = rng.choice(sorted(RAW_CAMERAS))
+            make, model, endian, magic = RAW_CAMERAS[ext]
+            burst = rng.random() < 0.1
+            shots = min(rng.randint(2, 5) if burst else 1, file_count - stats.total)
+            with_sub_sec = rng.random() < 0.5
+            for shot in range(shots):
+                sub_sec = f"{shot * 20:02}" if with_sub_sec else None
+                write(
+                    f"{stem}_{shot}.{ext}", tiff(make, model, create_date, sub_sec, endian, magic)
+                )
+                stats.raw += 1
+                stats.burst += burst
+                if rng.random() < 0.5 and stats.total < file_count:
+                    write(f"{stem}_{shot}.JPG", jpeg(make, model, create_date, sub_sec))
+                    stats.companion_jpeg += 1
+        elif kind < 0.85:
+            write(f"{stem}.jpg", jpeg(*PHONE, create_date, f"{rng.randint(0, 999):03}"))
+            stats.jpeg += 1
+        elif kind < 0.97:
+            write(f"{stem}.{rng.choice(VIDEO_EXT)}", video(taken))
+            stats.video += 1
+        elif kind < 0.99:
+            write(f"{stem}_{rng.choice(UNSUPPORTED_FILES)}", b"benchmark")
+            stats.unsupported += 1
+        else:
+            write(f"._{stem}_{rng.choice(EXCLUDED_FILES)}", b"benchmark")
+            stats.excluded += 1
+    return project_dir, stats
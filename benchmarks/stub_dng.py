@@ -0,0 +1,37 @@
+"""Stand-in for Adobe DNG Converter, writing minimal DNG files."""
+
+# Standard library imports
+import os
+import struct
+from pathlib import Path
+
+
+# Local application imports
+from abk_epr.dng_conversion import DngConversionStage
+from abk_epr.dng_verify import DngVerifier
+
+
+def minimal_dng() -> bytes:
+    """Smallest DNG the verifier accepts: IFD0 with DNGVersion, padded to the minimum size."""
+    dng_version = struct.pack("<HHI4B", DngVerifier.DNG_VERSION_TAG, 1, 4, 1, 4, 0, 0)
+    header = b"II" + struct.pack("<HI", 42, 8) + struct.pack("<H", 1) + dng_version
+    header += struct.pack("<I", 0)
+    return header.ljust(DngVerifier.DEFAULT_MIN_SIZE, b"\x00")
+
+
+class StubDngConversionStage(DngConversionStage):
+    """DngConversionStage whose conversion writes a minimal DNG instead of running Adobe.
+
+    Queueing, prioritisation, the memory budget and result reporting are the ones of
+    the real stage, only the converter process is left out.
+    """
+
+    DNG = minimal_dng()
+
+    async def _convert_file(self, raw_file: str, dng_dir: str) -> str:
+        """Writes the minimal DNG for raw_file into dng_dir and returns its name."""
+        os.makedirs(dng_dir, exist_ok=True)
+        dng_file = os.path.join(dng_dir, Path(raw_file).with_suffix(".dng").name)
+        with open(dng_file, "wb") as dng:
+            dng.write(self.DNG)
+        return dng_file
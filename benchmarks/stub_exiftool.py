@@ -0,0 +1,70 @@
+"""Stand-in for exiftool -stay_open, answering the requests of PyExifTool.
+
+Reads argument files from stdin the way exiftool -@ - does, executes -ver and -j
+requests with ExifReader, and prints the {ready} and -echo4 synchronisation
+sequences. EPR_STUB_EXIFTOOL_DELAY_MS adds a delay per file read, to model the
+cost of the real exiftool.
+"""
+
+# Standard library imports
+import json
+import os
+import sys
+import time
+
+
+# Local application imports
+from abk_epr.exif_reader import ExifReader
+
+
+VERSION = "12.70"
+DELAY_ENV = "EPR_STUB_EXIFTOOL_DELAY_MS"
+# options of the common arguments and requests without a value
+FLAG_OPTIONS = {"-G", "-n", "-j"}
+
+
+def execute(args: list[str], reader: ExifReader, delay: float) -> str:
+    """Returns the standard output of one request."""
+    if "-ver" in args:
+        return f"{VERSION}\n"
+    tags = [arg[1:] for arg in args if arg.startswith("-") and arg not in FLAG_OPTIONS]
+    files = [arg for arg in args if not arg.startswith("-")]
+    metadata_list = []
+    for file_name in files:
+        if not os.path.isfile(file_name):
+            continue
+        if delay:
+            time.sleep(delay)
+        metadata = reader.read(file_name, [t for t in tags if t in reader.SUPPORTED_TAGS])
+        metadata_list.append(metadata or {ExifReader.SOURCE_FILE: file_name})
+    return json.dumps(metadata_list) + "\n" if metadata_list else ""
+
+
+def main() -> None:
+    """Serves requests until -stay_open False or the end of stdin."""
+    reader = ExifReader()
+    delay = float(os.environ.get(DELAY_ENV, "0")) / 1000.0
+    args: list[str] = []
+    echo_next = False
+    echo4 = ""
+    for line in sys.stdin:
+        arg = line.rstrip("\n")
+        if echo_next:
+            echo4, echo_next = arg, False
+        elif arg == "-echo4":
+            echo_next = True
+        elif arg.startswith("-execute"):
+            sys.stdout.write(execute(args, reader, delay))
+            sys.stdout.write(f"{{ready{arg[len('-execute') :]}}}\n")
+            sys.stdout.flush()
+            sys.stderr.write(echo4.replace("${status}", "0") + "\n")
+            sys.stderr.flush()
+            args, echo4 = [], ""
+        elif args == ["-stay_open"] and arg == "False":
+            return
+        else:
+            args.append(arg)
+
+
+if __name__ == "__main__":
+    main()
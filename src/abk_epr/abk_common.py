@@ -2,6 +2,8 @@
 """Common functionality."""
 
 # Standard library imports
+import functools
+import inspect
 import logging
 import timeit
 
@@ -11,19 +13,43 @@ from colorama import Fore
 
 
 # Local application imports
+from abk_epr.tracing import tracer
 
 
 def function_trace(original_function):
     """Decorator function to help to trace function call entry and exit.
 
+    Coroutine functions get an async wrapper, so the exit is traced when the coroutine
+    has finished and not when it was created. With debug logging and the tracer off,
+    the wrapper only checks both and calls the function.
+
     Args:
         original_function (_type_): function above which the decorater is defined
     """
+    _logger = logging.getLogger(original_function.__name__)
+    span_name = original_function.__qualname__
+
+    if inspect.iscoroutinefunction(original_function):
+
+        @functools.wraps(original_function)
+        async def async_function_wrapper(*args, **kwargs):
+            if not tracer.enabled and not _logger.isEnabledFor(logging.DEBUG):
+                return await original_function(*args, **kwargs)
+            _logger.debug(f"{Fore.CYAN}-> {original_function.__name__}{Fore.RESET}")
+            with tracer.span(span_name):
+                result = await original_function(*args, **kwargs)
+            _logger.debug(f"{Fore.CYAN}<- {original_function.__name__}{Fore.RESET}\n")
+            return result
+
+        return async_function_wrapper
 
+    @functools.wraps(original_function)
     def function_wrapper(*args, **kwargs):
-        _logger = logging.getLogger(original_function.__name__)
+        if not tracer.enabled and not _logger.isEnabledFor(logging.DEBUG):
+            return original_function(*args, **kwargs)
         _logger.debug(f"{Fore.CYAN}-> {original_function.__name__}{Fore.RESET}")
-        result = original_function(*args, **kwargs)
+        with tracer.span(span_name):
+            result = original_function(*args, **kwargs)
         _logger.debug(f"{Fore.CYAN}<- {original_function.__name__}{Fore.RESET}\n")
         return result
 
@@ -0,0 +1,118 @@
+"""Batch mode, processing all project directories below a root directory."""
+
+# Standard library imports
+import logging
+import os
+import timeit
+from collections.abc import Callable
+from dataclasses import dataclass
+
+
+# Local application imports
+from abk_epr.abk_common import function_trace
+from abk_epr.epr import ExifRename
+
+
+@dataclass(slots=True)
+class ProjectSummary:
+    """Outcome of processing one project directory."""
+
+    project_dir: str
+    renamed: int = 0
+    converted: int = 0
+    elapsed_s: float = 0.0
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        """True if the project was processed without error."""
+        return not self.error
+
+
+class BatchRunner:
+    """BatchRunner finds every YYYYMMDD_name project below a root and processes them in turn.
+
+    All projects go through ExifRename instances created by make_exif_rename, which
+    share one exiftool pool, file mover and conversion stage, so the workers stay
+    warm from one project to the next. Projects are scanned and renamed one after the
+    other while the RAW files of earlier projects are still converted, the conversion
+    stage is joined once after the last project, then the DNGs of every project are
+    verified and its RAW files deleted.
+    """
+
+    def __init__(
+        self, logger: logging.Logger, root_dir: str, make_exif_rename: Callable[[str], ExifRename]
+    ):
+        """BatchRunner init."""
+        self._logger = logger or logging.getLogger(__name__)
+        self._root_dir = root_dir
+        self._make_exif_rename = make_exif_rename
+
+    @staticmethod
+    def find_project_dirs(root_dir: str) -> list[str]:
+        """Returns sorted absolute paths of project directories below root_dir.
+
+        The search does not descend into a project directory, its sub directories are
+        the camera directories created by previous runs.
+        """
+        project_dirs = []
+        for dir_path, dir_names, _ in os.walk(os.path.abspath(root_dir)):
+            if ExifRename.is_project_dir(dir_path):
+                project_dirs.append(dir_path)
+                dir_names.clear()
+            else:
+                dir_names[:] = [d for d in dir_names if not d.startswith(".")]
+        return sorted(project_dirs)
+
+    @function_trace
+    async def run(self) -> list[ProjectSummary]:
+        """Processes all project directories and logs a summary per project and in total."""
+        project_dirs = self.find_project_dirs(self._root_dir)
+        if not project_dirs:
+            raise Exception(f"no project directories found in: {self._root_dir}")
+        self._logger.info(f"batch: {len(project_dirs)} projects in {self._root_dir}")
+
+        runs: list[tuple[ProjectSummary, ExifRename]] = []
+        batch_start = timeit.default_timer()
+        for project_dir in project_dirs:
+            summary = ProjectSummary(project_dir)
+            exif_rename = self._make_exif_rename(project_dir)
+            start = timeit.default_timer()
+            try:
+                await exif_rename.move_rename_convert_images(defer_conversion=True)
+            except Exception as exception:
+                exif_rename.return_to_previous_state()
+                summary.error = str(exception)
+            summary.elapsed_s = timeit.default_timer() - start
+            runs.append((summary, exif_rename))
+
+        # projects share a conversion stage, unless make_exif_rename gives each its own
+        stages = {id(run.conversion_stage): run.conversion_stage for _, run in runs}
+        for stage in stages.values():
+            await stage.join()
+        summaries = []
+        for summary, exif_rename in runs:
+            start = timeit.default_timer()
+            try:
+                await exif_rename.finish_conversion()
+            except Exception as exception:
+                exif_rename.return_to_previous_state()
+                summary.error = summary.error or str(exception)
+            summary.elapsed_s += timeit.default_timer() - start
+            summary.renamed = exif_rename.renamed_count
+            summary.converted = sum(1 for result in exif_rename.verify_results if result.ok)
+            summaries.append(summary)
+            self._logger.info(
+                f"batch: {summary.project_dir}: {summary.renamed} renamed, {summary.converted} "
+                f"converted in {summary.elapsed_s:.1f} s"
+                + (f", ERROR: {summary.error}" if summary.error else "")
+            )
+
+        elapsed = timeit.default_timer() - batch_start
+        renamed = sum(summary.renamed for summary in summaries)
+        failed = sum(1 for summary in summaries if not summary.ok)
+        self._logger.info(
+            f"batch: {len(summaries)} projects, {failed} failed, {renamed} files in "
+            f"{elapsed:.1f} s ({renamed / elapsed if elapsed > 0 else 0.0:.1f} files/s)"
+        )
+        return summaries
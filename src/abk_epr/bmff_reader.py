@@ -0,0 +1,169 @@
+"""Box parser of ISO base media files (CR3, HEIC, MP4/MOV) reading only metadata boxes."""
+
+# Standard library imports
+import struct
+from collections.abc import Callable, Iterator
+from datetime import datetime, timedelta
+
+
+class BmffReader:
+    """BmffReader finds the creation time, make and model in ISO base media files.
+
+    Boxes are walked by their headers only, large boxes like mdat are skipped without
+    being read. The movie header moov/mvhd gives the QuickTime creation time, Canon CR3
+    files keep TIFF IFDs in the CMT1 and CMT2 boxes of the Canon uuid box in moov, and
+    HEIC files keep the Exif item listed in meta/iinf at the place meta/iloc points to.
+    The TIFF structures are handed to read_tiff of the caller.
+    """
+
+    CREATE_DATE = "QuickTime:CreateDate"
+    FTYP = b"ftyp"
+    CANON_UUID = bytes.fromhex("85c0b687820f11e08111f4ce462b6a48")
+    # seconds between 1904-01-01, the QuickTime epoch, and the creation time
+    QUICKTIME_EPOCH = datetime(1904, 1, 1)
+    ZERO_DATE = "0000:00:00 00:00:00"
+    MAX_BOXES = 4096
+
+    def __init__(self, read_tiff: Callable[[bytes, int, str], dict | None]):
+        """BmffReader init.
+
+        Args:
+            read_tiff (Callable): reads a TIFF structure at an offset of the data, the
+                third argument is "ifd0" for IFD0 tags or "exif" for Exif IFD tags
+        """
+        self._read_tiff = read_tiff
+
+    @classmethod
+    def is_bmff(cls, data) -> bool:
+        """True if the data starts with a file type box."""
+        return data[4:8] == cls.FTYP
+
+    def read(self, data) -> dict | None:
+        """Returns the tags found in the file, None if its box structure is broken."""
+        values: dict = {}
+        for box_type, start, end in self._boxes(data, 0, len(data)):
+            if box_type == b"moov":
+                self._read_moov(data, start, end, values)
+            elif box_type == b"meta":
+                self._read_heif_meta(data, start + 4, end, values)
+        return values
+
+    def _read_moov(self, data, start: int, end: int, values: dict) -> None:
+        """Reads the movie header and the Canon CMT boxes."""
+        for box_type, box_start, box_end in self._boxes(data, start, end):
+            if box_type == b"mvhd":
+                values[self.CREATE_DATE] = self._mvhd_create_date(data, box_start)
+            elif box_type == b"uuid" and data[box_start : box_start + 16] == self.CANON_UUID:
+                for cmt_type, cmt_start, _ in self._boxes(data, box_start + 16, box_end):
+                    if cmt_type == b"CMT1":
+                        values.update(self._read_tiff(data, cmt_start, "ifd0") or {})
+                    elif cmt_type == b"CMT2":
+                        values.update(self._read_tiff(data, cmt_start, "exif") or {})
+
+    def _mvhd_create_date(self, data, start: int) -> str:
+        """Returns the creation time of the movie header as exiftool formats it."""
+        version = data[start]
+        if version == 1:
+            (seconds,) = struct.unpack_from(">Q", data, start + 4)
+        else:
+            (seconds,) = struct.unpack_from(">I", data, start + 4)
+        if seconds == 0:
+            return self.ZERO_DATE
+        create_date = self.QUICKTIME_EPOCH + timedelta(seconds=seconds)
+        return create_date.strftime("%Y:%m:%d %H:%M:%S")
+
+    def _read_heif_meta(self, data, start: int, end: int, values: dict) -> None:
+        """Reads the Exif item of a HEIF meta box."""
+        exif_item_id = None
+        locations: dict[int, tuple[int, int]] = {}
+        for box_type, box_start, box_end in self._boxes(data, start, end):
+            if box_type == b"iinf":
+                exif_item_id = self._exif_item_id(data, box_start, box_end)
+            elif box_type == b"iloc":
+                locations = self._item_locations(data, box_start)
+        if exif_item_id is None or exif_item_id not in locations:
+            return
+        offset, length = locations[exif_item_id]
+        if offset + length > len(data) or length < 4:
+            raise ValueError("Exif item beyond end of file")
+        # the item starts with the offset of the TIFF header behind this field
+        (tiff_header_offset,) = struct.unpack_from(">I", data, offset)
+        values.update(self._read_tiff(data, offset + 4 + tiff_header_offset, "ifd0") or {})
+
+    def _exif_item_id(self, data, start: int, end: int) -> int | None:
+        """Returns the id of the Exif item listed in an iinf box."""
+        version = data[start]
+        entries_start = start + 4 + (2 if version == 0 else 4)
+        for box_type, box_start, _ in self._boxes(data, entries_start, end):
+            if box_type != b"infe" or data[box_start] < 2:
+                continue
+            if data[box_start] == 2:
+                (item_id,) = struct.unpack_from(">H", data, box_start + 4)
+                item_type = data[box_start + 8 : box_start + 12]
+            else:
+                (item_id,) = struct.unpack_from(">I", data, box_start + 4)
+                item_type = data[box_start + 10 : box_start + 14]
+            if item_type == b"Exif":
+                return item_id
+        return None
+
+    def _item_locations(self, data, start: int) -> dict[int, tuple[int, int]]:
+        """Returns item id -> (file offset, length) of the first extent of items in the file."""
+        version = data[start]
+        offset = start + 4
+        sizes, index_sizes = data[offset], data[offset + 1]
+        offset_size, length_size = sizes >> 4, sizes & 0x0F
+        base_offset_size = index_sizes >> 4
+        index_size = index_sizes & 0x0F if version in (1, 2) else 0
+        offset += 2
+        if version < 2:
+            (item_count,) = struct.unpack_from(">H", data, offset)
+            offset += 2
+        else:
+            (item_count,) = struct.unpack_from(">I", data, offset)
+            offset += 4
+        locations = {}
+        for _ in range(item_count):
+            item_id, offset = self._read_uint(data, offset, 2 if version < 2 else 4)
+            construction_method = 0
+            if version in (1, 2):
+                construction_method = data[offset + 1] & 0x0F
+                offset += 2
+            offset += 2  # data reference index
+            base_offset, offset = self._read_uint(data, offset, base_offset_size)
+            (extent_count,) = struct.unpack_from(">H", data, offset)
+            offset += 2
+            for extent in range(extent_count):
+                offset += index_size
+                extent_offset, offset = self._read_uint(data, offset, offset_size)
+                extent_length, offset = self._read_uint(data, offset, length_size)
+                if extent == 0 and construction_method == 0:
+                    locations[item_id] = (base_offset + extent_offset, extent_length)
+        return locations
+
+    @staticmethod
+    def _read_uint(data, offset: int, size: int) -> tuple[int, int]:
+        """Reads a big endian unsigned integer of 0, 2, 4 or 8 bytes."""
+        if size == 0:
+            return 0, offset
+        value_format = {2: ">H", 4: ">I", 8: ">Q"}[size]
+        return struct.unpack_from(value_format, data, offset)[0], offset + size
+
+    def _boxes(self, data, start: int, end: int) -> Iterator[tuple[bytes, int, int]]:
+        """Yields (type, payload start, payload end) of the boxes between start and end."""
+        offset = start
+        for _ in range(self.MAX_BOXES):
+            if offset + 8 > end:
+                return
+            size, box_type = struct.unpack_from(">I4s", data, offset)
+            header_size = 8
+            if size == 1:
+                (size,) = struct.unpack_from(">Q", data, offset + 8)
+                header_size = 16
+            elif size == 0:
+                size = end - offset
+            if size < header_size or offset + size > end:
+                raise ValueError(f"broken box {box_type!r} at offset {offset}")
+            yield box_type, offset + header_size, offset + size
+            offset += size
+        raise ValueError("too many boxes")
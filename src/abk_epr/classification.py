@@ -0,0 +1,204 @@
+"""Classification rules mapping file extensions to list type, vendor and target directory."""
+
+# Standard library imports
+import os
+import re
+from dataclasses import dataclass
+from enum import Enum
+
+
+class ListType(Enum):
+    """ListType is type of image or video list."""
+
+    RAW_IMAGE_DICT = "raw_image_dict"
+    THUMB_IMAGE_DICT = "thumb_image_dict"
+    COMPRESSED_IMAGE_DICT = "compressed_image_dict"
+    COMPRESSED_VIDEO_DICT = "compressed_video_dict"
+
+
+@dataclass(slots=True, frozen=True)
+class ExtensionRule:
+    """How files of one extension are classified.
+
+    vendor is the make of RAW files without make in their metadata, dir_ext the
+    extension of their target directory. companion is the rule of files having a RAW
+    file with the same stem, a JPEG next to a RAW file is its thumbnail.
+    """
+
+    list_type: ListType
+    dir_ext: str
+    vendor: str | None = None
+    companion: "ExtensionRule | None" = None
+
+
+class ClassificationRules:
+    r"""ClassificationRules compiles the supported formats into one extension table.
+
+    Every extension maps to its rule, so classifying a file is one dictionary lookup
+    however many formats are supported, and the exclusion expressions are compiled
+    into a single pattern. A TOML rules file extends the built in rules, its
+    extensions replace the built in rule of the same extension:
+
+        compressed_image = ["webp", "avif"]
+        compressed_video = ["mkv"]
+        exclude = ['\.tmp$']
+
+        [raw]
+        Hasselblad = ["3fr", "fff"]
+
+    Exclusion expressions are matched at the start of the file name.
+    """
+
+    EXCLUDE_EXPRESSIONS = [r"Adobe Bridge Cache", r"Thumbs.db", r"^\."]
+    THUMBNAIL_EXT = "jpg"
+    THUMBNAIL_DIR = "thmb"
+    RAW_IMAGE_EXT = {
+        "Adobe": ["dng"],
+        "Canon": ["crw", "cr2", "cr3"],
+        "FujiFilm": ["raf"],
+        "Leica": ["rwl"],
+        "Minolta": ["mrw"],
+        "Nikon": ["nef", "nrw"],
+        "Olympus": ["orw"],
+        "Panasonic": ["raw", "rw2"],
+        "Pentax": ["pef"],
+        "Samsung": ["srw"],
+        "Sony": ["arw", "sr2"],
+    }
+    COMPRESSED_IMAGE_EXT = [
+        "gif",
+        "heic",
+        "jpg",
+        "jpeg",
+        "jng",
+        "mng",
+        "png",
+        "psd",
+        "tiff",
+        "tif",
+    ]
+    # crm (Canon Raw Movie) is not compressed,
+    # but we are not going to compress/transform into other format.
+    COMPRESSED_VIDEO_EXT = [
+        "3g2",
+        "3gp2",
+        "crm",
+        "m4a",
+        "m4b",
+        "m4p",
+        "m4v",
+        "mov",
+        "mp4",
+        "mqv",
+        "qt",
+    ]
+    CONFIG_KEYS = frozenset(["raw", "compressed_image", "compressed_video", "exclude"])
+
+    def __init__(self):
+        """ClassificationRules init, with the built in rules."""
+        self._rules: dict[str, ExtensionRule] = {}
+        self._exclude_expressions: list[str] = []
+        self.raw_extensions: frozenset[str] = frozenset()
+        self._dir_exts: frozenset[str] = frozenset()
+        self.exclude_pattern: re.Pattern = re.compile(r"(?!)")
+        self.extend(
+            raw=self.RAW_IMAGE_EXT,
+            compressed_image=self.COMPRESSED_IMAGE_EXT,
+            compressed_video=self.COMPRESSED_VIDEO_EXT,
+            exclude=self.EXCLUDE_EXPRESSIONS,
+        )
+
+    @classmethod
+    def load(cls, path: str | None = None) -> "ClassificationRules":
+        """Returns the built in rules extended by the TOML rules file, if given.
+
+        Raises:
+            ValueError: the rules file is not valid
+        """
+        rules = cls()
+        if path is None:
+            return rules
+        import tomllib
+
+        try:
+            with open(path, "rb") as rules_file:
+                config = tomllib.load(rules_file)
+        except tomllib.TOMLDecodeError as exp:
+            raise ValueError(f"{path}: {exp}") from exp
+        unknown = config.keys() - cls.CONFIG_KEYS
+        if unknown:
+            raise ValueError(f"{path}: unknown keys: {', '.join(sorted(unknown))}")
+        raw = config.get("raw", {})
+        if not isinstance(raw, dict) or not all(
+            cls._is_string_list(exts) for exts in raw.values()
+        ):
+            raise ValueError(f"{path}: raw must map vendors to lists of extensions")
+        for key in ["compressed_image", "compressed_video", "exclude"]:
+            if not cls._is_string_list(config.get(key, [])):
+                raise ValueError(f"{path}: {key} must be a list of strings")
+        try:
+            rules.extend(**config)
+        except re.error as exp:
+            raise ValueError(f"{path}: invalid exclude expression: {exp}") from exp
+        return rules
+
+    def extend(
+        self,
+        raw: dict[str, list[str]] | None = None,
+        compressed_image: list[str] | None = None,
+        compressed_video: list[str] | None = None,
+        exclude: list[str] | None = None,
+    ) -> None:
+        """Adds rules, replacing the rules of extensions already known."""
+        for vendor, exts in (raw or {}).items():
+            for ext in exts:
+                ext = self._normalize(ext)
+                self._rules[ext] = ExtensionRule(ListType.RAW_IMAGE_DICT, ext, vendor)
+        for ext in map(self._normalize, compressed_image or []):
+            companion = None
+            if ext == self.THUMBNAIL_EXT:
+                companion = ExtensionRule(ListType.THUMB_IMAGE_DICT, self.THUMBNAIL_DIR)
+            self._rules[ext] = ExtensionRule(
+                ListType.COMPRESSED_IMAGE_DICT, ext, companion=companion
+            )
+        for ext in map(self._normalize, compressed_video or []):
+            self._rules[ext] = ExtensionRule(ListType.COMPRESSED_VIDEO_DICT, ext)
+        self.raw_extensions = frozenset(
+            ext for ext, rule in self._rules.items() if rule.list_type == ListType.RAW_IMAGE_DICT
+        )
+        self._dir_exts = frozenset(
+            dir_rule.dir_ext
+            for rule in self._rules.values()
+            for dir_rule in (rule, rule.companion)
+            if dir_rule is not None
+        )
+        if exclude:
+            expressions = self._exclude_expressions + list(exclude)
+            self.exclude_pattern = re.compile("|".join(f"(?:{e})" for e in expressions))
+            self._exclude_expressions = expressions
+
+    def rule(self, extension: str) -> ExtensionRule | None:
+        """Returns the rule of a lowercase extension without dot, None if unsupported."""
+        return self._rules.get(extension)
+
+    def rule_for(self, file_name: str) -> ExtensionRule | None:
+        """Returns the rule of a file, None if its format is unsupported."""
+        return self._rules.get(os.path.splitext(file_name)[1][1:].lower())
+
+    def is_excluded(self, file_name: str) -> bool:
+        """Returns True if the file is left alone, like thumbnail caches and hidden files."""
+        return self.exclude_pattern.match(file_name) is not None
+
+    def is_target_dir(self, dir_name: str) -> bool:
+        """Returns True for make_model_ext directory names, as epr creates them."""
+        return dir_name.islower() and dir_name.rsplit("_", 1)[-1] in self._dir_exts
+
+    @staticmethod
+    def _normalize(ext: str) -> str:
+        """Returns the extension lowercase and without leading dot."""
+        return ext.lower().lstrip(".")
+
+    @staticmethod
+    def _is_string_list(value) -> bool:
+        """Returns True if value is a list of strings."""
+        return isinstance(value, list) and all(isinstance(item, str) for item in value)
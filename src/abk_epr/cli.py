@@ -1,12 +1,19 @@
 """Cli - entry point to the abk_bwp package."""
 
-import asyncio
 from abk_epr import clo
-from abk_epr.epr import epr
 
 
 def main():
-    """Main function."""
+    """Main function.
+
+    The options are parsed once, before asyncio, abk_epr.epr and the libraries it needs
+    are imported, so --version, --about and --help return without loading them.
+    """
     command_line_options = clo.CommandLineOptions()
     command_line_options.handle_options()
-    asyncio.run(epr())
+
+    import asyncio
+
+    from abk_epr.epr import epr
+
+    asyncio.run(epr(command_line_options))
@@ -9,7 +9,18 @@ import sys
 # Third party imports
 
 # Local application imports
-from abk_epr.constants import CONST
+# only constants, the stages and their libraries are imported once options are parsed
+from abk_epr.constants import (
+    CONST,
+    CONVERT_MAX_BYTES_IN_FLIGHT,
+    DEDUP_ACTIONS,
+    FILE_MOVES_MAX_IN_FLIGHT,
+    LOOP_BLOCK_THRESHOLD_SECONDS,
+    METADATA_CACHE_MAX_ENTRIES,
+    METRICS_FORMATS,
+    PLAN_FILE_NAME,
+    WATCH_SETTLE_SECONDS,
+)
 from abk_epr.logger_manager import LoggerManager
 
 
@@ -41,13 +52,70 @@ class CommandLineOptions:
         parser.add_argument(
             "-a", "--about", action="store_true", help="Show detailed project metadata"
         )
+        parser.add_argument(
+            "-b",
+            "--batch",
+            action="store",
+            dest="batch",
+            default=None,
+            help="process every YYYYMMDD_name project directory below this root directory",
+        )
+        parser.add_argument(
+            "--cache-size",
+            action="store",
+            dest="cache_size",
+            type=int,
+            default=METADATA_CACHE_MAX_ENTRIES,
+            help="maximum number of files kept in the metadata cache",
+        )
+        parser.add_argument(
+            "--convert-max-mb",
+            action="store",
+            dest="convert_max_mb",
+            type=int,
+            default=CONVERT_MAX_BYTES_IN_FLIGHT // (1024 * 1024),
+            help="maximum size in MB of RAW files being converted at the same time",
+        )
+        parser.add_argument(
+            "--convert-workers",
+            action="store",
+            dest="convert_workers",
+            type=int,
+            default=None,
+            help="number of DNG conversion workers, defaults to what CPU and memory allow",
+        )
+        parser.add_argument(
+            "--dedup",
+            action="store",
+            dest="dedup",
+            choices=DEDUP_ACTIONS,
+            default=None,
+            help="skip, hard link or only report files with the content of an imported file",
+        )
+        parser.add_argument(
+            "--dedup-index",
+            action="store",
+            dest="dedup_index",
+            default=None,
+            help="content hash index of imported files, opened with a rollback journal, "
+            "so stations can share it on a network file system",
+        )
         parser.add_argument(
             "-d",
             "--directory",
             action="store",
             dest="dir",
-            default=".",
-            help="directory, where images will be converted and renamed",
+            default=None,
+            help="directory, where images will be converted and renamed, defaults to .",
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            action="store",
+            dest="jobs",
+            type=int,
+            default=None,
+            help="number of parallel exiftool workers, defaults to number of CPU cores",
         )
         parser.add_argument(
             "-l",
@@ -57,11 +125,156 @@ class CommandLineOptions:
             default=False,
             help="log into logs/abk_epr.log",
         )
+        parser.add_argument(
+            "--max-moves",
+            action="store",
+            dest="max_moves",
+            type=int,
+            default=FILE_MOVES_MAX_IN_FLIGHT,
+            help="maximum number of file moves running at the same time",
+        )
+        parser.add_argument(
+            "--max-depth",
+            action="store",
+            dest="max_depth",
+            type=int,
+            default=None,
+            help="with --recursive, descend at most this many directory levels",
+        )
+        parser.add_argument(
+            "--metrics-format",
+            action="store",
+            dest="metrics_format",
+            choices=METRICS_FORMATS,
+            default=None,
+            help="format of --metrics-out, by default prometheus for .prom files, json otherwise",
+        )
+        parser.add_argument(
+            "--metrics-out",
+            action="store",
+            dest="metrics_out",
+            default=None,
+            help="write stage timings, counters and latency histograms of the run to this file",
+        )
+        parser.add_argument(
+            "--no-cache",
+            action="store_false",
+            dest="cache",
+            default=True,
+            help="do not use the persistent metadata cache",
+        )
+        parser.add_argument(
+            "--no-native-exif",
+            action="store_false",
+            dest="native_exif",
+            default=True,
+            help="read all metadata with exiftool instead of the built in reader",
+        )
         parser.add_argument("-q", "--quiet", action="store_true", help="Suppresses all logs")
+        parser.add_argument(
+            "-r",
+            "--recursive",
+            action="store_true",
+            dest="recursive",
+            default=False,
+            help="process files in sub directories too, like the DCIM tree of a card copy",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            dest="resume",
+            default=False,
+            help="resume an interrupted run, converting raw files it already renamed",
+        )
+        parser.add_argument(
+            "--rules",
+            action="store",
+            dest="rules",
+            default=None,
+            help="TOML file adding file formats and exclusions to the built in rules",
+        )
+        parser.add_argument(
+            "-s",
+            "--stream",
+            action="store_true",
+            dest="stream",
+            default=False,
+            help="stream files through metadata, rename and convert stages in windows",
+        )
+        parser.add_argument(
+            "--trace",
+            action="store",
+            dest="trace",
+            default=None,
+            help="write a Chrome trace / Perfetto JSON of the run to this file",
+        )
+        parser.add_argument(
+            "--trace-block-ms",
+            action="store",
+            dest="trace_block_ms",
+            type=float,
+            default=LOOP_BLOCK_THRESHOLD_SECONDS * 1000.0,
+            help="with --trace, flag calls blocking the event loop for longer than this",
+        )
+        parser.add_argument(
+            "--undo",
+            action="store_true",
+            dest="undo",
+            default=False,
+            help="revert the renames recorded in the journal of the directory",
+        )
+        parser.add_argument(
+            "-w",
+            "--window",
+            action="store",
+            dest="window",
+            type=int,
+            default=256,
+            help="number of files per window in stream mode",
+        )
         parser.add_argument(
             "-v", "--version", action="store_true", help="Show version info and exit"
         )
+        subparsers = parser.add_subparsers(dest="command", metavar="command")
+        watch_parser = subparsers.add_parser(
+            "watch", help="keep running and process files as they land in a project directory"
+        )
+        # the directory of a command is the same option as -d, see _merge_command_dir
+        watch_parser.add_argument(
+            "command_dir", nargs="?", metavar="dir", help="project directory to watch"
+        )
+        watch_parser.add_argument(
+            "--settle",
+            action="store",
+            dest="settle",
+            type=float,
+            default=WATCH_SETTLE_SECONDS,
+            help="seconds a file size has to stay unchanged before it is processed",
+        )
+        plan_parser = subparsers.add_parser(
+            "plan", help="write the rename, convert and delete plan without changing any file"
+        )
+        plan_parser.add_argument(
+            "command_dir", nargs="?", metavar="dir", help="project directory to plan"
+        )
+        plan_parser.add_argument(
+            "-o",
+            "--output",
+            action="store",
+            dest="plan",
+            default=PLAN_FILE_NAME,
+            help=f"plan file to write, defaults to {PLAN_FILE_NAME}",
+        )
+        apply_parser = subparsers.add_parser("apply", help="carry out a plan written by plan")
+        apply_parser.add_argument("plan", help="plan file to apply")
+        apply_parser.add_argument(
+            "command_dir",
+            nargs="?",
+            metavar="dir",
+            help="project directory, defaults to the directory the plan was made for",
+        )
         self.options = parser.parse_args()
+        self._merge_command_dir(parser)
 
         if self.options.version:
             print(f"{CONST.NAME} version: {CONST.VERSION}")
@@ -89,3 +302,20 @@ class CommandLineOptions:
         self.logger.info(f"{self.options.log_into_file=}")
         self.logger.info(f"{self.options.quiet=}")
         self.logger.info(f"{CONST.VERSION=}")
+
+    def _merge_command_dir(self, parser: ArgumentParser) -> None:
+        """Takes the directory given to a command as dir, rejecting a different -d.
+
+        Without any directory dir is ., except for apply, which then uses the
+        directory the plan was made for.
+        """
+        command_dir = getattr(self.options, "command_dir", None)
+        if command_dir is not None:
+            if self.options.dir is not None and self.options.dir != command_dir:
+                parser.error(
+                    f"-d {self.options.dir} and {self.options.command} {command_dir} "
+                    "name different directories"
+                )
+            self.options.dir = command_dir
+        if self.options.dir is None and self.options.command != "apply":
+            self.options.dir = "."
@@ -0,0 +1,81 @@
+"""Index of companion files (RAW, JPEG, sidecars) sharing the same file stem."""
+
+# Standard library imports
+import os
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True)
+class CompanionGroup:
+    """All files of a directory sharing the same lowercase stem."""
+
+    raw: list[str] = field(default_factory=list)
+    jpeg: list[str] = field(default_factory=list)
+    sidecar: list[str] = field(default_factory=list)
+    other: list[str] = field(default_factory=list)
+
+
+class CompanionIndex:
+    """CompanionIndex groups files by lowercase stem in a single pass.
+
+    Pairing rules become dictionary lookups: a JPEG is a thumbnail when its group has
+    a RAW member, and a sidecar follows the RAW of its group. Sidecars named after the
+    full RAW file name (IMG_0001.CR2.xmp) are grouped with that RAW as well. The stem
+    keeps the directory of the file, IMG_0001 of 100CANON and 101CANON of a card copy
+    are different shots.
+    """
+
+    JPEG_EXT = frozenset(["jpg", "jpeg"])
+    SIDECAR_EXT = frozenset(["xmp", "pp3", "dop", "cos", "on1"])
+
+    def __init__(self, files: Iterable[str], raw_exts: Iterable[str]):
+        """CompanionIndex init."""
+        self._raw_exts = frozenset(ext.lower() for ext in raw_exts)
+        self._groups: dict[str, CompanionGroup] = {}
+        for file_name in files:
+            stem, ext = self._split(file_name)
+            if ext in self.SIDECAR_EXT:
+                raw_stem, raw_ext = self._split(stem)
+                if raw_ext in self._raw_exts:
+                    stem = raw_stem
+            group = self._groups.get(stem)
+            if group is None:
+                group = self._groups[stem] = CompanionGroup()
+            if ext in self._raw_exts:
+                group.raw.append(file_name)
+            elif ext in self.JPEG_EXT:
+                group.jpeg.append(file_name)
+            elif ext in self.SIDECAR_EXT:
+                group.sidecar.append(file_name)
+            else:
+                group.other.append(file_name)
+
+    def __len__(self) -> int:
+        """Number of distinct stems."""
+        return len(self._groups)
+
+    def group(self, file_name: str) -> CompanionGroup | None:
+        """Returns the companion group of the file, or None if the stem is unknown."""
+        return self._groups.get(self._split(file_name)[0])
+
+    def has_raw(self, file_name: str) -> bool:
+        """Returns True if a RAW file with the same stem exists."""
+        group = self.group(file_name)
+        return group is not None and len(group.raw) > 0
+
+    def raw_of(self, file_name: str) -> str | None:
+        """Returns the RAW file a JPEG or sidecar belongs to, or None."""
+        stem, ext = self._split(file_name)
+        if ext in self.SIDECAR_EXT:
+            raw_stem, raw_ext = self._split(stem)
+            if raw_ext in self._raw_exts:
+                stem = raw_stem
+        group = self._groups.get(stem)
+        return group.raw[0] if group and group.raw else None
+
+    @staticmethod
+    def _split(file_name: str) -> tuple[str, str]:
+        """Splits file name into lowercase stem with directory and extension without dot."""
+        stem, ext = os.path.splitext(os.path.normcase(file_name))
+        return stem.lower(), ext[1:].lower()
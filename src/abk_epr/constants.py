@@ -1,13 +1,29 @@
 """Constants for the abk_epr package."""
 
 from pathlib import Path
-from importlib.metadata import version as get_version, PackageNotFoundError
-import tomllib
+
+
+# Defaults of the command line options, the stages refer to them as well. They live
+# here, so parsing the command line does not import the stages and their libraries.
+METADATA_CACHE_MAX_ENTRIES = 500_000
+CONVERT_MAX_BYTES_IN_FLIGHT = 4 * 1024 * 1024 * 1024
+FILE_MOVES_MAX_IN_FLIGHT = 32
+METRICS_FORMATS = ("json", "prometheus")
+LOOP_BLOCK_THRESHOLD_SECONDS = 0.1
+WATCH_SETTLE_SECONDS = 2.0
+PLAN_FILE_NAME = "epr_plan.jsonl"
+DEDUP_ACTIONS = ("skip", "link", "report")
 
 
 class _Const:
-    """Constants class."""
+    """Constants class.
 
+    The metadata is loaded on first access, so importing the module does not search
+    for pyproject.toml, and the installed package metadata is only looked up when
+    pyproject.toml does not provide the name and version.
+    """
+
+    _loaded: bool
     _version: str
     _name: str
     _license: dict
@@ -16,19 +32,32 @@ class _Const:
     _maintainers: list[dict]
 
     def __init__(self):
-        try:
-            self._version = get_version("abk_epr")
-            self._name = "abk_epr"
-        except PackageNotFoundError:
-            self._version = "0.0.0-dev"
-            self._name = "unknown"
-
-        self._license = {"text": "unknown"}
-        self._keywords = ["unknown"]
-        self._authors = [{"name": "ABK", "email": "unknown"}]
-        self._maintainers = [{"name": "ABK", "email": "unknown"}]
-
-        self._load_from_pyproject()
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        object.__setattr__(self, "_loaded", True)
+        project = self._load_from_pyproject()
+        if "version" not in project or "name" not in project:
+            from importlib.metadata import PackageNotFoundError, version as get_version
+
+            try:
+                project = {"version": get_version("abk_epr"), "name": "abk_epr"} | project
+            except PackageNotFoundError:
+                project = {"version": "0.0.0-dev", "name": "unknown"} | project
+        object.__setattr__(self, "_version", project["version"])
+        object.__setattr__(self, "_name", project["name"])
+        object.__setattr__(self, "_license", project.get("license", {"text": "unknown"}))
+        object.__setattr__(self, "_keywords", project.get("keywords", ["unknown"]))
+        object.__setattr__(
+            self, "_authors", project.get("authors", [{"name": "ABK", "email": "unknown"}])
+        )
+        object.__setattr__(
+            self,
+            "_maintainers",
+            project.get("maintainers", [{"name": "ABK", "email": "unknown"}]),
+        )
 
     def _find_project_root(self, start: Path | None = None) -> Path:
         if start is None:
@@ -38,46 +67,47 @@ class _Const:
                 return parent
         raise FileNotFoundError("pyproject.toml not found")
 
-    def _load_from_pyproject(self):
+    def _load_from_pyproject(self) -> dict:
         try:
+            import tomllib
+
             root = self._find_project_root()
             pyproject_path = root / "pyproject.toml"
 
             with pyproject_path.open("rb") as f:
-                project = tomllib.load(f).get("project", {})
-                object.__setattr__(self, "_version", project.get("version", self._version))
-                object.__setattr__(self, "_name", project.get("name", self._name))
-                object.__setattr__(self, "_license", project.get("license", self._license))
-                object.__setattr__(self, "_keywords", project.get("keywords", self._keywords))
-                object.__setattr__(self, "_authors", project.get("authors", self._authors))
-                object.__setattr__(
-                    self, "_maintainers", project.get("maintainers", self._maintainers)
-                )
+                return tomllib.load(f).get("project", {})
         except Exception as e:
             print(f"Warning: failed to load pyproject.toml metadata: {e}")
+            return {}
 
     @property
     def VERSION(self) -> str:
+        self._load()
         return self._version
 
     @property
     def NAME(self) -> str:
+        self._load()
         return self._name
 
     @property
     def LICENSE(self) -> str:
+        self._load()
         return self._license.get("text", "unknown")
 
     @property
     def KEYWORDS(self) -> list[str]:
+        self._load()
         return self._keywords
 
     @property
     def AUTHORS(self) -> list[dict]:
+        self._load()
         return self._authors
 
     @property
     def MAINTAINERS(self) -> list[dict]:
+        self._load()
         return self._maintainers
 
     def __setattr__(self, key, value):
@@ -0,0 +1,517 @@
+"""Content hash duplicate detection against the files imported by earlier runs."""
+
+# Standard library imports
+import hashlib
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+
+# Local application imports
+from abk_epr.abk_common import function_trace
+from abk_epr.constants import DEDUP_ACTIONS
+from abk_epr.metrics import MetricsRegistry
+
+
+PARTIAL_HASH_BYTES = 64 * 1024
+HASH_DIGEST_SIZE = 32
+
+
+def partial_hash(file_name: str, size: int) -> str:
+    """Returns the blake2b hash of the size, the first and the last 64 KiB of a file."""
+    digest = hashlib.blake2b(size.to_bytes(8, "little"), digest_size=HASH_DIGEST_SIZE)
+    with open(file_name, "rb") as media_file:
+        digest.update(media_file.read(PARTIAL_HASH_BYTES))
+        if size > 2 * PARTIAL_HASH_BYTES:
+            media_file.seek(size - PARTIAL_HASH_BYTES)
+            digest.update(media_file.read(PARTIAL_HASH_BYTES))
+        elif size > PARTIAL_HASH_BYTES:
+            digest.update(media_file.read())
+    return digest.hexdigest()
+
+
+def full_hash(file_name: str) -> str:
+    """Returns the blake2b hash of the content of a file, read through mmap.
+
+    hashlib releases the GIL while hashing the mapped file, full hashes of several files
+    are computed in parallel on worker threads.
+    """
+    digest = hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+    with open(file_name, "rb") as media_file:
+        if os.fstat(media_file.fileno()).st_size > 0:
+            with mmap.mmap(media_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+    return digest.hexdigest()
+
+
+@dataclass(slots=True)
+class FileDigest:
+    """Size and content hashes of a file, the hashes are computed when needed."""
+
+    size: int
+    partial: str | None = None
+    full: str | None = None
+
+
+@dataclass(slots=True)
+class Duplicate:
+    """A file with the same content as an imported file or an earlier file of the run."""
+
+    file_name: str
+    original: str
+
+
+class ImportIndex:
+    """ImportIndex keeps the content hashes of all files imported by epr.
+
+    Rows are keyed by the path the file was renamed to and hold its size and partial
+    hash. The full content hash is stored once it is known, it is computed only when a
+    later file matches size and partial hash. The path may no longer exist, RAW files
+    are deleted once converted, their full hash still marks the content as imported.
+    The index lives under XDG_DATA_HOME and is opened in WAL mode. An index at a given
+    db_path uses the rollback journal instead, WAL needs memory shared on one host and
+    is unsafe on network file systems, so stations can share such an index on NFS or SMB.
+    A database of an older SCHEMA_VERSION is dropped and rebuilt.
+    """
+
+    DB_FILE_NAME = "imports.sqlite3"
+    SCHEMA_VERSION = 2
+    # sqlite limits the number of parameters of a statement
+    MAX_PARAMETERS = 500
+
+    def __init__(
+        self,
+        logger: logging.Logger = None,  # type: ignore
+        db_path: str | Path = None,  # type: ignore
+    ):
+        """ImportIndex init."""
+        self._logger = logger or logging.getLogger(__name__)
+        self._db_path = Path(db_path) if db_path else self.default_path()
+        self._journal_mode = "DELETE" if db_path else "WAL"
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        """Enter for import index."""
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit for import index."""
+        self.close()
+
+    @classmethod
+    def default_path(cls) -> Path:
+        """Index file location under XDG_DATA_HOME, ~/.local/share by default."""
+        data_home = os.environ.get("XDG_DATA_HOME") or os.path.join(
+            os.path.expanduser("~"), ".local", "share"
+        )
+        return Path(data_home) / "abk_epr" / cls.DB_FILE_NAME
+
+    @function_trace
+    def open(self) -> None:
+        """Opens or creates the index database."""
+        if self._connection is not None:
+            return
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self._db_path, check_same_thread=False)
+        (schema_version,) = self._connection.execute("PRAGMA user_version").fetchone()
+        if schema_version != self.SCHEMA_VERSION:
+            self._connection.executescript(
+                f"""
+                DROP TABLE IF EXISTS imports;
+                PRAGMA user_version={self.SCHEMA_VERSION};
+                """
+            )
+        # NORMAL is only safe against power loss together with WAL
+        synchronous = "NORMAL" if self._journal_mode == "WAL" else "FULL"
+        self._connection.execute(f"PRAGMA journal_mode={self._journal_mode}")
+        self._connection.execute(f"PRAGMA synchronous={synchronous}")
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS imports (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                partial_hash TEXT NOT NULL,
+                full_hash TEXT,
+                imported_at INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS imports_size ON imports (size, partial_hash);
+            """
+        )
+        self._logger.debug(f"import index: {self._db_path}, journal: {self._journal_mode}")
+
+    @function_trace
+    def close(self) -> None:
+        """Commits pending changes and closes the index database."""
+        if self._connection is not None:
+            with self._lock:
+                self._connection.commit()
+                self._connection.close()
+                self._connection = None
+
+    def known_sizes(self, sizes: Iterable[int]) -> set[int]:
+        """Returns the sizes of which at least one file has been imported."""
+        sizes = list(sizes)
+        known: set[int] = set()
+        with self._lock:
+            connection = self._ensure_open()
+            for start in range(0, len(sizes), self.MAX_PARAMETERS):
+                chunk = sizes[start : start + self.MAX_PARAMETERS]
+                known.update(
+                    size
+                    for (size,) in connection.execute(
+                        # only placeholders are formatted into the statement
+                        "SELECT DISTINCT size FROM imports "  # noqa: S608
+                        f"WHERE size IN ({', '.join('?' * len(chunk))})",
+                        chunk,
+                    )
+                )
+        return known
+
+    def find(self, size: int, partial: str) -> list[tuple[str, str | None]]:
+        """Returns (path, full hash or None) of the imports with size and partial hash.
+
+        The imports are returned oldest first.
+        """
+        with self._lock:
+            cursor = self._ensure_open().execute(
+                "SELECT path, full_hash FROM imports WHERE size=? AND partial_hash=? "
+                "ORDER BY imported_at, rowid",
+                (size, partial),
+            )
+            return cursor.fetchall()
+
+    def add_many(self, imports: Iterable[tuple[FileDigest, str]]) -> None:
+        """Records imported files, replacing earlier imports to the same path.
+
+        Args:
+            imports (Iterable[tuple[FileDigest, str]]): digest and path of the imported files
+        """
+        now = time.time_ns()
+        rows = [(path, digest.size, digest.partial, digest.full, now) for digest, path in imports]
+        with self._lock:
+            connection = self._ensure_open()
+            connection.executemany(
+                "INSERT OR REPLACE INTO imports "
+                "(path, size, partial_hash, full_hash, imported_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            connection.commit()
+
+    def set_full_hashes(self, hashes: Iterable[tuple[str, str]]) -> None:
+        """Stores the full hashes of imported files, given as (path, full hash)."""
+        with self._lock:
+            connection = self._ensure_open()
+            connection.executemany(
+                "UPDATE imports SET full_hash=? WHERE path=?",
+                [(full, path) for path, full in hashes],
+            )
+            connection.commit()
+
+    def forget(self, paths: Iterable[str]) -> None:
+        """Removes the imports of paths, after their renames were undone."""
+        with self._lock:
+            connection = self._ensure_open()
+            connection.executemany("DELETE FROM imports WHERE path=?", [(p,) for p in paths])
+            connection.commit()
+
+    def _ensure_open(self) -> sqlite3.Connection:
+        """Opens the database lazily and returns the connection."""
+        if self._connection is None:
+            self.open()
+        return self._connection  # type: ignore
+
+
+class DedupStage:
+    """DedupStage keeps files with already imported content out of rename and conversion.
+
+    Files are compared in three steps, each reading more of fewer files: only files of
+    a size found in the index, or shared with another file of the run, get a partial
+    hash of their first and last 64 KiB. Only files whose size and partial hash match
+    get a full hash, computed through mmap on a thread pool, together with the imported
+    files they match, if those have no full hash yet. A duplicate is skipped and left
+    in place, replaced by a hard link to the imported file, or only reported and
+    imported anyway.
+
+    The files renamed by the run get a partial hash on the pool while they are
+    converted, and are added to the index by finish. Only files deleted after the
+    import, the converted RAW files, are hashed in full right away, their content
+    cannot be read once a later import matches them.
+    """
+
+    SKIP, LINK, REPORT = DEDUP_ACTIONS
+    ACTIONS = [SKIP, LINK, REPORT]
+    LINK_SUFFIX = ".epr-link"
+
+    def __init__(
+        self,
+        logger: logging.Logger = None,  # type: ignore
+        index: ImportIndex = None,  # type: ignore
+        action: str = SKIP,
+        workers: int | None = None,
+        metrics: MetricsRegistry = None,  # type: ignore
+    ):
+        """DedupStage init."""
+        if action not in self.ACTIONS:
+            raise ValueError(f"action must be one of {', '.join(self.ACTIONS)}, got: {action}")
+        self._logger = logger or logging.getLogger(__name__)
+        self._index = index or ImportIndex(logger=self._logger)
+        self._action = action
+        self._workers = workers or min(8, os.cpu_count() or 1)
+        self._metrics = metrics or MetricsRegistry()
+        self._pool: ThreadPoolExecutor | None = None
+        # source file -> digest computed by filter, reused when the file is recorded
+        self._digests: dict[str, FileDigest] = {}
+        self._pending: list[Future] = []
+        self.hashed_bytes = 0
+        self.duplicate_count = 0
+
+    @property
+    def action(self) -> str:
+        """What is done with duplicates: skip, link or report."""
+        return self._action
+
+    @function_trace
+    def close(self) -> None:
+        """Records pending imports, stops the workers and closes the index."""
+        self.finish()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self._index.close()
+
+    @function_trace
+    def filter(self, files: Sequence[str], dry_run: bool = False) -> list[str]:
+        """Returns the files to import, handling the duplicates among them.
+
+        Args:
+            files (Sequence[str]): files of the image directory
+            dry_run (bool): decide only, do not replace duplicates by hard links
+
+        Returns:
+            list[str]: files to import, in the order given
+        """
+        with self._metrics.stage("dedup") as stage:
+            hashed_before = self.hashed_bytes
+            duplicates = self.find_duplicates(files)
+            stage.files = len(files)
+            stage.bytes = self.hashed_bytes - hashed_before
+        dropped = set()
+        for duplicate in duplicates:
+            if self._action == self.REPORT:
+                self._logger.info("duplicate: %s of %s", duplicate.file_name, duplicate.original)
+                continue
+            dropped.add(duplicate.file_name)
+            self._digests.pop(duplicate.file_name, None)
+            if self._action == self.LINK and not dry_run:
+                self._link(duplicate)
+            else:
+                self._logger.info(
+                    "skipping duplicate: %s of %s", duplicate.file_name, duplicate.original
+                )
+        if duplicates:
+            self.duplicate_count += len(duplicates)
+            self._metrics.inc("epr_duplicates_total", len(duplicates), action=self._action)
+            self._logger.info(f"{len(duplicates)} of {len(files)} files are duplicates")
+        return [file_name for file_name in files if file_name not in dropped]
+
+    def find_duplicates(self, files: Sequence[str]) -> list[Duplicate]:
+        """Returns the files with the content of an imported file or an earlier file."""
+        by_size: dict[int, list[str]] = {}
+        for file_name in files:
+            try:
+                size = os.stat(file_name).st_size
+            except OSError:
+                continue
+            if size > 0:
+                by_size.setdefault(size, []).append(file_name)
+        known_sizes = self._index.known_sizes(by_size)
+        candidates = [
+            file_name
+            for size, size_files in by_size.items()
+            if size in known_sizes or len(size_files) > 1
+            for file_name in size_files
+        ]
+        hashed = []
+        for file_name, digest in zip(
+            candidates, self._map(self._partial_digest, candidates), strict=True
+        ):
+            if digest is None:
+                continue
+            self._digests[file_name] = digest
+            self.hashed_bytes += min(digest.size, 2 * PARTIAL_HASH_BYTES)
+            hashed.append(file_name)
+
+        # (size, partial hash) -> (path, full hash or None) of the imported files
+        imported_rows: dict[tuple[int, str], list[tuple[str, str | None]]] = {}
+        by_partial: dict[tuple[int, str], list[str]] = {}
+        for file_name in hashed:
+            digest = self._digests[file_name]
+            key = (digest.size, digest.partial)  # type: ignore
+            by_partial.setdefault(key, []).append(file_name)
+            if digest.size in known_sizes and key not in imported_rows:
+                imported_rows[key] = self._index.find(*key)
+        imported = self._imported_originals(imported_rows)
+        matched = [
+            file_name
+            for key, partial_files in by_partial.items()
+            if imported.get(key) or len(partial_files) > 1
+            for file_name in partial_files
+        ]
+        matched_files = set()
+        for file_name, full in zip(matched, self._map(self._full_hash, matched), strict=True):
+            if full is None:
+                continue
+            self._digests[file_name].full = full
+            self.hashed_bytes += self._digests[file_name].size
+            matched_files.add(file_name)
+
+        duplicates = []
+        originals: dict[str, str] = {}
+        for file_name in files:
+            if file_name not in matched_files:
+                continue
+            digest = self._digests[file_name]
+            original = imported.get((digest.size, digest.partial), {}).get(digest.full)  # type: ignore
+            if original is None:
+                original = originals.setdefault(digest.full, file_name)  # type: ignore
+            if original != file_name:
+                duplicates.append(Duplicate(file_name, original))
+        return duplicates
+
+    def record(self, source_file: str, imported_file: str, full: bool = False) -> None:
+        """Hashes an imported file on the pool, it is added to the index by finish.
+
+        Args:
+            source_file (str): name of the file before it was renamed
+            imported_file (str): name of the renamed file
+            full (bool): hash the whole content too, for files deleted after the import
+        """
+        digest = self._digests.pop(source_file, None)
+        path = os.path.abspath(imported_file)
+        self._pending.append(self._ensure_pool().submit(self._import_digest, path, digest, full))
+
+    @function_trace
+    def finish(self) -> int:
+        """Waits for the hashes of the recorded files and adds them to the index.
+
+        Returns:
+            int: number of recorded files
+        """
+        pending, self._pending = self._pending, []
+        imports = []
+        for future in pending:
+            try:
+                imports.append(future.result())
+            except OSError as exp:
+                self._logger.warning(f"not added to the import index: {exp}")
+        if imports:
+            self._index.add_many(imports)
+        self._digests.clear()
+        return len(imports)
+
+    def forget(self, imported_files: Iterable[str]) -> None:
+        """Removes files from the index, their import was undone."""
+        self._index.forget(os.path.abspath(file_name) for file_name in imported_files)
+
+    def _link(self, duplicate: Duplicate) -> None:
+        """Replaces a duplicate by a hard link to its original, leaves it if that fails."""
+        try:
+            if os.path.samefile(duplicate.file_name, duplicate.original):
+                return
+            link_name = duplicate.file_name + self.LINK_SUFFIX
+            os.link(duplicate.original, link_name)
+            os.replace(link_name, duplicate.file_name)
+        except OSError as exp:
+            self._logger.warning(f"skipping duplicate {duplicate.file_name}, not linked: {exp}")
+            return
+        self._logger.info("linked duplicate: %s to %s", duplicate.file_name, duplicate.original)
+
+    def _imported_originals(
+        self, imported_rows: dict[tuple[int, str], list[tuple[str, str | None]]]
+    ) -> dict[tuple[int, str], dict[str, str]]:
+        """Returns full hash -> first path of the imports, hashing those without full hash.
+
+        An import without full hash whose file is gone cannot be compared and is left out.
+        """
+        unhashed = [
+            (size, path)
+            for (size, _), rows in imported_rows.items()
+            for path, full in rows
+            if full is None
+        ]
+        hashes = self._map(self._existing_full_hash, [path for _, path in unhashed])
+        completed = {}
+        for (size, path), full in zip(unhashed, hashes, strict=True):
+            if full is not None:
+                completed[path] = full
+                self.hashed_bytes += size
+        if completed:
+            self._index.set_full_hashes(completed.items())
+        imported: dict[tuple[int, str], dict[str, str]] = {}
+        for key, rows in imported_rows.items():
+            originals = imported[key] = {}
+            for path, full in rows:
+                full = full or completed.get(path)
+                if full is not None:
+                    originals.setdefault(full, path)
+        return imported
+
+    def _existing_full_hash(self, path: str) -> str | None:
+        """Returns the full hash of an imported file, None if it cannot be read."""
+        try:
+            return full_hash(path)
+        except OSError as exp:
+            self._logger.debug("import not compared: %s", exp)
+            return None
+
+    def _partial_digest(self, file_name: str) -> FileDigest | None:
+        """Returns the digest of a file with its partial hash, None if it cannot be read."""
+        try:
+            size = os.stat(file_name).st_size
+            return FileDigest(size, partial_hash(file_name, size))
+        except OSError as exp:
+            self._logger.warning("not checked for duplicates: %s", exp)
+            return None
+
+    def _full_hash(self, file_name: str) -> str | None:
+        """Returns the full hash of a file, None if it cannot be read."""
+        try:
+            return full_hash(file_name)
+        except OSError as exp:
+            self._logger.warning("not checked for duplicates: %s", exp)
+            return None
+
+    def _import_digest(
+        self, path: str, digest: FileDigest | None, full: bool
+    ) -> tuple[FileDigest, str]:
+        """Completes the digest of an imported file, hashing only what is missing."""
+        if digest is None:
+            digest = FileDigest(os.stat(path).st_size)
+        if digest.partial is None:
+            digest.partial = partial_hash(path, digest.size)
+        if full and digest.full is None:
+            digest.full = full_hash(path)
+        return digest, path
+
+    def _map(self, function, files: list[str]) -> list:
+        """Runs function over files on the pool."""
+        if not files:
+            return []
+        return list(self._ensure_pool().map(function, files))
+
+    def _ensure_pool(self) -> ThreadPoolExecutor:
+        """Starts the worker pool lazily and returns it."""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self._workers, thread_name_prefix="epr_dedup"
+            )
+        return self._pool
@@ -0,0 +1,87 @@
+"""Lazy os.scandir based walk over the files of an image directory and its sub directories."""
+
+# Standard library imports
+import logging
+import os
+from collections.abc import Callable, Generator
+
+
+class DirectoryScanner:
+    """DirectoryScanner yields the files below a directory, descending max_depth levels.
+
+    The walk is built on os.scandir, whether an entry is a file or a directory comes
+    from the directory listing itself, so no stat call is needed per file on Linux,
+    macOS and Windows. Entries are yielded as they are read, together with their path
+    relative to the scanned directory, and keep their cached stat data for callers.
+
+    Names matching exclude are skipped, files and directories alike. Directories
+    matching prune are not entered, like the camera directories of earlier runs.
+    Symbolic links to directories are not followed, a card copy cannot loop.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger = None,  # type: ignore
+        max_depth: int | None = 0,
+        exclude: Callable[[str], bool] | None = None,
+        prune: Callable[[str], bool] | None = None,
+    ):
+        """DirectoryScanner init.
+
+        Args:
+            logger (logging.Logger): logger
+            max_depth (int | None): directory levels to descend, 0 for the top level only,
+                None for no limit
+            exclude (Callable[[str], bool] | None): True for names to skip
+            prune (Callable[[str], bool] | None): True for directory names not to enter
+        """
+        if max_depth is not None and max_depth < 0:
+            raise ValueError(f"max_depth must not be negative, got: {max_depth}")
+        self._logger = logger or logging.getLogger(__name__)
+        self._max_depth = max_depth
+        self._exclude = exclude
+        self._prune = prune
+
+    @property
+    def recursive(self) -> bool:
+        """True if sub directories are scanned."""
+        return self._max_depth != 0
+
+    def scan(self, root: str = ".") -> Generator[tuple[str, os.DirEntry]]:
+        """Yields (path relative to root, entry) of every file, depth first.
+
+        Sub directories that cannot be read are logged and skipped, an unreadable root
+        raises OSError.
+        """
+        # (directory to scan, its path relative to root, its depth)
+        pending: list[tuple[str, str, int]] = [(root, "", 0)]
+        while pending:
+            directory, relative_dir, depth = pending.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError as exp:
+                if depth == 0:
+                    raise
+                self._logger.warning("skipping unreadable directory %s: %s", directory, exp)
+                continue
+            sub_dirs = []
+            with entries:
+                for entry in entries:
+                    if self._exclude is not None and self._exclude(entry.name):
+                        continue
+                    relative_path = (
+                        os.path.join(relative_dir, entry.name) if relative_dir else entry.name
+                    )
+                    if entry.is_file():
+                        yield relative_path, entry
+                    elif (
+                        (self._max_depth is None or depth < self._max_depth)
+                        and entry.is_dir(follow_symlinks=False)
+                        and not (self._prune is not None and self._prune(entry.name))
+                    ):
+                        sub_dirs.append((entry.path, relative_path, depth + 1))
+            pending.extend(reversed(sub_dirs))
+
+    def files(self, root: str = ".") -> list[str]:
+        """Returns the sorted paths of all files relative to root."""
+        return sorted(relative_path for relative_path, _ in self.scan(root))
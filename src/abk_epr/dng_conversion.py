@@ -0,0 +1,226 @@
+"""Per file RAW to DNG conversion stage fed through a queue."""
+
+# Standard library imports
+import asyncio
+import itertools
+import logging
+import math
+import os
+import timeit
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+
+# Local application imports
+from abk_epr.constants import CONVERT_MAX_BYTES_IN_FLIGHT
+from abk_epr.metrics import MetricsRegistry
+from abk_epr.tracing import tracer
+
+
+if TYPE_CHECKING:
+    from pydngconverter import DNGConverter
+
+
+@dataclass(slots=True)
+class ConversionResult:
+    """Outcome of converting one RAW file, source and destination relative to directory."""
+
+    source: str
+    destination: str
+    ok: bool
+    elapsed_ms: float
+    directory: str = ""
+
+
+class DngConversionStage:
+    """DngConversionStage converts renamed RAW files one by one as they arrive.
+
+    Files are put on a priority queue by the rename stage and the largest waiting file
+    is converted first, across all directories, which shortens the long tail. The
+    number of workers is bounded by CPU cores and available memory, and a file is
+    only started when the RAW bytes in flight stay below max_bytes_in_flight.
+    Every finished file is reported individually, the queue depth and worker
+    utilization are reported when the stage is drained.
+
+    Relative paths are resolved against the working directory at the time they are
+    queued, so a batch can change into the next project while conversions of the
+    previous ones are still running.
+    """
+
+    MEMORY_PER_CONVERSION = 1024 * 1024 * 1024
+    DEFAULT_MAX_BYTES_IN_FLIGHT = CONVERT_MAX_BYTES_IN_FLIGHT
+
+    def __init__(
+        self,
+        logger: logging.Logger = None,  # type: ignore
+        workers: int = None,  # type: ignore
+        max_bytes_in_flight: int = DEFAULT_MAX_BYTES_IN_FLIGHT,
+        metrics: MetricsRegistry = None,  # type: ignore
+    ):
+        """DngConversionStage init."""
+        self._logger = logger or logging.getLogger(__name__)
+        self._metrics = metrics or MetricsRegistry()
+        self._workers = workers or self.default_workers()
+        self._max_bytes_in_flight = max_bytes_in_flight
+        self._queue: asyncio.PriorityQueue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._converters: dict[str, DNGConverter] = {}
+        self._sequence = itertools.count()
+        self._submitted = 0
+        self._bytes_in_flight = 0
+        self._bytes_condition: asyncio.Condition | None = None
+        self._max_queue_depth = 0
+        self._busy_seconds = 0.0
+        self._started_at = 0.0
+        self._result_listeners: list[Callable[[ConversionResult], None]] = []
+        self.results: list[ConversionResult] = []
+
+    @classmethod
+    def default_workers(cls) -> int:
+        """Number of workers the CPU cores and the available memory allow, at least one."""
+        cpu_workers = os.cpu_count() or 1
+        try:
+            available = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        except (AttributeError, ValueError, OSError):
+            return cpu_workers
+        return max(1, min(cpu_workers, available // cls.MEMORY_PER_CONVERSION))
+
+    @property
+    def workers(self) -> int:
+        """Number of conversion workers."""
+        return self._workers
+
+    @property
+    def submitted(self) -> int:
+        """Number of files put on the queue."""
+        return self._submitted
+
+    def add_result_listener(self, listener: Callable[[ConversionResult], None]) -> None:
+        """Registers a callback, called with the result of every finished file."""
+        self._result_listeners.append(listener)
+
+    def remove_result_listener(self, listener: Callable[[ConversionResult], None]) -> None:
+        """Unregisters a callback registered with add_result_listener."""
+        self._result_listeners.remove(listener)
+
+    async def put(self, raw_file: str, dng_dir: str) -> None:
+        """Queues a renamed RAW file for conversion into dng_dir."""
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._bytes_condition = asyncio.Condition()
+            self._started_at = timeit.default_timer()
+            self._tasks = [
+                asyncio.create_task(self._worker(), name=f"dng_worker{i}")
+                for i in range(self._workers)
+            ]
+        try:
+            size = os.path.getsize(raw_file)
+        except OSError:
+            size = 0
+        self._submitted += 1
+        item = (raw_file, dng_dir, size, os.getcwd())
+        await self._queue.put((-size, next(self._sequence), item))
+        self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+
+    async def join(self) -> list[ConversionResult]:
+        """Waits until all queued files are converted and stops the workers."""
+        if self._queue is not None:
+            for _ in self._tasks:
+                await self._queue.put((math.inf, next(self._sequence), None))
+            await asyncio.gather(*self._tasks)
+            elapsed = timeit.default_timer() - self._started_at
+            self._metrics.add_stage("convert", elapsed)
+            self._metrics.set("epr_converter_workers", self._workers)
+            utilization = self._busy_seconds / (elapsed * self._workers) if elapsed > 0 else 0.0
+            self._logger.info(
+                f"conversion: {self._workers} workers, max queue depth "
+                f"{self._max_queue_depth}, utilization {utilization:.0%}"
+            )
+            self._queue = None
+            self._tasks = []
+        failed = sum(1 for result in self.results if not result.ok)
+        self._logger.info(f"converted {len(self.results) - failed} files, {failed} failed")
+        return self.results
+
+    async def _worker(self) -> None:
+        """Converts queued files until it receives the stop sentinel."""
+        while (item := (await self._queue.get())[-1]) is not None:  # type: ignore
+            raw_file, dng_dir, size, directory = item
+            await self._acquire_bytes(size)
+            start = timeit.default_timer()
+            self._metrics.inc("epr_converter_processes_total")
+            dng_file = os.path.join(dng_dir, Path(raw_file).with_suffix(".dng").name)
+            try:
+                with tracer.span("convert", category="convert", file=raw_file, size=size):
+                    converted_file = await self._convert_file(
+                        os.path.join(directory, raw_file), os.path.join(directory, dng_dir)
+                    )
+                dng_file = os.path.join(dng_dir, os.path.basename(converted_file))
+                ok = os.path.isfile(converted_file)
+            except Exception as exp:
+                self._logger.error(f"Error converting: {raw_file}: {str(exp)}")
+                ok = False
+            finally:
+                await self._release_bytes(size)
+            elapsed = timeit.default_timer() - start
+            self._busy_seconds += elapsed
+            result = ConversionResult(raw_file, dng_file, ok, elapsed * 1000.0, directory)
+            self.results.append(result)
+            self._metrics.observe("epr_conversion_seconds", elapsed)
+            self._metrics.inc("epr_conversions_total", result="ok" if ok else "failed")
+            self._metrics.add_stage("convert", files=1, byte_count=size)
+            for listener in self._result_listeners:
+                listener(result)
+            self._logger.info(
+                "converted [%d/%d]: %s -> %s (%s) in %.0f ms, queue depth %d",
+                len(self.results),
+                self._submitted,
+                raw_file,
+                dng_file,
+                "ok" if ok else "failed",
+                result.elapsed_ms,
+                self._queue.qsize(),  # type: ignore
+            )
+
+    async def _acquire_bytes(self, size: int) -> None:
+        """Waits until size more RAW bytes fit the in flight limit, one file always fits."""
+        async with self._bytes_condition:  # type: ignore
+            await self._bytes_condition.wait_for(  # type: ignore
+                lambda: (
+                    self._bytes_in_flight == 0
+                    or self._bytes_in_flight + size <= self._max_bytes_in_flight
+                )
+            )
+            self._bytes_in_flight += size
+
+    async def _release_bytes(self, size: int) -> None:
+        """Returns size bytes to the in flight budget."""
+        async with self._bytes_condition:  # type: ignore
+            self._bytes_in_flight -= size
+            self._bytes_condition.notify_all()  # type: ignore
+
+    async def _convert_file(self, raw_file: str, dng_dir: str) -> str:
+        """Runs Adobe DNG Converter for a single file and returns the dng file path.
+
+        Args:
+            raw_file (str): absolute path of the RAW file
+            dng_dir (str): absolute path of the directory to write the DNG file to
+        """
+        # pydngconverter pulls in wand and ImageMagick, imported by the first conversion.
+        # Imported after logging was configured, its per job logs would reach the console.
+        from pydngconverter import DNGConverter, compat
+        from pydngconverter.dngconverter import DNGJob
+
+        logging.getLogger("pydngconverter").setLevel(logging.WARNING)
+        os.makedirs(dng_dir, exist_ok=True)
+        converter = self._converters.get(dng_dir)
+        if converter is None:
+            converter = DNGConverter(source=Path(dng_dir), dest=Path(dng_dir))
+            self._converters[dng_dir] = converter
+        dest_root = Path(dng_dir).absolute()
+        job = DNGJob(Path(raw_file).absolute(), destination_root=dest_root)
+        destination = await compat.get_compat_path(dest_root)
+        await converter.convert_file(destination=destination, job=job)
+        return os.path.join(dng_dir, job.destination_filename)
@@ -0,0 +1,169 @@
+"""Integrity checks of converted DNG files before their RAW originals are deleted."""
+
+# Standard library imports
+import logging
+import mmap
+import os
+import struct
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class VerifyResult:
+    """Outcome of verifying one DNG file."""
+
+    path: str
+    ok: bool
+    reason: str = ""
+
+
+class DngVerifier:
+    """DngVerifier checks size bounds, the TIFF/DNG header and the IFD chain of DNG files.
+
+    The file is mapped with mmap and only the header and the IFD entries are touched.
+    Every IFD of the chain, including SubIFDs, has to lie inside the file, and every
+    out of line tag value and every strip or tile of image data has to end before the
+    end of the file, which catches truncated conversions. IFD0 has to carry the
+    DNGVersion tag.
+    """
+
+    DEFAULT_MIN_SIZE = 1024
+    MAX_SIZE = 0xFFFFFFFF
+    MAX_IFDS = 256
+    DNG_VERSION_TAG = 50706
+    SUB_IFDS_TAG = 330
+    EXIF_IFD_TAG = 34665
+    # data offsets tag -> byte counts tag, for strips and tiles
+    DATA_TAGS = {273: 279, 324: 325}
+    # TIFF field type -> size in bytes of one value
+    TYPE_SIZES = {
+        1: 1,
+        2: 1,
+        3: 2,
+        4: 4,
+        5: 8,
+        6: 1,
+        7: 1,
+        8: 2,
+        9: 4,
+        10: 8,
+        11: 4,
+        12: 8,
+        13: 4,
+    }
+
+    def __init__(
+        self,
+        logger: logging.Logger = None,  # type: ignore
+        workers: int = None,  # type: ignore
+        min_size: int = DEFAULT_MIN_SIZE,
+    ):
+        """DngVerifier init."""
+        self._logger = logger or logging.getLogger(__name__)
+        self._workers = workers or os.cpu_count() or 1
+        self._min_size = min_size
+
+    def verify_many(self, dng_files: Iterable[str]) -> dict[str, VerifyResult]:
+        """Verifies DNG files on a worker pool.
+
+        Args:
+            dng_files (Iterable[str]): DNG files to verify
+
+        Returns:
+            dict[str, VerifyResult]: verification result per file
+        """
+        dng_files = list(dng_files)
+        if len(dng_files) <= 1:
+            return {dng_file: self.verify(dng_file) for dng_file in dng_files}
+        with ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="verify") as pool:
+            return dict(zip(dng_files, pool.map(self.verify, dng_files), strict=True))
+
+    def verify(self, dng_file: str) -> VerifyResult:
+        """Verifies a single DNG file."""
+        try:
+            size = os.path.getsize(dng_file)
+            if size < self._min_size or size > self.MAX_SIZE:
+                return VerifyResult(dng_file, False, f"size {size} out of bounds")
+            with (
+                open(dng_file, "rb") as dng,
+                mmap.mmap(dng.fileno(), 0, access=mmap.ACCESS_READ) as data,
+            ):
+                reason = self._check_structure(data, size)
+        except (OSError, ValueError, struct.error) as exp:
+            reason = str(exp)
+        return VerifyResult(dng_file, not reason, reason)
+
+    def _check_structure(self, data: mmap.mmap, size: int) -> str:
+        """Walks the IFD chain, returns an empty string if the structure is valid."""
+        byte_order = data[:2]
+        if byte_order == b"II":
+            endian = "<"
+        elif byte_order == b"MM":
+            endian = ">"
+        else:
+            return "not a TIFF/DNG header"
+        magic, ifd_offset = struct.unpack_from(f"{endian}HI", data, 2)
+        if magic != 42:
+            return f"wrong TIFF magic {magic}"
+
+        pending = [ifd_offset]
+        visited: set[int] = set()
+        is_ifd0 = True
+        while pending:
+            offset = pending.pop()
+            if offset == 0:
+                continue
+            if offset in visited:
+                return f"IFD loop at offset {offset}"
+            if len(visited) >= self.MAX_IFDS:
+                return "too many IFDs"
+            visited.add(offset)
+            if offset + 2 > size:
+                return f"IFD offset {offset} beyond end of file"
+            (entry_count,) = struct.unpack_from(f"{endian}H", data, offset)
+            entries_end = offset + 2 + 12 * entry_count
+            if entries_end + 4 > size:
+                return f"IFD at offset {offset} truncated"
+            tags: dict[int, tuple[int, ...]] = {}
+            for entry_offset in range(offset + 2, entries_end, 12):
+                tag, field_type, count, value = struct.unpack_from(
+                    f"{endian}HHII", data, entry_offset
+                )
+                value_size = self.TYPE_SIZES.get(field_type, 1) * count
+                if value_size > 4 and value + value_size > size:
+                    return f"tag {tag} value beyond end of file"
+                tags[tag] = ()
+                if field_type in (3, 4) and (
+                    tag in self.DATA_TAGS or tag in self.DATA_TAGS.values()
+                ):
+                    tags[tag] = self._read_values(data, endian, field_type, count, entry_offset)
+                if tag in (self.SUB_IFDS_TAG, self.EXIF_IFD_TAG):
+                    if value_size > 4:
+                        pending.extend(struct.unpack_from(f"{endian}{count}I", data, value))
+                    else:
+                        pending.append(value)
+            if is_ifd0 and self.DNG_VERSION_TAG not in tags:
+                return "DNGVersion tag missing"
+            for offsets_tag, counts_tag in self.DATA_TAGS.items():
+                for data_offset, byte_count in zip(
+                    tags.get(offsets_tag, ()), tags.get(counts_tag, ()), strict=False
+                ):
+                    if data_offset + byte_count > size:
+                        return f"image data at offset {data_offset} beyond end of file"
+            is_ifd0 = False
+            (next_offset,) = struct.unpack_from(f"{endian}I", data, entries_end)
+            pending.append(next_offset)
+        return ""
+
+    @staticmethod
+    def _read_values(
+        data: mmap.mmap, endian: str, field_type: int, count: int, entry_offset: int
+    ) -> tuple[int, ...]:
+        """Reads SHORT or LONG values of an IFD entry, inline or out of line."""
+        value_format = "H" if field_type == 3 else "I"
+        value_offset = entry_offset + 8
+        if struct.calcsize(value_format) * count > 4:
+            (value_offset,) = struct.unpack_from(f"{endian}I", data, entry_offset + 8)
+        return struct.unpack_from(f"{endian}{count}{value_format}", data, value_offset)
@@ -2,26 +2,45 @@
 """Main program for renaming images and translate images from raw to dng format."""
 
 # Standard library imports
+import asyncio
+import contextlib
+from collections.abc import Iterable
 from enum import Enum
 import os
-from pathlib import Path
 import shutil
 import sys
 import logging
 import re
+import signal
+from dataclasses import asdict
 from datetime import datetime
 import json
 
 
 # Third party imports
-from pydngconverter import DNGConverter
 from colorama import Fore, Style
-import exiftool
 
 
 # Local application imports
 from abk_epr.abk_common import PerformanceTimer, function_trace
+from abk_epr.classification import ClassificationRules, ExtensionRule, ListType
 from abk_epr.clo import CommandLineOptions
+from abk_epr.companion_index import CompanionIndex
+from abk_epr.dedup import DedupStage, ImportIndex
+from abk_epr.dir_scanner import DirectoryScanner
+from abk_epr.dng_conversion import ConversionResult, DngConversionStage
+from abk_epr.dng_verify import DngVerifier, VerifyResult
+from abk_epr.exif_reader import NativeExifSession
+from abk_epr.exif_session import ExifToolPool, ExifToolSession
+from abk_epr.file_mover import FileMover
+from abk_epr.journal import JournalOp, JournalState, OperationJournal
+from abk_epr.metadata_cache import MetadataCache
+from abk_epr.metadata_record import MetadataRecord
+from abk_epr.metrics import MetricsRegistry
+from abk_epr.name_allocator import NameAllocator
+from abk_epr.plan import OperationPlan, PlanRecord
+from abk_epr.tracing import LoopBlockMonitor, tracer
+from abk_epr.watch import WatchRunner
 
 
 # -----------------------------------------------------------------------------
@@ -32,20 +51,13 @@ from abk_epr.clo import CommandLineOptions
 # -----------------------------------------------------------------------------
 # local functions
 # -----------------------------------------------------------------------------
-class ListType(Enum):
-    """ListType is type of image or video list."""
-
-    RAW_IMAGE_DICT = "raw_image_dict"
-    THUMB_IMAGE_DICT = "thumb_image_dict"
-    COMPRESSED_IMAGE_DICT = "compressed_image_dict"
-    COMPRESSED_VIDEO_DICT = "compressed_video_dict"
-
-
 class ExifTag(Enum):
     """ExifTags contains all exif meta data tags."""
 
     SOURCE_FILE = "SourceFile"
     CREATE_DATE = "EXIF:CreateDate"
+    SUB_SEC_TIME_ORIGINAL = "EXIF:SubSecTimeOriginal"
+    QUICKTIME_CREATE_DATE = "QuickTime:CreateDate"
     MAKE = "EXIF:Make"
     MODEL = "EXIF:Model"
 
@@ -53,64 +65,83 @@ class ExifTag(Enum):
 class ExifRename:
     """ExifRename contains module to convert RAW images to DNG & rename them using exif data."""
 
-    FILES_TO_EXCLUDE_EXPRESSION = r"Adobe Bridge Cache|Thumbs.db|^\."
-    THMB = {"ext": "jpg", "dir": "thmb"}
-    SUPPORTED_RAW_IMAGE_EXT = {
-        "Adobe": ["dng"],
-        "Canon": ["crw", "cr2", "cr3"],
-        "FujiFilm": ["raf"],
-        "Leica": ["rwl"],
-        "Minolta": ["mrw"],
-        "Nikon": ["nef", "nrw"],
-        "Olympus": ["orw"],
-        "Panasonic": ["raw", "rw2"],
-        "Pentax": ["pef"],
-        "Samsung": ["srw"],
-        "Sony": ["arw", "sr2"],
-    }
-    SUPPORTED_COMPRESSED_IMAGE_EXT_LIST = [
-        "gif",
-        "heic",
-        "jpg",
-        "jpeg",
-        "jng",
-        "mng",
-        "png",
-        "psd",
-        "tiff",
-        "tif",
-    ]
-    # crm (Canon Raw Movie) is not compressed,
-    # but we are not going to compress/transform into other format.
-    SUPPORTED_COMPRESSED_VIDEO_EXT_LIST = [
-        "3g2",
-        "3gp2",
-        "crm",
-        "m4a",
-        "m4b",
-        "m4p",
-        "m4v",
-        "mov",
-        "mp4",
-        "mqv",
-        "qt",
-    ]
     EXIF_UNKNOWN = "unknown"
     DATE_UNKNOWN = "yyyymmdd"
     DIR_NAME = "DirName"
-    EXIF_TAGS = [ExifTag.CREATE_DATE.value, ExifTag.MAKE.value, ExifTag.MODEL.value]
+    EXIF_TAGS = [
+        ExifTag.CREATE_DATE.value,
+        ExifTag.SUB_SEC_TIME_ORIGINAL.value,
+        ExifTag.MAKE.value,
+        ExifTag.MODEL.value,
+        ExifTag.QUICKTIME_CREATE_DATE.value,
+    ]
+    QUICKTIME_ZERO_DATE = "0000:00:00 00:00:00"
+    STREAM_QUEUE_DEPTH = 2
 
-    def __init__(self, logger: logging.Logger, op_dir: str):
+    def __init__(
+        self,
+        logger: logging.Logger,
+        op_dir: str,
+        exiftool_session: ExifToolSession | ExifToolPool | NativeExifSession = None,  # type: ignore
+        stream_window: int = 0,
+        metadata_cache: MetadataCache = None,  # type: ignore
+        file_mover: FileMover = None,  # type: ignore
+        conversion_stage: DngConversionStage = None,  # type: ignore
+        journal: OperationJournal = None,  # type: ignore
+        resume: bool = False,
+        dng_verifier: DngVerifier = None,  # type: ignore
+        metrics: MetricsRegistry = None,  # type: ignore
+        classification_rules: ClassificationRules = None,  # type: ignore
+        scan_depth: int | None = 0,
+        dedup_stage: DedupStage = None,  # type: ignore
+    ):
         """ExifRename init."""
         self._logger = logger or logging.getLogger(__name__)
         self._op_dir = op_dir
+        self._exiftool = exiftool_session or ExifToolSession(logger=self._logger)
+        self._stream_window = stream_window
+        self._metadata_cache = metadata_cache
+        self._metrics = metrics or MetricsRegistry()
+        self._file_mover = file_mover or FileMover(logger=self._logger)
+        self._conversion_stage = conversion_stage or DngConversionStage(
+            logger=self._logger, metrics=self._metrics
+        )
+        self._convert_dirs: dict[str, str] = {}
+        self._journal = journal
+        self._resume = resume
+        self._dng_verifier = dng_verifier or DngVerifier(logger=self._logger)
+        self._dedup_stage = dedup_stage
+        self.verify_results: list[VerifyResult] = []
+        self.renamed_count = 0
+        self._name_allocator = NameAllocator()
+        # raw files an applied plan allows to delete, None allows all verified ones
+        self._planned_deletes: set[str] | None = None
         self._current_dir = None
-        self._supported_raw_image_ext_list = list(
-            set([ext for exts in self.SUPPORTED_RAW_IMAGE_EXT.values() for ext in exts])
+        self._image_dir = ""
+        # a deferred run leaves verification and raw file deletion to finish_conversion
+        self._defer_conversion = False
+        self._conversion_deferred = False
+        self._rules = classification_rules or ClassificationRules()
+        self._supported_raw_image_ext_list = self._rules.raw_extensions
+        self._dir_scanner = DirectoryScanner(
+            logger=self._logger,
+            max_depth=scan_depth,
+            exclude=self._rules.is_excluded,
+            prune=self._rules.is_target_dir,
         )
         self._logger.debug(f"{self._supported_raw_image_ext_list = }")
         self._project_name = None
 
+    @property
+    def classification_rules(self) -> ClassificationRules:
+        """Rules classifying the files of the directory."""
+        return self._rules
+
+    @property
+    def conversion_stage(self) -> DngConversionStage:
+        """Stage converting the renamed RAW files."""
+        return self._conversion_stage
+
     @property
     def project_name(self) -> str:
         """Returns project name."""
@@ -125,20 +156,255 @@ class ExifRename:
     @function_trace
     def check_exiftool(self) -> None:
         """Check EXIF tool is installed."""
-        with exiftool.ExifTool() as exif_tool:
-            exif_tool.logger = self._logger
-            exiftool_exe = exif_tool.executable
-            self._logger.debug(f"{exiftool_exe=}")
+        self._exiftool.start()
+        exiftool_exe = self._exiftool.executable
+        self._logger.debug(f"{exiftool_exe=}, {self._exiftool.version=}")
+
+    @function_trace
+    async def move_rename_convert_images(self, defer_conversion: bool = False) -> None:
+        """Move, rename and convert images.
+
+        Args:
+            defer_conversion (bool): return once all files are renamed and queued for
+                conversion, the caller joins the conversion stage and then calls
+                finish_conversion to verify the DNGs and delete the RAW files
+        """
+        self._defer_conversion = defer_conversion
+        self.open_image_dir()
+        finished = False
+        try:
+            resumed_count = await self._resume_from_journal() if self._resume else 0
+            if self._stream_window > 0:
+                await self._stream_move_rename_convert(allow_empty=resumed_count > 0)
+            else:
+                metadata_list = self._read_image_dir(allow_empty=resumed_count > 0)
+                await self._move_and_rename_files_concurrently(metadata_list)
+            finished = True
+        except BaseException:
+            self._conversion_deferred = False
+            raise
+        finally:
+            self._defer_conversion = False
+            self.close_image_dir(finished)
+
+    @function_trace
+    async def finish_conversion(self) -> None:
+        """Completes a run deferred by move_rename_convert_images.
+
+        Verifies the DNGs and deletes the converted RAW files of the image directory,
+        once the conversion stage has been joined.
+        """
+        if not self._conversion_deferred:
+            return
+        self._conversion_deferred = False
+        self._change_to_image_dir()
+        finished = False
+        try:
+            await self._delete_converted_raw_files()
+            finished = True
+        finally:
+            self.close_image_dir(finished)
+
+    @function_trace
+    def plan(self) -> OperationPlan:
+        """Plans renames, conversions and raw file deletions without changing any file.
+
+        Returns:
+            OperationPlan: operations with paths relative to the image directory
+        """
+        self._validate_image_dir()
+        self._change_to_image_dir()
+        try:
+            plan = OperationPlan(os.getcwd())
+            with PerformanceTimer(timer_name="Planning", logger=self._logger):
+                list_collection = self._read_image_dir(dry_run=True)
+                conversions: list[PlanRecord] = []
+                for list_type, directories in list_collection.items():
+                    for directory, metadata_list in directories.items():
+                        dng_dir = (
+                            self.dng_dir_name(directory)
+                            if list_type == ListType.RAW_IMAGE_DICT.value
+                            else None
+                        )
+                        for record in metadata_list:
+                            src = record.source_file
+                            dst = os.path.normpath(self._new_file_name(directory, record))
+                            plan.records.append(
+                                PlanRecord(JournalOp.RENAME, src, dst, os.path.getsize(src))
+                            )
+                            if dng_dir is not None:
+                                conversions.append(PlanRecord(JournalOp.CONVERT, dst, dng_dir))
+                                conversions.append(PlanRecord(JournalOp.DELETE, dst, dst))
+                plan.records.extend(conversions)
+        finally:
+            self._change_from_image_dir()
+        self._logger.info(f"planned {len(plan.records)} operations for {plan.project_dir}")
+        return plan
+
+    @function_trace
+    async def apply_plan(self, plan: OperationPlan) -> int:
+        """Carries out a plan made by plan, possibly on another host.
+
+        Renames whose source is missing or changed in size since planning are skipped.
+        Raw files are only deleted if the plan lists them and their DNG passed
+        verification.
+
+        Args:
+            plan (OperationPlan): plan for the image directory
+
+        Returns:
+            int: number of renamed files
+        """
+        self.open_image_dir()
+        finished = False
+        try:
+            if os.path.basename(os.getcwd()) != os.path.basename(plan.project_dir):
+                raise Exception(f"plan was made for {plan.project_dir}, not for {os.getcwd()}")
+            dng_dirs = {record.src: record.dst for record in plan.operations(JournalOp.CONVERT)}
+            self._planned_deletes = {record.src for record in plan.operations(JournalOp.DELETE)}
+            renames: list[tuple[str, str, str | None]] = []
+            for record in plan.operations(JournalOp.RENAME):
+                try:
+                    size = os.path.getsize(record.src)
+                except OSError:
+                    size = -1
+                if size != record.size:
+                    self._logger.warning(
+                        f"skipping {record.src}: missing or changed since planned"
+                    )
+                    continue
+                dng_dir = dng_dirs.get(record.dst)
+                if dng_dir is not None:
+                    self._convert_dirs[os.path.dirname(record.dst)] = dng_dir
+                renames.append((record.src, record.dst, dng_dir))
+            for directory in {os.path.dirname(dst) for _, dst, _ in renames}:
+                os.makedirs(directory, exist_ok=True)
+            with PerformanceTimer(timer_name="ApplyingPlan", logger=self._logger):
+                await asyncio.gather(
+                    *(
+                        self._rename_and_queue_conversion(src, dst, dng_dir)
+                        for src, dst, dng_dir in renames
+                    )
+                )
+                await self._finish_conversion()
+            finished = True
+        finally:
+            self._planned_deletes = None
+            self.close_image_dir(finished)
+        return self.renamed_count
 
     @function_trace
-    async def move_rename_convert_images(self) -> None:
-        """Move, rename and convert images."""
+    def open_image_dir(self) -> None:
+        """Validates and changes into the image directory and opens the journal."""
         self._validate_image_dir()
         self._change_to_image_dir()
-        metadata_list = self._read_image_dir()
-        await self._move_and_rename_files_concurrently(metadata_list)
+        self._image_dir = os.getcwd()
+        if self._journal is not None:
+            self._journal.open()
+            self._conversion_stage.add_result_listener(self._journal_conversion)
+
+    @function_trace
+    def close_image_dir(self, finished: bool = False) -> None:
+        """Closes the journal and returns from the image directory.
+
+        The journal of a finished run is archived, so the next run starts a fresh one and
+        undo reverts only the last run. The journal of a deferred run stays open for the
+        conversions still running.
+
+        Args:
+            finished (bool): True if the run completed without error
+        """
+        if self._journal is not None and not self._conversion_deferred:
+            self._conversion_stage.remove_result_listener(self._journal_conversion)
+            if finished:
+                self._journal.archive(OperationJournal.FINISHED)
+            else:
+                self._journal.close()
         self._change_from_image_dir()
 
+    @function_trace
+    async def process_files(self, files: list[str]) -> int:
+        """Moves, renames and converts some files of the opened image directory.
+
+        Used by watch mode for files that arrived since the last call. Thumbnails are
+        detected against all files currently in the directory.
+
+        Args:
+            files (list[str]): files in the image directory to process
+
+        Returns:
+            int: number of renamed files
+        """
+        renamed_before = self.renamed_count
+        companion_index = CompanionIndex(
+            self._scan_image_dir(), self._supported_raw_image_ext_list
+        )
+        files = await asyncio.to_thread(self._dedup_files, files)
+        list_collection = self._collect_metadata(files, companion_index)
+        await self._move_and_rename_files_concurrently(list_collection)
+        return self.renamed_count - renamed_before
+
+    @function_trace
+    async def undo(self) -> None:
+        """Reverts the renames of the last run and removes DNGs of restored raws.
+
+        The last run is the interrupted one, if the journal of a run is left in place,
+        otherwise the last finished run.
+        """
+        if self._journal is None:
+            raise Exception("undo needs an operation journal.")
+        self._validate_image_dir()
+        self._change_to_image_dir()
+        self._journal.load_last_run()
+        for raw_file, dng_file in self._journal.completed_operations(JournalOp.CONVERT):
+            if not os.path.isfile(dng_file):
+                continue
+            if os.path.isfile(raw_file):
+                os.remove(dng_file)
+            else:
+                self._logger.warning(f"keeping {dng_file}, its raw file has been deleted")
+        undo_moves = [
+            (dst, src)
+            for src, dst in reversed(self._journal.completed_operations(JournalOp.RENAME))
+            if os.path.isfile(dst) and not os.path.exists(src)
+        ]
+        with PerformanceTimer(timer_name="UndoRenames", logger=self._logger):
+            undone_count = await self._file_mover.move_many(undo_moves)
+        if self._dedup_stage is not None:
+            self._dedup_stage.forget(dst for dst, src in undo_moves if os.path.exists(src))
+        for directory in {os.path.dirname(dst) for dst, _ in undo_moves}:
+            if directory and os.path.isdir(directory) and not os.listdir(directory):
+                os.rmdir(directory)
+        archived = self._journal.archive("undone")
+        self._logger.info(f"undone {undone_count} renames, journal archived to {archived}")
+        self._change_from_image_dir()
+
+    async def _resume_from_journal(self) -> int:
+        """Queues conversion of raw files renamed by an interrupted run.
+
+        Returns:
+            int: number of files queued for conversion
+        """
+        resumed_count = 0
+        for _, renamed_file in self._journal.completed_operations(JournalOp.RENAME):  # type: ignore
+            raw_dir = os.path.dirname(renamed_file)
+            if not raw_dir or not os.path.isfile(renamed_file):
+                continue
+            if raw_dir.rsplit("_", 1)[-1] not in self._supported_raw_image_ext_list:
+                continue
+            dng_dir = self._dng_dir_for(raw_dir)
+            if dng_dir is None or self._journal.completed(JournalOp.CONVERT, renamed_file):  # type: ignore
+                continue
+            await self._conversion_stage.put(renamed_file, dng_dir)
+            resumed_count += 1
+        self._logger.info(f"resuming: {resumed_count} raw files queued for conversion")
+        return resumed_count
+
+    def _journal_conversion(self, result: ConversionResult) -> None:
+        """Records a successful conversion of the image directory in the journal."""
+        if result.ok and result.directory == self._image_dir:
+            self._journal.done(JournalOp.CONVERT, result.source, result.destination)  # type: ignore
+
     @function_trace
     def return_to_previous_state(self) -> None:
         """Returns to the previous state."""
@@ -165,204 +431,577 @@ class ExifRename:
         if collection_dict:
             for key, value in collection_dict.items():
                 await self._move_and_rename_files(key, value)
+        await self._finish_conversion()
 
-    async def _rename_file_async(self, old_name: str, new_file: str) -> None:
-        """Rename file asynchronously.
+    async def _rename_file_async(self, old_name: str, new_file: str) -> bool:
+        """Rename file asynchronously on the file mover thread pool.
 
         Args:
-            old_name (str): _description_
-            new_file (str): _description_
+            old_name (str): file to rename
+            new_file (str): new file name
+
+        Returns:
+            bool: True if the file has been renamed
         """
-        try:
-            os.rename(old_name, new_file)
-            self._logger.debug(f"renamed file: {old_name} to {new_file}")
-        except OSError as exp:
-            self._logger.error(f"Error renaming: {old_name}: {str(exp)}")
+        if self._journal is not None:
+            self._journal.plan(JournalOp.RENAME, old_name, new_file)
+        renamed = await self._file_mover.move(old_name, new_file)
+        if renamed:
+            self.renamed_count += 1
+            self._metrics.inc("epr_files_renamed_total")
+            if self._journal is not None:
+                self._journal.done(JournalOp.RENAME, old_name, new_file)
+        return renamed
+
+    async def _rename_and_queue_conversion(
+        self, old_name: str, new_file: str, dng_dir: str | None
+    ) -> bool:
+        """Renames file and hands it over to the conversion stage right away."""
+        renamed = await self._rename_file_async(old_name, new_file)
+        if renamed and self._dedup_stage is not None:
+            # converted raw files are deleted, their content can only be hashed now
+            self._dedup_stage.record(old_name, new_file, full=dng_dir is not None)
+        if renamed and dng_dir is not None:
+            await self._conversion_stage.put(new_file, dng_dir)
+        return renamed
+
+    def _dng_dir_for(self, raw_dir: str) -> str | None:
+        """Returns dng directory for a raw directory and records it for raw file deletion."""
+        dng_dir = self.dng_dir_name(raw_dir)
+        if dng_dir is not None:
+            self._convert_dirs[raw_dir] = dng_dir
+        return dng_dir
+
+    @staticmethod
+    def dng_dir_name(raw_dir: str) -> str | None:
+        """Returns dng directory for a raw directory, None if it already holds dng files."""
+        base_dir, dir_ext = raw_dir.rsplit("_", 1)
+        if dir_ext == "dng":
+            return None
+        return f"{base_dir}_dng"
 
     @function_trace
     async def _move_and_rename_files(self, key, value) -> None:
         """Moves and renames files."""
-        self._logger.info(f"_move_and_rename_files: {key = }, {value = }")
-        rename_files_list: list[tuple[str, str]] = []
+        self._logger.info("_move_and_rename_files: key = %s, %d directories", key, len(value))
+        self._logger.debug("value = %s", value)
+        rename_files_list: list[tuple[str, str, str | None]] = []
         for directory, obj_list in value.items():
             file_ext = directory.split("_")[-1]
-            self._logger.info(f"{directory = }, {file_ext = }, {obj_list = }")
+            self._logger.info(
+                "directory = %s, file_ext = %s, %d files", directory, file_ext, len(obj_list)
+            )
+            self._logger.debug("obj_list = %s", obj_list)
             if not os.path.exists(directory):
                 os.makedirs(directory)
-            for obj in obj_list:
-                # self._logger.info(f'ABK: {obj = }')
-                new_file_name = f"./{directory}/{obj[ExifTag.CREATE_DATE.value]}_{obj[ExifTag.MAKE.value]}_{obj[ExifTag.MODEL.value]}_{self.project_name}.{file_ext}".lower()  # noqa: E501
-                old_file_name = obj[ExifTag.SOURCE_FILE.value]
-                # self._logger.info(f"ABK: {old_file_name = }, {new_file_name = }")
-                rename_files_list.append((old_file_name, new_file_name))
+            dng_dir = (
+                self._dng_dir_for(directory) if key == ListType.RAW_IMAGE_DICT.value else None
+            )
+            for record in obj_list:
+                new_file_name = self._new_file_name(directory, record)
+                rename_files_list.append((record.source_file, new_file_name, dng_dir))
         if len(rename_files_list) > 0:
             rename_tasks = [
-                self._rename_file_async(old_name, new_name)
-                for old_name, new_name in rename_files_list
+                self._rename_and_queue_conversion(old_name, new_name, dng_dir)
+                for old_name, new_name, dng_dir in rename_files_list
             ]  # noqa: E501
-            await asyncio.gather(*rename_tasks)
-
-        if key == ListType.RAW_IMAGE_DICT.value:
-            self._logger.info(f"{ListType.RAW_IMAGE_DICT.value = }")
-            convert_list: list[tuple[str, str]] = []
-            for old_dir, obj_list in value.items():  # noqa: B007
-                base_dir, dir_ext = old_dir.rsplit("_", 1)
-                if dir_ext == "dng":
-                    continue
-                new_dir = f"{base_dir}_dng"
-                convert_list.append((old_dir, new_dir))
-            if len(convert_list) > 0:
-                self._logger.info(f"{convert_list = }")
-                convert_tasks = [
-                    self._convert_raw_files(old_dir, new_dir) for old_dir, new_dir in convert_list
-                ]  # noqa: E501
-                await asyncio.gather(*convert_tasks)
-                self._delete_org_raw_files(convert_list)
-
-    async def _convert_raw_files(self, src_dir: str, dst_dir: str):
-        """Converts raw files."""
-        if not os.path.exists(dst_dir):
-            os.makedirs(dst_dir)
-        py_dng = DNGConverter(source=Path(src_dir), dest=Path(dst_dir))
-        return await py_dng.convert()
+            with self._metrics.stage("rename") as stage:
+                stage.files = sum(await asyncio.gather(*rename_tasks))
+
+    def _new_file_name(self, directory: str, record: MetadataRecord) -> str:
+        """Builds a new, not yet taken file name from the metadata record.
+
+        The sub seconds are added to the time when the file has them, other files of
+        the same second get a sequence suffix from the name allocator.
+        """
+        file_ext = directory.split("_")[-1]
+        create_date = record.create_date
+        if record.sub_sec:
+            create_date = f"{create_date}_{record.sub_sec}"
+        stem = f"{create_date}_{record.make}_{record.model}_{self.project_name}"
+        sibling_dir = (
+            self.dng_dir_name(directory)
+            if file_ext in self._supported_raw_image_ext_list
+            else None
+        )
+        return f"./{self._name_allocator.allocate(directory, stem, file_ext, sibling_dir)}"
+
+    async def _finish_conversion(self) -> None:
+        """Waits for the conversion stage and deletes the converted raw files."""
+        if self._journal is not None:
+            self._journal.flush()
+        if self._defer_conversion:
+            self._conversion_deferred = True
+            return
+        await self._conversion_stage.join()
+        await self._delete_converted_raw_files()
+
+    async def _delete_converted_raw_files(self) -> None:
+        """Deletes the raw files converted by the joined conversion stage."""
+        if self._journal is not None:
+            self._journal.flush()
+        if self._dedup_stage is not None:
+            # the renamed raw files were hashed during conversion, before they are deleted
+            await asyncio.to_thread(self._dedup_stage.finish)
+        convert_list = list(self._convert_dirs.items())
+        if len(convert_list) > 0:
+            self._logger.info("convert_list = %s", convert_list)
+            await asyncio.to_thread(self._delete_org_raw_files, convert_list)
+        self._convert_dirs.clear()
+
+    @function_trace
+    async def _stream_move_rename_convert(self, allow_empty: bool = False) -> None:
+        """Streams files through bounded scan, metadata, classify, rename and convert stages.
+
+        Metadata is read in chunks of stream_window files, and renaming starts as soon as
+        the first chunk is classified. Only file names are kept for the whole directory,
+        the metadata held in memory is bounded by the window size.
+        """
+        scanned_list = self._scan_image_dir()
+        companion_index = CompanionIndex(scanned_list, self._supported_raw_image_ext_list)
+        filtered_list = await asyncio.to_thread(self._dedup_files, scanned_list)
+        allow_empty = allow_empty or len(filtered_list) < len(scanned_list)
+        metadata_queue: asyncio.Queue = asyncio.Queue(maxsize=self.STREAM_QUEUE_DEPTH)
+        rename_queue: asyncio.Queue = asyncio.Queue(maxsize=self._stream_window)
+        renamed_count = 0
+
+        async def metadata_stage() -> None:
+            for start in range(0, len(filtered_list), self._stream_window):
+                chunk = filtered_list[start : start + self._stream_window]
+                metadata_list = await asyncio.to_thread(self._read_metadata, chunk)
+                await metadata_queue.put(metadata_list)
+            await metadata_queue.put(None)
+
+        async def classify_stage() -> None:
+            while (metadata_list := await metadata_queue.get()) is not None:
+                classified_list = []
+                with self._metrics.stage("classify") as stage:
+                    for metadata in metadata_list:
+                        classified = self._classify_metadata(metadata, companion_index)
+                        if classified:
+                            classified_list.append(classified)
+                    stage.files = len(metadata_list)
+                self._cache_metadata(item[-1] for item in classified_list)
+                for item in classified_list:
+                    await rename_queue.put(item)
+            await rename_queue.put(None)
+
+        async def rename_stage() -> None:
+            with self._metrics.stage("rename") as stage:
+                await rename_files()
+                stage.files = renamed_count
+
+        async def rename_files() -> None:
+            nonlocal renamed_count
+            created_dirs: set[str] = set()
+            pending: set[asyncio.Task] = set()
+            while (item := await rename_queue.get()) is not None:
+                list_type, dir_name, record = item
+                if dir_name not in created_dirs:
+                    os.makedirs(dir_name, exist_ok=True)
+                    created_dirs.add(dir_name)
+                dng_dir = (
+                    self._dng_dir_for(dir_name) if list_type == ListType.RAW_IMAGE_DICT else None
+                )
+                if len(pending) >= self._file_mover.max_in_flight:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    renamed_count += sum(task.result() for task in done)
+                pending.add(
+                    asyncio.create_task(
+                        self._rename_and_queue_conversion(
+                            record.source_file, self._new_file_name(dir_name, record), dng_dir
+                        )
+                    )
+                )
+            if pending:
+                renamed_count += sum(await asyncio.gather(*pending))
+
+        with PerformanceTimer(timer_name="StreamingRename", logger=self._logger):
+            try:
+                async with asyncio.TaskGroup() as task_group:
+                    task_group.create_task(metadata_stage())
+                    task_group.create_task(classify_stage())
+                    task_group.create_task(rename_stage())
+            except ExceptionGroup as exc_group:
+                raise exc_group.exceptions[0] from exc_group
+
+        if renamed_count == 0 and not allow_empty:
+            raise Exception("no files to process for the current directory.")
+        self._logger.info(f"{renamed_count = }, {self._conversion_stage.submitted = }")
+        await self._finish_conversion()
 
     def _delete_org_raw_files(self, convert_list: list[tuple[str, str]]):
-        """Deletes original raw files."""
+        """Deletes original raw files, whose DNG passed verification."""
         for raw_dir, dng_dir in convert_list:
-            raw_files = [file_name.rsplit(".", 1)[0] for file_name in os.listdir(raw_dir)]
-            dng_files = [file_name.rsplit(".", 1)[0] for file_name in os.listdir(dng_dir)]
-            if all(file_name in dng_files for file_name in raw_files):
-                self._logger.info(f"Deleting directory: {raw_dir}")
-                shutil.rmtree(raw_dir)
-            else:
-                self._logger.info(f"Not deleting directory: {raw_dir}")
+            if not os.path.isdir(raw_dir):
+                continue
+            raw_files = {file_name.rsplit(".", 1)[0] for file_name in os.listdir(raw_dir)}
+            dng_files = (
+                {file_name.rsplit(".", 1)[0] for file_name in os.listdir(dng_dir)}
+                if os.path.isdir(dng_dir)
+                else set()
+            )
+            with self._metrics.stage("verify") as stage:
+                verify_results = self._dng_verifier.verify_many(
+                    os.path.join(dng_dir, f"{file_name}.dng")
+                    for file_name in raw_files & dng_files
+                )
+                stage.files = len(verify_results)
+            for result in verify_results.values():
+                self._metrics.inc(
+                    "epr_verifications_total", result="ok" if result.ok else "failed"
+                )
+            self.verify_results.extend(verify_results.values())
+            for result in verify_results.values():
+                if not result.ok:
+                    self._logger.warning(
+                        f"DNG verification failed: {result.path}: {result.reason}"
+                    )
+            verified_files = {
+                os.path.basename(result.path).rsplit(".", 1)[0]
+                for result in verify_results.values()
+                if result.ok
+            }
+            if self._planned_deletes is not None:
                 raw_file_ext = raw_dir.split("_")[-1]
-                matching_files = set(raw_files).intersection(dng_files)
-                for file_name in matching_files:
-                    full_file_name = os.path.join(raw_dir, f"{file_name}.{raw_file_ext}")
-                    self._logger.info(f"Deleting file: {full_file_name}")
-                    os.remove(full_file_name)
+                verified_files = {
+                    file_name
+                    for file_name in verified_files
+                    if os.path.normpath(os.path.join(raw_dir, f"{file_name}.{raw_file_ext}"))
+                    in self._planned_deletes
+                }
+            with self._metrics.stage("delete") as stage:
+                if verified_files == raw_files:
+                    self._logger.info("Deleting directory: %s", raw_dir)
+                    self._journal_delete(raw_dir, JournalState.PLANNED)
+                    shutil.rmtree(raw_dir)
+                    self._journal_delete(raw_dir, JournalState.DONE)
+                else:
+                    self._logger.info("Not deleting directory: %s", raw_dir)
+                    raw_file_ext = raw_dir.split("_")[-1]
+                    for file_name in verified_files:
+                        full_file_name = os.path.join(raw_dir, f"{file_name}.{raw_file_ext}")
+                        self._logger.info("Deleting file: %s", full_file_name)
+                        self._journal_delete(full_file_name, JournalState.PLANNED)
+                        os.remove(full_file_name)
+                        self._journal_delete(full_file_name, JournalState.DONE)
+                stage.files = len(verified_files)
+            self._metrics.inc("epr_raw_files_deleted_total", len(verified_files))
+        if self._journal is not None:
+            self._journal.flush()
+        failed = [result.path for result in self.verify_results if not result.ok]
+        self._logger.info(
+            f"verification: {len(self.verify_results) - len(failed)} DNGs ok, "
+            f"{len(failed)} failed {failed}"
+        )
 
-    @function_trace
-    def _read_image_dir(self) -> dict:
-        """Reads image directory."""
-        list_collection = {}
-        with PerformanceTimer(timer_name="ReadingImageDirectory", logger=self._logger):
-            files_list = [f for f in os.listdir(".") if os.path.isfile(f)]
-            filtered_list = sorted(
-                [i for i in files_list if not re.match(rf"{self.FILES_TO_EXCLUDE_EXPRESSION}", i)]
-            )
-            self._logger.debug(f"filtered_list = {filtered_list}")
-            with exiftool.ExifToolHelper() as etp:
-                etp.logger = self._logger
-                metadata_list = etp.get_tags(files=filtered_list, tags=self.EXIF_TAGS)
-                self._logger.debug(f"{metadata_list = }")
+    def _journal_delete(self, path: str, state: JournalState) -> None:
+        """Records a raw file or directory deletion in the journal."""
+        if self._journal is not None:
+            if state == JournalState.PLANNED:
+                self._journal.plan(JournalOp.DELETE, path, path)
+            else:
+                self._journal.done(JournalOp.DELETE, path, path)
+
+    def _scan_image_dir(self) -> list[str]:
+        """Returns sorted list of files in the current directory, without excluded files.
+
+        With a scan depth, files in sub directories like the DCIM tree of a card copy
+        are listed by their relative path, and are moved up into the camera directories.
+        """
+        with self._metrics.stage("scan") as stage:
+            filtered_list = self._dir_scanner.files()
+            stage.files = len(filtered_list)
+        self._logger.debug("filtered_list = %s", filtered_list)
+        return filtered_list
+
+    def _dedup_files(self, files: list[str], dry_run: bool = False) -> list[str]:
+        """Returns the files to import, without duplicates of imported files if enabled."""
+        if self._dedup_stage is None:
+            return files
+        return self._dedup_stage.filter(files, dry_run)
+
+    def _read_metadata(self, files: list[str]) -> list[dict | MetadataRecord]:
+        """Reads records of files from the cache where possible, exiftool metadata otherwise."""
+        if self._metadata_cache is None:
+            return self._get_tags(files)
+        cached = self._metadata_cache.get_many(files)
+        missing = [f for f in files if f not in cached]
+        self._logger.debug("metadata cache: %d cached, %d to read", len(cached), len(missing))
+        self._metrics.inc("epr_exif_reads_total", len(cached), reader="cache")
+        fetched = iter(self._get_tags(missing) if missing else [])
+        return [cached[f] if f in cached else next(fetched) for f in files]
+
+    def _get_tags(self, files: list[str]) -> list[dict]:
+        """Reads metadata of files with the exif session, as the exiftool stage."""
+        with self._metrics.stage("exiftool") as stage:
+            metadata_list = self._exiftool.get_tags(files=files, tags=self.EXIF_TAGS)
+            stage.files = len(files)
+        return metadata_list
+
+    def _cache_metadata(self, records: Iterable[MetadataRecord]) -> None:
+        """Stores records in the cache, if enabled."""
+        if self._metadata_cache is not None:
+            self._metadata_cache.put_many(records)
+
+    def _classify_metadata(
+        self, metadata: dict | MetadataRecord, companion_index: CompanionIndex
+    ) -> tuple[ListType, str, MetadataRecord] | None:
+        """Classifies a file and normalizes its metadata into a record.
+
+        Args:
+            metadata (dict | MetadataRecord): exiftool metadata of the file or its cached record
+            companion_index (CompanionIndex): companion files of the directory
+
+        Returns:
+            tuple[ListType, str, MetadataRecord] | None: list type, target directory and record
+                or None if unsupported
+        """
+        if isinstance(metadata, MetadataRecord):
+            file_name = metadata.source_file
+        else:
+            file_name = metadata.get(ExifTag.SOURCE_FILE.value)
+        rule = self._rules.rule_for(file_name)
+        if rule is None:
+            return None
+        # detect thumbnail files
+        if rule.companion is not None and companion_index.has_raw(file_name):
+            rule = rule.companion
+            self._logger.debug("file_extension=%r for file: %s", rule.dir_ext, file_name)
+
+        if isinstance(metadata, MetadataRecord):
+            record = metadata
+        else:
+            record = self._normalize_metadata(metadata, rule)
+        dir_name = "_".join([record.make, record.model, rule.dir_ext]).lower()
+        self._logger.debug("list_type.value = %r", rule.list_type.value)
+        return rule.list_type, dir_name, record
+
+    def _normalize_metadata(self, metadata: dict, rule: ExtensionRule) -> MetadataRecord:
+        """Returns the record of exiftool metadata, with names usable in file names."""
+        create_date = metadata.get(ExifTag.CREATE_DATE.value)
+        if create_date is None:
+            # videos often only have the QuickTime creation time of the movie header
+            quicktime_date = metadata.get(ExifTag.QUICKTIME_CREATE_DATE.value)
+            if quicktime_date in (None, self.QUICKTIME_ZERO_DATE):
+                create_date = self.EXIF_UNKNOWN
+            else:
+                create_date = quicktime_date
+        create_date = create_date.replace(":", "").replace(" ", "_")
+        make = metadata.get(ExifTag.MAKE.value, self.EXIF_UNKNOWN).replace(" ", "")
+        if make == self.EXIF_UNKNOWN and rule.vendor is not None:
+            make = rule.vendor
+        sub_sec = re.sub(r"\D", "", str(metadata.get(ExifTag.SUB_SEC_TIME_ORIGINAL.value, "")))
+        model = metadata.get(ExifTag.MODEL.value, self.EXIF_UNKNOWN).replace(" ", "")
+        if make in model and make != self.EXIF_UNKNOWN:
+            model = model.replace(make, "").strip()
+        return MetadataRecord.create(
+            metadata[ExifTag.SOURCE_FILE.value], create_date, make, model, sub_sec
+        )
+
+    def _collect_metadata(self, files: list[str], companion_index: CompanionIndex) -> dict:
+        """Reads and classifies metadata of files, grouped by list type and directory."""
+        metadata_list = self._read_metadata(files)
+        self._logger.debug("metadata_list = %s", metadata_list)
+        return self._group_metadata(metadata_list, companion_index)
+
+    def _group_metadata(
+        self, metadata_list: list[dict | MetadataRecord], companion_index: CompanionIndex
+    ) -> dict:
+        """Classifies metadata of files and groups the records by list type and directory."""
+        list_collection: dict = {}
+        records = []
+        with self._metrics.stage("classify") as stage:
             for metadata in metadata_list:
-                list_type: ListType | None = None
-                # detect thumbnail files
-                file_name = metadata.get(ExifTag.SOURCE_FILE.value)
-                file_base, file_extension = os.path.splitext(os.path.basename(file_name))
-                file_extension = file_extension.replace(".", "").lower()
-
-                if file_extension in self._supported_raw_image_ext_list:
-                    list_type = ListType.RAW_IMAGE_DICT
-                elif file_extension in self.SUPPORTED_COMPRESSED_IMAGE_EXT_LIST:
-                    if file_extension == self.THMB["ext"]:
-                        if any(
-                            f"{file_base.lower()}{raw_ext}" in [j.lower() for j in filtered_list]
-                            for raw_ext in self._supported_raw_image_ext_list
-                        ):
-                            file_extension = self.THMB["dir"]
-                            self._logger.debug(f"{file_extension=} for file: {file_name}")
-                            list_type = ListType.THUMB_IMAGE_DICT
-                        else:
-                            list_type = ListType.COMPRESSED_IMAGE_DICT
-                    else:
-                        list_type = ListType.COMPRESSED_IMAGE_DICT
-                elif file_extension in self.SUPPORTED_COMPRESSED_VIDEO_EXT_LIST:
-                    list_type = ListType.COMPRESSED_VIDEO_DICT
-
-                if list_type:
-                    metadata[ExifTag.CREATE_DATE.value] = (
-                        metadata.get(ExifTag.CREATE_DATE.value, self.EXIF_UNKNOWN)
-                        .replace(":", "")
-                        .replace(" ", "_")
-                    )
-                    metadata[ExifTag.MAKE.value] = metadata.get(
-                        ExifTag.MAKE.value, self.EXIF_UNKNOWN
-                    ).replace(" ", "")
-                    if (
-                        metadata[ExifTag.MAKE.value] == self.EXIF_UNKNOWN
-                        and list_type == ListType.RAW_IMAGE_DICT
-                    ):
-                        metadata[ExifTag.MAKE.value] = next(
-                            (
-                                key
-                                for key, value in self.SUPPORTED_RAW_IMAGE_EXT.items()
-                                if any(ext in file_extension for ext in value)
-                            ),
-                            self.EXIF_UNKNOWN,
-                        )
-                    metadata[ExifTag.MODEL.value] = metadata.get(
-                        ExifTag.MODEL.value, self.EXIF_UNKNOWN
-                    ).replace(" ", "")
-                    if (
-                        metadata[ExifTag.MAKE.value] in metadata[ExifTag.MODEL.value]
-                        and metadata[ExifTag.MAKE.value] != self.EXIF_UNKNOWN
-                    ):
-                        metadata[ExifTag.MODEL.value] = (
-                            metadata[ExifTag.MODEL.value]
-                            .replace(metadata[ExifTag.MAKE.value], "")
-                            .strip()
-                        )
-                    dir_parts = [
-                        metadata[ExifTag.MAKE.value],
-                        metadata[ExifTag.MODEL.value],
-                        file_extension,
-                    ]
-                    dir_name = "_".join(dir_parts).lower()
-                    self._logger.debug(f"{list_type.value = }")
+                classified = self._classify_metadata(metadata, companion_index)
+                if classified:
+                    list_type, dir_name, record = classified
                     list_collection.setdefault(list_type.value, {}).setdefault(
                         dir_name, []
-                    ).append(metadata)
+                    ).append(record)
+                    records.append(record)
+            stage.files = len(metadata_list)
+        self._cache_metadata(records)
+        return list_collection
+
+    @function_trace
+    def _read_image_dir(self, allow_empty: bool = False, dry_run: bool = False) -> dict:
+        """Reads image directory, without the duplicates of imported files."""
+        with PerformanceTimer(timer_name="ReadingImageDirectory", logger=self._logger):
+            scanned_list = self._scan_image_dir()
+            companion_index = CompanionIndex(scanned_list, self._supported_raw_image_ext_list)
+            filtered_list = self._dedup_files(scanned_list, dry_run)
+            allow_empty = allow_empty or len(filtered_list) < len(scanned_list)
+            list_collection = self._collect_metadata(filtered_list, companion_index)
             # TODO: if there is no date and time: get the date from the fir name and set time to 'xxxxxx'  # noqa: E501
             # TODO: if there is repeat in make and model remove the repeated words from model
 
-        if len(list_collection) == 0:
+        if len(list_collection) == 0 and not allow_empty:
             raise Exception("no files to process for the current directory.")
-        self._logger.debug(f"list_collection = {json.dumps(list_collection, indent=4)}")
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(
+                "list_collection = %s", json.dumps(list_collection, indent=4, default=asdict)
+            )
         return list_collection
 
     @function_trace
     def _validate_image_dir(self):
         self._logger.debug(f"{self._op_dir = }")
+        dir_name_to_validate = self._op_dir if self._op_dir != "." else os.getcwd()
+        if not self.is_project_dir(dir_name_to_validate):
+            raise Exception(
+                "Not a valid date / directory format, please use: YYYYMMDD_name_of_the_project"
+            )
+
+    @staticmethod
+    def is_project_dir(dir_name: str) -> bool:
+        """Returns True if the last part of dir_name is a valid YYYYMMDD_name directory."""
+        last_part_of_dir = os.path.basename(os.path.normpath(dir_name))
+        match = re.match(r"^(\d{8})_\w+$", last_part_of_dir)
+        if not match:
+            return False
         try:
-            dir_name_to_validate = self._op_dir if self._op_dir != "." else os.getcwd()
-            last_part_of_dir = os.path.basename(os.path.normpath(dir_name_to_validate))
+            datetime.strptime(match.group(1), "%Y%m%d")
+        except ValueError:
+            return False
+        return True
 
-            match = re.match(r"^(\d{8})_\w+$", last_part_of_dir)
-            if not match:
-                raise ValueError("Regex match failed")
 
-            datetime.strptime(match.group(1), "%Y%m%d")
+def write_metrics(metrics: MetricsRegistry, exiftool_session, options) -> None:
+    """Adds the process and reader counts of the exif session and writes the metrics."""
+    if exiftool_session is not None:
+        metrics.set("epr_exiftool_processes", exiftool_session.process_count)
+        if isinstance(exiftool_session, NativeExifSession):
+            metrics.inc("epr_exif_reads_total", exiftool_session.native_count, reader="native")
+            metrics.inc(
+                "epr_exif_reads_total", exiftool_session.fallback_count, reader="exiftool"
+            )
+    metrics.finish()
+    try:
+        metrics.write(options.metrics_out, options.metrics_format)
+    except OSError as exp:
+        print(
+            f"{Fore.RED}ERROR: writing metrics to {options.metrics_out}: {exp}{Style.RESET_ALL}"
+        )
+
+
+def write_trace(path: str) -> None:
+    """Writes the recorded spans as Chrome trace JSON."""
+    try:
+        tracer.write(path)
+    except OSError as exp:
+        print(f"{Fore.RED}ERROR: writing trace to {path}: {exp}{Style.RESET_ALL}")
 
-        except (AttributeError, ValueError) as e:
-            raise Exception(
-                "Not a valid date / directory format, please use: YYYYMMDD_name_of_the_project"
-            ) from e
 
+async def epr(clo: CommandLineOptions | None = None):
+    """Main program to order images.
 
-async def epr():
-    """Main program to order images."""
+    Args:
+        clo (CommandLineOptions | None): options handled by the caller, None to parse them here
+    """
     exit_code = 1
     exif_rename = None
+    exiftool_session = None
+    metadata_cache = None
+    dedup_stage = None
+    file_mover = None
+    metrics = MetricsRegistry()
+    block_monitor = None
     try:
-        clo = CommandLineOptions()
-        clo.handle_options()
-        exif_rename = ExifRename(logger=clo.logger, op_dir=clo.options.dir)
-        exif_rename.check_exiftool()
-        await exif_rename.move_rename_convert_images()
-        exit_code = 0
+        if clo is None:
+            clo = CommandLineOptions()
+            clo.handle_options()
+        if clo.options.trace:
+            tracer.enable()
+            block_monitor = LoopBlockMonitor(
+                logger=clo.logger, threshold=clo.options.trace_block_ms / 1000.0
+            )
+            block_monitor.start()
+        exiftool_session = ExifToolPool(logger=clo.logger, workers=clo.options.jobs)
+        if clo.options.native_exif:
+            exiftool_session = NativeExifSession(
+                logger=clo.logger, fallback_session=exiftool_session
+            )
+        if clo.options.cache:
+            metadata_cache = MetadataCache(logger=clo.logger, max_entries=clo.options.cache_size)
+        classification_rules = ClassificationRules.load(clo.options.rules)
+        if clo.options.dedup:
+            dedup_stage = DedupStage(
+                logger=clo.logger,
+                index=ImportIndex(logger=clo.logger, db_path=clo.options.dedup_index),
+                action=clo.options.dedup,
+                metrics=metrics,
+            )
+        file_mover = FileMover(logger=clo.logger, max_in_flight=clo.options.max_moves)
+        conversion_stage = DngConversionStage(
+            logger=clo.logger,
+            workers=clo.options.convert_workers,
+            max_bytes_in_flight=clo.options.convert_max_mb * 1024 * 1024,
+            metrics=metrics,
+        )
+
+        def make_exif_rename(op_dir: str) -> ExifRename:
+            return ExifRename(
+                logger=clo.logger,
+                op_dir=op_dir,
+                exiftool_session=exiftool_session,
+                stream_window=clo.options.window if clo.options.stream else 0,
+                metadata_cache=metadata_cache,
+                file_mover=file_mover,
+                conversion_stage=conversion_stage,
+                journal=OperationJournal(
+                    logger=clo.logger,
+                    path=os.path.abspath(os.path.join(op_dir, OperationJournal.FILE_NAME)),
+                ),
+                resume=clo.options.resume,
+                metrics=metrics,
+                classification_rules=classification_rules,
+                scan_depth=clo.options.max_depth if clo.options.recursive else 0,
+                dedup_stage=dedup_stage,
+            )
+
+        if clo.options.batch:
+            from abk_epr.batch import BatchRunner
+
+            exiftool_session.start()
+            summaries = await BatchRunner(
+                logger=clo.logger, root_dir=clo.options.batch, make_exif_rename=make_exif_rename
+            ).run()
+            exit_code = 0 if all(summary.ok for summary in summaries) else 1
+        elif clo.options.command == "watch":
+            exif_rename = make_exif_rename(clo.options.dir)
+            exif_rename.check_exiftool()
+            stop_event = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for stop_signal in (signal.SIGINT, signal.SIGTERM):
+                with contextlib.suppress(NotImplementedError):
+                    loop.add_signal_handler(stop_signal, stop_event.set)
+            await WatchRunner(
+                logger=clo.logger, exif_rename=exif_rename, settle_seconds=clo.options.settle
+            ).run(stop_event)
+            exit_code = 0
+        elif clo.options.command == "plan":
+            exif_rename = make_exif_rename(clo.options.dir)
+            exif_rename.check_exiftool()
+            plan = exif_rename.plan()
+            plan.write(clo.options.plan)
+            clo.logger.info(f"{len(plan.records)} operations written to {clo.options.plan}")
+            exit_code = 0
+        elif clo.options.command == "apply":
+            plan = OperationPlan.read(clo.options.plan)
+            exif_rename = make_exif_rename(clo.options.dir or plan.project_dir)
+            await exif_rename.apply_plan(plan)
+            exit_code = 0
+        else:
+            exif_rename = make_exif_rename(clo.options.dir)
+            if clo.options.undo:
+                await exif_rename.undo()
+            else:
+                exif_rename.check_exiftool()
+                await exif_rename.move_rename_convert_images()
+            exit_code = 0
     except Exception as exception:
         if exif_rename:
             exif_rename.return_to_previous_state()
@@ -370,9 +1009,22 @@ async def epr():
         print(f"EXCEPTION: {exception}{Style.RESET_ALL}")
         exit_code = 1
     finally:
+        options = getattr(clo, "options", None)
+        if block_monitor is not None:
+            await block_monitor.stop()
+            write_trace(options.trace)
+        if options is not None and options.metrics_out:
+            write_metrics(metrics, exiftool_session, options)
+        if exiftool_session:
+            exiftool_session.close()
+        if metadata_cache:
+            metadata_cache.close()
+        if dedup_stage:
+            dedup_stage.close()
+        if file_mover:
+            file_mover.close()
         sys.exit(exit_code)
 
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(epr())
@@ -0,0 +1,254 @@
+"""Native reader of the few exif tags epr needs, with exiftool as fallback."""
+
+# Standard library imports
+import logging
+import mmap
+import os
+import re
+import struct
+from collections.abc import Sequence
+
+
+# Local application imports
+from abk_epr.abk_common import function_trace
+from abk_epr.bmff_reader import BmffReader
+
+
+class ExifReader:
+    """ExifReader reads CreateDate, SubSecTimeOriginal, Make and Model in pure Python.
+
+    TIFF based files (NEF, CR2, ARW, PEF, DNG, TIFF, and ORF and RW2 with their own
+    magic numbers) and the APP1 segment of JPEG files are supported, and ISO base
+    media files (CR3, HEIC, MP4/MOV) through BmffReader. The file is mapped with mmap
+    and only the header, IFD0 and the Exif IFD, or the metadata boxes, are touched.
+    Values are returned the way exiftool -j -G -n returns them. read returns None for
+    other formats and for files it can not parse, so the caller can ask exiftool.
+    """
+
+    SOURCE_FILE = "SourceFile"
+    IFD0_TAGS = {0x010F: "EXIF:Make", 0x0110: "EXIF:Model"}
+    EXIF_IFD_TAGS = {0x9004: "EXIF:CreateDate", 0x9291: "EXIF:SubSecTimeOriginal"}
+    SUPPORTED_TAGS = frozenset(
+        [*IFD0_TAGS.values(), *EXIF_IFD_TAGS.values(), BmffReader.CREATE_DATE]
+    )
+    EXIF_IFD_POINTER = 0x8769
+    # TIFF, Olympus ORF and Panasonic RW2 magic numbers
+    TIFF_MAGICS = {42, 0x4F52, 0x5352, 0x55}
+    ASCII_TYPE = 2
+    POINTER_TYPES = {4, 13}
+    MAX_IFD_ENTRIES = 1024
+    JPEG_SOI = b"\xff\xd8"
+    JPEG_APP1 = 0xE1
+    JPEG_SOS = 0xDA
+    EXIF_HEADER = b"Exif\x00\x00"
+    # strings exiftool writes as JSON numbers
+    NUMBER_EXPRESSION = re.compile(r"-?(\d|[1-9]\d{1,14})(\.\d{1,16})?")
+
+    def __init__(self):
+        """ExifReader init."""
+        self._bmff_reader = BmffReader(self._read_tiff)
+
+    def read(self, file_name: str, tags: Sequence[str]) -> dict | None:
+        """Reads tags of a file.
+
+        Args:
+            file_name (str): file to read
+            tags (Sequence[str]): tags to read, a subset of SUPPORTED_TAGS
+
+        Returns:
+            dict | None: exiftool like metadata dict or None if exiftool has to read the file
+        """
+        try:
+            with open(file_name, "rb") as image_file:
+                if os.fstat(image_file.fileno()).st_size < 8:
+                    return None
+                with mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    values = self._read_values(data)
+        except (OSError, ValueError, struct.error, UnicodeDecodeError):
+            return None
+        if values is None:
+            return None
+        metadata: dict = {self.SOURCE_FILE: file_name}
+        for tag in tags:
+            if tag in values:
+                metadata[tag] = values[tag]
+        return metadata
+
+    def _read_values(self, data: mmap.mmap) -> dict | None:
+        """Returns the supported tags of a JPEG or TIFF file, None for other formats."""
+        if data[:2] == self.JPEG_SOI:
+            tiff_offset = self._find_jpeg_exif(data)
+            return self._read_tiff(data, tiff_offset) if tiff_offset is not None else {}
+        if BmffReader.is_bmff(data):
+            return self._bmff_reader.read(data)
+        return self._read_tiff(data, 0)
+
+    def _find_jpeg_exif(self, data: mmap.mmap) -> int | None:
+        """Returns the offset of the TIFF header in the Exif APP1 segment, if there is one."""
+        offset = 2
+        while offset + 4 <= len(data):
+            if data[offset] != 0xFF:
+                raise ValueError(f"no JPEG marker at offset {offset}")
+            marker = data[offset + 1]
+            if marker == 0xFF:
+                offset += 1
+                continue
+            if marker == self.JPEG_SOS:
+                return None
+            (length,) = struct.unpack_from(">H", data, offset + 2)
+            if marker == self.JPEG_APP1 and data[offset + 4 : offset + 10] == self.EXIF_HEADER:
+                return offset + 10
+            offset += 2 + length
+        return None
+
+    def _read_tiff(self, data: mmap.mmap, base: int, first_ifd: str = "ifd0") -> dict | None:
+        """Reads IFD0 and the Exif IFD of the TIFF structure starting at base.
+
+        With first_ifd "exif" the first IFD is read as Exif IFD, like in CR3 CMT2 boxes.
+        """
+        byte_order = data[base : base + 2]
+        if byte_order == b"II":
+            endian = "<"
+        elif byte_order == b"MM":
+            endian = ">"
+        else:
+            return None
+        magic, ifd0_offset = struct.unpack_from(f"{endian}HI", data, base + 2)
+        if magic not in self.TIFF_MAGICS:
+            return None
+        values: dict = {}
+        if first_ifd == "exif":
+            self._read_ifd(data, base, ifd0_offset, endian, self.EXIF_IFD_TAGS, values)
+            return values
+        exif_ifd_offset = self._read_ifd(data, base, ifd0_offset, endian, self.IFD0_TAGS, values)
+        if exif_ifd_offset:
+            self._read_ifd(data, base, exif_ifd_offset, endian, self.EXIF_IFD_TAGS, values)
+        return values
+
+    def _read_ifd(
+        self, data: mmap.mmap, base: int, ifd_offset: int, endian: str, tags: dict, values: dict
+    ) -> int:
+        """Reads ASCII tags of one IFD into values, returns the Exif IFD offset or 0."""
+        offset = base + ifd_offset
+        (entry_count,) = struct.unpack_from(f"{endian}H", data, offset)
+        if entry_count > self.MAX_IFD_ENTRIES or offset + 2 + 12 * entry_count > len(data):
+            raise ValueError(f"broken IFD at offset {offset}")
+        exif_ifd_offset = 0
+        for entry_offset in range(offset + 2, offset + 2 + 12 * entry_count, 12):
+            tag, field_type, count, value = struct.unpack_from(
+                f"{endian}HHII", data, entry_offset
+            )
+            if tag == self.EXIF_IFD_POINTER and field_type in self.POINTER_TYPES:
+                exif_ifd_offset = value
+            elif tag in tags and field_type == self.ASCII_TYPE:
+                value_offset = entry_offset + 8 if count <= 4 else base + value
+                if value_offset + count > len(data):
+                    raise ValueError(f"tag {tag} value beyond end of file")
+                values[tags[tag]] = self._to_exiftool_value(
+                    data[value_offset : value_offset + count]
+                )
+        return exif_ifd_offset
+
+    def _to_exiftool_value(self, raw_value: bytes) -> str | int | float:
+        """Converts an ASCII tag value the way exiftool prints it in JSON."""
+        raw_value = raw_value.split(b"\x00", 1)[0].rstrip(b" ")
+        try:
+            value = raw_value.decode("utf-8")
+        except UnicodeDecodeError:
+            value = raw_value.decode("latin-1")
+        if self.NUMBER_EXPRESSION.fullmatch(value):
+            return float(value) if "." in value else int(value)
+        return value
+
+
+class NativeExifSession:
+    """NativeExifSession reads metadata with ExifReader and falls back to an exiftool session.
+
+    It has the interface of ExifToolSession, so it can be passed wherever a session is
+    expected. Files ExifReader can not handle are read by the fallback session in one
+    request per get_tags call, and the results are merged back in the original order.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger = None,  # type: ignore
+        fallback_session=None,
+        reader: ExifReader = None,  # type: ignore
+    ):
+        """NativeExifSession init."""
+        self._logger = logger or logging.getLogger(__name__)
+        self._fallback_session = fallback_session
+        self._reader = reader or ExifReader()
+        self.native_count = 0
+        self.fallback_count = 0
+
+    def __enter__(self):
+        """Enter for native exif session."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit for native exif session."""
+        self.close()
+
+    @property
+    def running(self) -> bool:
+        """True if the fallback exiftool process is up."""
+        return self._fallback_session.running
+
+    @property
+    def process_count(self) -> int:
+        """Number of running fallback exiftool processes."""
+        return self._fallback_session.process_count
+
+    @property
+    def executable(self) -> str:
+        """Path of the fallback exiftool executable."""
+        return self._fallback_session.executable
+
+    @property
+    def version(self) -> str:
+        """Version reported by the fallback exiftool."""
+        return self._fallback_session.version
+
+    @function_trace
+    def start(self) -> None:
+        """Starts the fallback exiftool session."""
+        self._fallback_session.start()
+
+    @function_trace
+    def close(self) -> None:
+        """Closes the fallback exiftool session and logs how files were read."""
+        self._logger.info(
+            f"exif: {self.native_count} files read natively, {self.fallback_count} with exiftool"
+        )
+        self._fallback_session.close()
+
+    def get_tags(self, files: Sequence[str], tags: Sequence[str]) -> list[dict]:
+        """Reads tags for all files, preserving the input order.
+
+        Args:
+            files (Sequence[str]): files to read the tags from
+            tags (Sequence[str]): tags to read
+
+        Returns:
+            list[dict]: one metadata dict per file, in the same order as files
+        """
+        if not self._reader.SUPPORTED_TAGS.issuperset(tags):
+            self.fallback_count += len(files)
+            return self._fallback_session.get_tags(files=files, tags=tags)
+        metadata_list: list[dict | None] = [self._reader.read(f, tags) for f in files]
+        missing = [index for index, metadata in enumerate(metadata_list) if metadata is None]
+        self.native_count += len(files) - len(missing)
+        self.fallback_count += len(missing)
+        if missing:
+            fetched = self._fallback_session.get_tags(
+                files=[files[index] for index in missing], tags=tags
+            )
+            for index, metadata in zip(missing, fetched, strict=True):
+                metadata_list[index] = metadata
+        return metadata_list  # type: ignore
+
+    def set_tags(self, files: Sequence[str], tags: dict, params: Sequence[str] = None) -> None:  # type: ignore
+        """Writes tags to all files with exiftool."""
+        self._fallback_session.set_tags(files, tags, params)
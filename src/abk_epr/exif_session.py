@@ -0,0 +1,292 @@
+"""Long lived exiftool session shared by all epr phases."""
+
+# Standard library imports
+import heapq
+import logging
+import os
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+# Third party imports
+import exiftool
+
+
+# Local application imports
+from abk_epr.abk_common import function_trace
+
+
+class ExifToolSession:
+    """ExifToolSession keeps one warm exiftool -stay_open process for the whole run.
+
+    The health check, metadata reads and tag writes all go through the same
+    process. File lists are sent in bounded chunks, so the size of a single
+    request does not grow with the size of the directory.
+    """
+
+    DEFAULT_CHUNK_SIZE = 256
+    SOURCE_FILE = "SourceFile"
+
+    def __init__(
+        self,
+        logger: logging.Logger = None,  # type: ignore
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        executable: str | None = None,
+    ):
+        """ExifToolSession init."""
+        self._logger = logger or logging.getLogger(__name__)
+        if chunk_size < 1:
+            raise ValueError(f"chunk_size must be positive, got: {chunk_size}")
+        self._chunk_size = chunk_size
+        self._executable = executable
+        self._helper: exiftool.ExifToolHelper | None = None
+
+    def __enter__(self):
+        """Enter for exiftool session."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit for exiftool session."""
+        self.close()
+
+    @property
+    def running(self) -> bool:
+        """True if the exiftool process is up."""
+        return self._helper is not None and self._helper.running
+
+    @property
+    def process_count(self) -> int:
+        """Number of running exiftool processes, 0 or 1."""
+        return int(self.running)
+
+    @property
+    def executable(self) -> str:
+        """Path of the running exiftool executable."""
+        return str(self._ensure_running().executable)
+
+    @property
+    def version(self) -> str:
+        """Version reported by the running exiftool process."""
+        return self._ensure_running().version
+
+    @function_trace
+    def start(self) -> None:
+        """Starts exiftool process, if it is not running yet."""
+        if self.running:
+            return
+        if self._executable is None:
+            self._helper = exiftool.ExifToolHelper(auto_start=False)
+        else:
+            self._helper = exiftool.ExifToolHelper(auto_start=False, executable=self._executable)
+        self._helper.logger = self._logger
+        self._helper.run()
+        self._logger.debug(
+            f"exiftool started: {self._helper.executable=}, {self._helper.version=}"
+        )
+
+    @function_trace
+    def close(self) -> None:
+        """Terminates exiftool process."""
+        if self._helper is not None:
+            if self._helper.running:
+                self._helper.terminate()
+            self._helper = None
+
+    def get_tags(self, files: Sequence[str], tags: Sequence[str]) -> list[dict]:
+        """Reads tags for all files, chunk by chunk, preserving the input order.
+
+        Relative file names are sent as absolute paths, because the exiftool process keeps
+        the working directory it was started in, and SourceFile is reported as passed in.
+
+        Args:
+            files (Sequence[str]): files to read the tags from
+            tags (Sequence[str]): tags to read
+
+        Returns:
+            list[dict]: one metadata dict per file, in the same order as files
+        """
+        helper = self._ensure_running()
+        cwd = os.getcwd()
+        metadata_list: list[dict] = []
+        for chunk in self._chunks(files):
+            paths = [os.path.join(cwd, file_name) for file_name in chunk]
+            passed_names = dict(zip(paths, chunk, strict=True))
+            for metadata in helper.get_tags(files=paths, tags=list(tags)):
+                source_file = metadata.get(self.SOURCE_FILE)
+                metadata[self.SOURCE_FILE] = passed_names.get(source_file, source_file)
+                metadata_list.append(metadata)
+        return metadata_list
+
+    def set_tags(self, files: Sequence[str], tags: dict, params: Sequence[str] = None) -> None:  # type: ignore
+        """Writes tags to all files, chunk by chunk.
+
+        Args:
+            files (Sequence[str]): files to write the tags to
+            tags (dict): tag names and values to write
+            params (Sequence[str], optional): extra exiftool parameters. Defaults to None.
+        """
+        helper = self._ensure_running()
+        for chunk in self._chunks(files):
+            helper.set_tags(files=chunk, tags=tags, params=list(params) if params else None)
+
+    def _ensure_running(self) -> exiftool.ExifToolHelper:
+        """Starts the process lazily and returns the helper."""
+        if not self.running:
+            self.start()
+        return self._helper  # type: ignore
+
+    def _chunks(self, files: Sequence[str]) -> Iterator[list[str]]:
+        """Splits files into chunks of at most chunk_size entries."""
+        for start in range(0, len(files), self._chunk_size):
+            yield list(files[start : start + self._chunk_size])
+
+
+class ExifToolPool:
+    """ExifToolPool spreads metadata reads over N exiftool sessions, one per CPU core by default.
+
+    The file list is split into shards of roughly equal cost. exiftool reads only the
+    headers, so the cost is mostly per file, with a small term for the size of large
+    videos. Each shard is read by its own exiftool process and the results are merged
+    back in the original order, so the renaming stays deterministic.
+    """
+
+    MIN_FILES_PER_WORKER = 16
+    # every file costs as much as 1 GiB of size, a 4 GiB video counts as 5 small files
+    FILE_COST_BYTES = 1024 * 1024 * 1024
+
+    def __init__(
+        self,
+        logger: logging.Logger = None,  # type: ignore
+        workers: int = None,  # type: ignore
+        chunk_size: int = ExifToolSession.DEFAULT_CHUNK_SIZE,
+        executable: str | None = None,
+    ):
+        """ExifToolPool init."""
+        self._logger = logger or logging.getLogger(__name__)
+        self._workers = workers or os.cpu_count() or 1
+        if self._workers < 1:
+            raise ValueError(f"workers must be positive, got: {self._workers}")
+        self._sessions = [
+            ExifToolSession(logger=self._logger, chunk_size=chunk_size, executable=executable)
+            for _ in range(self._workers)
+        ]
+        self._executor: ThreadPoolExecutor | None = None
+
+    def __enter__(self):
+        """Enter for exiftool pool."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit for exiftool pool."""
+        self.close()
+
+    @property
+    def workers(self) -> int:
+        """Number of exiftool workers in the pool."""
+        return self._workers
+
+    @property
+    def running(self) -> bool:
+        """True if at least the primary exiftool process is up."""
+        return self._sessions[0].running
+
+    @property
+    def process_count(self) -> int:
+        """Number of running exiftool processes, workers start on first use."""
+        return sum(session.process_count for session in self._sessions)
+
+    @property
+    def executable(self) -> str:
+        """Path of the exiftool executable."""
+        return self._sessions[0].executable
+
+    @property
+    def version(self) -> str:
+        """Version reported by exiftool."""
+        return self._sessions[0].version
+
+    @function_trace
+    def start(self) -> None:
+        """Starts the primary exiftool process, other workers start on first use."""
+        self._sessions[0].start()
+
+    @function_trace
+    def close(self) -> None:
+        """Terminates all exiftool processes and the worker threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for session in self._sessions:
+            session.close()
+
+    def get_tags(self, files: Sequence[str], tags: Sequence[str]) -> list[dict]:
+        """Reads tags for all files in parallel, preserving the input order.
+
+        Args:
+            files (Sequence[str]): files to read the tags from
+            tags (Sequence[str]): tags to read
+
+        Returns:
+            list[dict]: one metadata dict per file, in the same order as files
+        """
+        shard_count = min(self._workers, max(1, len(files) // self.MIN_FILES_PER_WORKER))
+        if shard_count == 1:
+            return self._sessions[0].get_tags(files, tags)
+
+        shards = self._balanced_shards(files, shard_count)
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(f"{shard_count = }, shard sizes: {[len(s) for s in shards]}")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._workers, thread_name_prefix="exiftool"
+            )
+        futures = [
+            self._executor.submit(session.get_tags, [files[i] for i in shard], tags)
+            for session, shard in zip(self._sessions, shards, strict=False)
+        ]
+        metadata_list: list[dict] = [{}] * len(files)
+        for shard, future in zip(shards, futures, strict=True):
+            shard_metadata = future.result()
+            if len(shard_metadata) != len(shard):
+                raise RuntimeError(
+                    f"exiftool returned {len(shard_metadata)} results for {len(shard)} files"
+                )
+            for index, metadata in zip(shard, shard_metadata, strict=True):
+                metadata_list[index] = metadata
+        return metadata_list
+
+    def set_tags(self, files: Sequence[str], tags: dict, params: Sequence[str] = None) -> None:  # type: ignore
+        """Writes tags to all files using the primary exiftool process."""
+        self._sessions[0].set_tags(files, tags, params)
+
+    @classmethod
+    def _balanced_shards(cls, files: Sequence[str], shard_count: int) -> list[list[int]]:
+        """Splits file indices into shards of roughly equal cost, costliest files first.
+
+        The cost of a file is FILE_COST_BYTES plus its size, so shards of small files
+        get about the same number of files.
+
+        Args:
+            files (Sequence[str]): files to split
+            shard_count (int): number of shards
+
+        Returns:
+            list[list[int]]: indices into files, each shard sorted in the original order
+        """
+        costs = []
+        for index, file_name in enumerate(files):
+            try:
+                size = os.path.getsize(file_name)
+            except OSError:
+                size = 0
+            costs.append((cls.FILE_COST_BYTES + size, index))
+        costs.sort(reverse=True)
+
+        shards: list[list[int]] = [[] for _ in range(shard_count)]
+        bins = [(0, shard) for shard in range(shard_count)]
+        for cost, index in costs:
+            total, shard = heapq.heappop(bins)
+            shards[shard].append(index)
+            heapq.heappush(bins, (total + cost, shard))
+        return [sorted(shard) for shard in shards if shard]
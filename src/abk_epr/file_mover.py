@@ -0,0 +1,201 @@
+"""Asynchronous file moves on a thread pool with cross device fallback."""
+
+# Standard library imports
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import functools
+import logging
+import os
+import shutil
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Local application imports
+from abk_epr.constants import FILE_MOVES_MAX_IN_FLIGHT
+
+
+AT_FDCWD = -100
+# renameat2 flag on Linux, renamex_np flag on macOS
+RENAME_NOREPLACE = 1
+RENAME_EXCL = 4
+
+
+@functools.cache
+def _native_rename_no_replace() -> Callable[[bytes, bytes], int] | None:
+    """Returns the libc no replace rename of the platform, None if there is none."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except OSError:
+        return None
+    if hasattr(libc, "renameat2"):
+        return lambda src, dst: libc.renameat2(AT_FDCWD, src, AT_FDCWD, dst, RENAME_NOREPLACE)
+    if hasattr(libc, "renamex_np"):
+        return lambda src, dst: libc.renamex_np(src, dst, RENAME_EXCL)
+    return None
+
+
+def rename_no_replace(src: str, dst: str) -> None:
+    """Renames src to dst, raising FileExistsError instead of replacing an existing dst.
+
+    Uses renameat2(RENAME_NOREPLACE) on Linux and renamex_np(RENAME_EXCL) on macOS. Where
+    the filesystem does not support them, the file is hard linked and unlinked, and on
+    filesystems without hard links, like FAT formatted cards, dst is checked first.
+    """
+    native_rename = _native_rename_no_replace()
+    if native_rename is not None:
+        if native_rename(os.fsencode(src), os.fsencode(dst)) == 0:
+            return
+        error = ctypes.get_errno()
+        if error not in (errno.EINVAL, errno.ENOSYS, errno.ENOTSUP, errno.EOPNOTSUPP):
+            raise OSError(error, os.strerror(error), src, None, dst)
+    try:
+        os.link(src, dst)
+    except OSError as exp:
+        if exp.errno not in (errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EMLINK):
+            raise
+        if os.path.lexists(dst):
+            raise FileExistsError(
+                errno.EEXIST, os.strerror(errno.EEXIST), src, None, dst
+            ) from exp
+        os.rename(src, dst)
+        return
+    os.unlink(src)
+
+
+class FileMover:
+    """FileMover runs blocking renames on worker threads, keeping the event loop free.
+
+    At most max_in_flight moves run at the same time. When source and target are on
+    different filesystems, the file is copied in kernel space (copy_file_range or
+    sendfile) into a temporary file next to the target, which is then atomically
+    renamed into place before the source is removed. A move never replaces an
+    existing target, it fails with FileExistsError instead.
+    """
+
+    DEFAULT_MAX_IN_FLIGHT = FILE_MOVES_MAX_IN_FLIGHT
+    COPY_CHUNK_SIZE = 64 * 1024 * 1024
+    TMP_SUFFIX = ".epr-tmp"
+
+    def __init__(
+        self,
+        logger: logging.Logger = None,  # type: ignore
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ):
+        """FileMover init."""
+        self._logger = logger or logging.getLogger(__name__)
+        if max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be positive, got: {max_in_flight}")
+        self._max_in_flight = max_in_flight
+        self._executor: ThreadPoolExecutor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    @property
+    def max_in_flight(self) -> int:
+        """Maximum number of moves running at the same time."""
+        return self._max_in_flight
+
+    def close(self) -> None:
+        """Waits for running moves and stops the worker threads."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def move(self, src: str, dst: str) -> bool:
+        """Moves src to dst on a worker thread.
+
+        Args:
+            src (str): file to move
+            dst (str): target file name
+
+        Returns:
+            bool: True if the file has been moved, False if the move failed
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_in_flight, thread_name_prefix="mover"
+            )
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_in_flight)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(self._executor, self.move_sync, src, dst)
+            except OSError as exp:
+                self._logger.error(f"Error renaming: {src}: {str(exp)}")
+                return False
+        self._logger.debug("renamed file: %s to %s", src, dst)
+        return True
+
+    async def move_many(self, moves: Iterable[tuple[str, str]]) -> int:
+        """Moves all (src, dst) pairs concurrently and returns the number of moved files."""
+        results = await asyncio.gather(*(self.move(src, dst) for src, dst in moves))
+        return sum(results)
+
+    def move_sync(self, src: str, dst: str) -> None:
+        """Renames src to dst without replacing dst, copying across filesystems if needed."""
+        try:
+            rename_no_replace(src, dst)
+        except OSError as exp:
+            if exp.errno != errno.EXDEV:
+                raise
+            self._move_across_devices(src, dst)
+
+    def _move_across_devices(self, src: str, dst: str) -> None:
+        """Copies src next to dst, renames it into place and removes src."""
+        dst_dir, dst_name = os.path.split(dst)
+        tmp = os.path.join(dst_dir, f".{dst_name}{self.TMP_SUFFIX}")
+        try:
+            with open(src, "rb") as src_file, open(tmp, "wb") as tmp_file:
+                self._copy_file_data(src_file.fileno(), tmp_file.fileno())
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+                src_size = os.fstat(src_file.fileno()).st_size
+                tmp_size = os.fstat(tmp_file.fileno()).st_size
+            if tmp_size != src_size:
+                raise OSError(errno.EIO, f"copied {tmp_size} of {src_size} bytes", src)
+            shutil.copystat(src, tmp)
+            rename_no_replace(tmp, dst)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        os.remove(src)
+
+    def _copy_file_data(self, src_fd: int, dst_fd: int) -> None:
+        """Copies file content in kernel space where the platform supports it."""
+        size = os.fstat(src_fd).st_size
+        offset = 0
+        if hasattr(os, "copy_file_range"):
+            try:
+                while offset < size:
+                    copied = os.copy_file_range(
+                        src_fd, dst_fd, min(self.COPY_CHUNK_SIZE, size - offset)
+                    )
+                    if copied == 0:
+                        break
+                    offset += copied
+                if offset >= size:
+                    return
+            except OSError as exp:
+                if exp.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+        if hasattr(os, "sendfile") and os.uname().sysname == "Linux":
+            while offset < size:
+                sent = os.sendfile(
+                    dst_fd, src_fd, offset, min(self.COPY_CHUNK_SIZE, size - offset)
+                )
+                if sent == 0:
+                    break
+                offset += sent
+            if offset >= size:
+                return
+        os.lseek(src_fd, offset, os.SEEK_SET)
+        os.lseek(dst_fd, offset, os.SEEK_SET)
+        while chunk := os.read(src_fd, self.COPY_CHUNK_SIZE):
+            view = memoryview(chunk)
+            while view:
+                # os.write may write less than given, like to a full or network filesystem
+                view = view[os.write(dst_fd, view) :]
@@ -0,0 +1,189 @@
+"""Crash safe journal of file operations, used to resume and undo runs."""
+
+# Standard library imports
+import json
+import logging
+import os
+from enum import Enum
+
+
+# Local application imports
+from abk_epr.abk_common import function_trace
+
+
+class JournalOp(Enum):
+    """Operation recorded in the journal."""
+
+    RENAME = "rename"
+    CONVERT = "convert"
+    DELETE = "delete"
+
+
+class JournalState(Enum):
+    """State of a recorded operation."""
+
+    PLANNED = "planned"
+    DONE = "done"
+
+
+class OperationJournal:
+    """OperationJournal is an append only JSON Lines log of planned and completed operations.
+
+    Records are buffered and written with one fsync per batch of sync_every records, and
+    on close. Paths are stored relative to the project directory. Reading the journal
+    back gives the completed operations, so a resumed run can skip them and an undo can
+    replay the renames in reverse.
+
+    The journal holds a single run. A run that finishes cleanly archives it with the
+    FINISHED suffix, replacing the archive of the run before, so the journal left in
+    place always belongs to an interrupted run. load_last_run reads that one, or else
+    the archive of the last finished run.
+    """
+
+    FILE_NAME = ".epr_journal.jsonl"
+    DEFAULT_SYNC_EVERY = 64
+    FINISHED = "done"
+
+    def __init__(
+        self,
+        logger: logging.Logger = None,  # type: ignore
+        path: str = FILE_NAME,
+        sync_every: int = DEFAULT_SYNC_EVERY,
+    ):
+        """OperationJournal init."""
+        self._logger = logger or logging.getLogger(__name__)
+        self._path = path
+        self._sync_every = sync_every
+        self._buffer: list[str] = []
+        self._file = None
+        self._completed: dict[tuple[str, str], str] = {}
+        self._loaded = False
+
+    def __enter__(self):
+        """Enter for operation journal."""
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit for operation journal."""
+        self.close()
+
+    @property
+    def path(self) -> str:
+        """Journal file name."""
+        return self._path
+
+    @function_trace
+    def open(self) -> None:
+        """Loads completed operations and opens the journal for appending."""
+        if self._file is not None:
+            return
+        self.load()
+        self._file = open(self._path, "a", encoding="utf-8")  # noqa: SIM115
+
+    @function_trace
+    def close(self) -> None:
+        """Writes pending records and closes the journal, removing it if nothing was written."""
+        if self._file is not None:
+            self.flush()
+            empty = self._file.tell() == 0
+            self._file.close()
+            self._file = None
+            if empty:
+                os.remove(self._path)
+
+    def flush(self) -> None:
+        """Writes buffered records and fsyncs the journal."""
+        if self._file is None or not self._buffer:
+            return
+        self._file.write("".join(self._buffer))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._buffer.clear()
+
+    def plan(self, op: JournalOp, src: str, dst: str) -> None:
+        """Records an operation that is about to start."""
+        self._append(op, JournalState.PLANNED, src, dst)
+
+    def done(self, op: JournalOp, src: str, dst: str) -> None:
+        """Records a completed operation."""
+        self._completed[(op.value, os.path.normpath(src))] = os.path.normpath(dst)
+        self._append(op, JournalState.DONE, src, dst)
+
+    def completed(self, op: JournalOp, src: str) -> str | None:
+        """Returns the target of a completed operation or None if it was not completed."""
+        return self._completed.get((op.value, os.path.normpath(src)))
+
+    def completed_operations(self, op: JournalOp) -> list[tuple[str, str]]:
+        """Returns (src, dst) of all completed operations of a kind, in journal order."""
+        return [(src, dst) for (kind, src), dst in self._completed.items() if kind == op.value]
+
+    @property
+    def finished_path(self) -> str:
+        """Archive of the journal of the last cleanly finished run."""
+        return f"{self._path}.{self.FINISHED}"
+
+    def load(self) -> None:
+        """Reads completed operations of an interrupted run, skipping broken records."""
+        if self._loaded:
+            return
+        self._loaded = True
+        self._read(self._path)
+
+    def load_last_run(self) -> None:
+        """Reads the interrupted run, or the last finished run if none was interrupted."""
+        if self._loaded:
+            return
+        self._loaded = True
+        self._read(self._last_run_path())
+
+    def archive(self, suffix: str) -> str:
+        """Closes the journal and renames it, so the next run starts a fresh one.
+
+        Without a journal in place, the archive of the last finished run is renamed,
+        as after undoing it.
+        """
+        self.close()
+        archived = f"{self._path}.{suffix}"
+        path = self._last_run_path()
+        if path != archived and os.path.exists(path):
+            os.replace(path, archived)
+        self._completed.clear()
+        self._loaded = False
+        return archived
+
+    def _last_run_path(self) -> str:
+        """Returns the journal of an interrupted run, if it has records, else the archive."""
+        if os.path.exists(self._path) and os.path.getsize(self._path) > 0:
+            return self._path
+        return self.finished_path
+
+    def _read(self, path: str) -> None:
+        """Reads the completed operations of a journal file, if it exists."""
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as journal_file:
+            for line_number, line in enumerate(journal_file, start=1):
+                try:
+                    record = json.loads(line)
+                    state, op = record["state"], record["op"]
+                    src, dst = record["src"], record["dst"]
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    # a torn last line, or a record of a foreign or older format
+                    self._logger.warning(f"{path}:{line_number}: skipping broken record")
+                    continue
+                if state == JournalState.DONE.value:
+                    self._completed[(op, src)] = dst
+        self._logger.info(f"journal: {len(self._completed)} completed operations loaded")
+
+    def _append(self, op: JournalOp, state: JournalState, src: str, dst: str) -> None:
+        """Buffers one record and writes the batch when it is full."""
+        record = {
+            "op": op.value,
+            "state": state.value,
+            "src": os.path.normpath(src),
+            "dst": os.path.normpath(dst),
+        }
+        self._buffer.append(json.dumps(record, separators=(",", ":")) + "\n")
+        if len(self._buffer) >= self._sync_every:
+            self.flush()
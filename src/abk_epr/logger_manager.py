@@ -1,10 +1,14 @@
 """Logger Manager for centralized logging configuration."""
 
+import atexit
 from enum import Enum
 import logging
-import logging.config
 from pathlib import Path
-import yaml
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from logging.handlers import QueueListener
 
 
 class LoggerType(Enum):
@@ -15,7 +19,17 @@ class LoggerType(Enum):
 
 
 class LoggerManager:
-    """Singleton LoggerManager that configures and exposes a global logger."""
+    """Singleton LoggerManager that configures and exposes a global logger.
+
+    By default the handlers configured by logging.yaml are moved behind queues. A
+    logging call merges the message with its arguments, and formats the traceback of
+    an exception, on the calling thread, so later changes to the arguments do not show
+    up in the log. It then only puts the record into a queue. A background listener
+    thread applies the formatters of the handlers, with time stamp and level, and
+    writes the record to the console or the log file. The event loop does not wait for
+    the terminal or the disk. stop, also run at exit, writes what is still queued and
+    puts the handlers back.
+    """
 
     _instance = None
 
@@ -31,9 +45,11 @@ class LoggerManager:
             self._configured = False
             self._logger = logging.getLogger("consoleLogger")
             self._logger.disabled = True
+            self._listeners: list[QueueListener] = []
+            self._replaced_handlers: list[tuple[logging.Logger, list[logging.Handler]]] = []
 
-    def configure(self, log_into_file=False, quiet=False):
-        """Configure logging once based on flags."""
+    def configure(self, log_into_file=False, quiet=False, queued=True):
+        """Configure logging once based on flags, queued moves writing to a background thread."""
         if self._configured:
             return  # Prevent reconfiguration
 
@@ -49,10 +65,16 @@ class LoggerManager:
             if log_into_file:
                 (root_dir / "logs").mkdir(parents=True, exist_ok=True)
 
+            from logging.config import dictConfig
+
+            import yaml
+
             config_path = root_dir / "logging.yaml"
             with config_path.open("r", encoding="utf-8") as stream:
                 config_yaml = yaml.safe_load(stream)
-                logging.config.dictConfig(config_yaml)
+                dictConfig(config_yaml)
+            if queued:
+                self._start_listeners()
 
             logger_name = "fileLogger" if log_into_file else "consoleLogger"
             self._logger = logging.getLogger(logger_name)
@@ -66,6 +88,46 @@ class LoggerManager:
             self._logger.disabled = True
             self._configured = True
 
+    def stop(self) -> None:
+        """Writes the queued records, stops the listener threads and restores the handlers."""
+        for listener in self._listeners:
+            listener.stop()
+        self._listeners.clear()
+        for logger, handlers in self._replaced_handlers:
+            logger.handlers = handlers
+        self._replaced_handlers.clear()
+
+    def _start_listeners(self) -> None:
+        """Replaces the handlers of every logger by a QueueHandler feeding a QueueListener.
+
+        Loggers sharing the same handlers share one queue and listener, so each handler
+        is only ever called from a single thread.
+        """
+        import queue
+        from logging.handlers import QueueHandler, QueueListener
+
+        loggers = [logging.getLogger()] + [
+            logger
+            for logger in logging.Logger.manager.loggerDict.values()
+            if isinstance(logger, logging.Logger)
+        ]
+        queue_handlers: dict[tuple[logging.Handler, ...], QueueHandler] = {}
+        for logger in loggers:
+            handlers = tuple(logger.handlers)
+            if not handlers:
+                continue
+            queue_handler = queue_handlers.get(handlers)
+            if queue_handler is None:
+                log_queue: queue.SimpleQueue = queue.SimpleQueue()
+                queue_handler = QueueHandler(log_queue)
+                listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+                listener.start()
+                self._listeners.append(listener)
+                queue_handlers[handlers] = queue_handler
+            self._replaced_handlers.append((logger, list(handlers)))
+            logger.handlers = [queue_handler]
+        atexit.register(self.stop)
+
     def get_logger(self, name=None) -> logging.Logger:
         """Get logger (optionally by name)."""
         if not self._configured:
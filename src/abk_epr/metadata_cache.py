@@ -0,0 +1,202 @@
+"""Persistent cache of normalized exif metadata keyed by file identity."""
+
+# Standard library imports
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable, Sequence
+from pathlib import Path
+
+
+# Local application imports
+from abk_epr.abk_common import function_trace
+from abk_epr.constants import METADATA_CACHE_MAX_ENTRIES
+from abk_epr.metadata_record import MetadataRecord
+
+
+class MetadataCache:
+    """MetadataCache stores the normalized CreateDate/SubSec/Make/Model of already read files.
+
+    Entries are keyed by (device, inode, size, mtime_ns), so a file keeps its cache entry
+    when it is renamed, and a modified file gets a new one. Every put_many is committed,
+    an interrupted run keeps the metadata read so far. The cache is bounded to
+    max_entries rows, the least recently used rows are evicted on flush. A database of
+    an older SCHEMA_VERSION is dropped and rebuilt.
+    """
+
+    DEFAULT_MAX_ENTRIES = METADATA_CACHE_MAX_ENTRIES
+    DB_FILE_NAME = "metadata.sqlite3"
+    SCHEMA_VERSION = 3
+
+    def __init__(
+        self,
+        logger: logging.Logger = None,  # type: ignore
+        db_path: str | Path = None,  # type: ignore
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        """MetadataCache init."""
+        self._logger = logger or logging.getLogger(__name__)
+        self._db_path = Path(db_path) if db_path else self.default_path()
+        self._max_entries = max_entries
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        """Enter for metadata cache."""
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit for metadata cache."""
+        self.close()
+
+    @classmethod
+    def default_path(cls) -> Path:
+        """Cache file location under XDG_CACHE_HOME, ~/.cache by default."""
+        cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+            os.path.expanduser("~"), ".cache"
+        )
+        return Path(cache_home) / "abk_epr" / cls.DB_FILE_NAME
+
+    @function_trace
+    def open(self) -> None:
+        """Opens or creates the cache database."""
+        if self._connection is not None:
+            return
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self._db_path, check_same_thread=False)
+        (schema_version,) = self._connection.execute("PRAGMA user_version").fetchone()
+        if schema_version != self.SCHEMA_VERSION:
+            self._connection.executescript(
+                f"""
+                DROP TABLE IF EXISTS metadata;
+                PRAGMA user_version={self.SCHEMA_VERSION};
+                """
+            )
+        self._connection.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS metadata (
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                create_date TEXT NOT NULL,
+                sub_sec TEXT NOT NULL,
+                make TEXT NOT NULL,
+                model TEXT NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (dev, ino, size, mtime_ns)
+            );
+            CREATE INDEX IF NOT EXISTS metadata_last_used ON metadata (last_used);
+            """
+        )
+        self._logger.debug(f"metadata cache: {self._db_path}")
+
+    @function_trace
+    def close(self) -> None:
+        """Flushes and closes the cache database."""
+        if self._connection is not None:
+            self.flush()
+            self._connection.close()
+            self._connection = None
+
+    @function_trace
+    def flush(self) -> None:
+        """Commits pending changes, evicts least recently used entries and logs counters."""
+        with self._lock:
+            connection = self._ensure_open()
+            (count,) = connection.execute("SELECT COUNT(*) FROM metadata").fetchone()
+            evict_count = count - self._max_entries
+            if evict_count > 0:
+                connection.execute(
+                    "DELETE FROM metadata WHERE rowid IN "
+                    "(SELECT rowid FROM metadata ORDER BY last_used LIMIT ?)",
+                    (evict_count,),
+                )
+            connection.commit()
+        self._logger.info(
+            f"metadata cache: hits={self.hits}, misses={self.misses}, "
+            f"entries={min(count, self._max_entries)}, evicted={max(evict_count, 0)}"
+        )
+
+    def get_many(self, files: Sequence[str]) -> dict[str, MetadataRecord]:
+        """Looks up cached metadata for files.
+
+        Args:
+            files (Sequence[str]): files to look up
+
+        Returns:
+            dict[str, MetadataRecord]: metadata record for every cached file
+        """
+        found: dict[str, MetadataRecord] = {}
+        now = time.time_ns()
+        with self._lock:
+            connection = self._ensure_open()
+            for file_name in files:
+                key = self.file_key(file_name)
+                row = None
+                if key is not None:
+                    row = connection.execute(
+                        "SELECT create_date, sub_sec, make, model FROM metadata "
+                        "WHERE dev=? AND ino=? AND size=? AND mtime_ns=?",
+                        key,
+                    ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    continue
+                self.hits += 1
+                connection.execute(
+                    "UPDATE metadata SET last_used=? "
+                    "WHERE dev=? AND ino=? AND size=? AND mtime_ns=?",
+                    (now, *key),
+                )
+                found[file_name] = MetadataRecord.create(
+                    file_name, row[0], row[2], row[3], row[1]
+                )
+        return found
+
+    def put_many(self, records: Iterable[MetadataRecord]) -> None:
+        """Stores and commits metadata records of files, with the pending last used times.
+
+        Args:
+            records (Iterable[MetadataRecord]): metadata records of files
+        """
+        now = time.time_ns()
+        rows = []
+        for record in records:
+            key = self.file_key(record.source_file)
+            if key is not None:
+                rows.append(
+                    (*key, record.create_date, record.sub_sec, record.make, record.model, now)
+                )
+        with self._lock:
+            connection = self._ensure_open()
+            connection.executemany(
+                "INSERT OR REPLACE INTO metadata "
+                "(dev, ino, size, mtime_ns, create_date, sub_sec, make, model, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            # one commit per batch, cheap with WAL and synchronous=NORMAL
+            connection.commit()
+
+    @staticmethod
+    def file_key(file_name: str) -> tuple[int, int, int, int] | None:
+        """Returns (device, inode, size, mtime_ns) of the file or None if it can't be stat'ed."""
+        try:
+            stat = os.stat(file_name)
+        except OSError:
+            return None
+        return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _ensure_open(self) -> sqlite3.Connection:
+        """Opens the database lazily and returns the connection."""
+        if self._connection is None:
+            self.open()
+        return self._connection  # type: ignore
@@ -0,0 +1,29 @@
+"""Normalized metadata of one file, as kept from metadata read through rename."""
+
+# Standard library imports
+import sys
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class MetadataRecord:
+    """What epr keeps of the exiftool metadata of a file to rename it.
+
+    The record replaces the exiftool dict of the file once it is classified, the
+    dict with its long tag keys is dropped. Make and model are interned, all files
+    of a camera share the same two strings. Including its strings, a record takes
+    less than half the memory of the dict it replaces (benchmarks/bench_memory.py).
+    """
+
+    source_file: str
+    create_date: str
+    make: str
+    model: str
+    sub_sec: str = ""
+
+    @classmethod
+    def create(
+        cls, source_file: str, create_date: str, make: str, model: str, sub_sec: str = ""
+    ) -> "MetadataRecord":
+        """Returns a record with interned make and model."""
+        return cls(source_file, create_date, sys.intern(make), sys.intern(model), sub_sec)
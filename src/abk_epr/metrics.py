@@ -0,0 +1,296 @@
+"""Counters, gauges and latency histograms of a run, exported as JSON or Prometheus text."""
+
+# Standard library imports
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import timeit
+from collections.abc import Generator
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass, field
+
+
+# Local application imports
+from abk_epr.constants import METRICS_FORMATS
+from abk_epr.tracing import tracer
+
+
+# metric name -> (type, help)
+METRICS = {
+    "epr_stage_seconds_total": ("counter", "Wall clock seconds spent in a stage."),
+    "epr_stage_files_total": ("counter", "Files handled by a stage."),
+    "epr_stage_bytes_total": ("counter", "Bytes handled by a stage."),
+    "epr_files_renamed_total": ("counter", "Files renamed into their target directory."),
+    "epr_exif_reads_total": ("counter", "Files whose metadata was read, by reader."),
+    "epr_conversions_total": ("counter", "RAW to DNG conversions, by result."),
+    "epr_converter_processes_total": ("counter", "DNG converter processes started."),
+    "epr_verifications_total": ("counter", "DNG verifications, by result."),
+    "epr_raw_files_deleted_total": ("counter", "RAW files deleted after verification."),
+    "epr_duplicates_total": ("counter", "Files with already imported content, by action."),
+    "epr_exiftool_processes": ("gauge", "exiftool processes running at the end of the run."),
+    "epr_converter_workers": ("gauge", "DNG conversion workers."),
+    "epr_run_seconds": ("gauge", "Wall clock seconds of the run."),
+    "epr_last_run_timestamp_seconds": ("gauge", "Unix time the run finished."),
+    "epr_conversion_seconds": ("histogram", "Conversion latency of a single RAW file."),
+}
+
+
+@dataclass(slots=True)
+class StageCounts:
+    """Files and bytes a stage handled, filled in by the code timed by MetricsRegistry.stage."""
+
+    files: int = 0
+    bytes: int = 0
+
+
+@dataclass(slots=True)
+class Histogram:
+    """Latency histogram with cumulative buckets and a bounded sample for percentiles."""
+
+    buckets: tuple[float, ...]
+    counts: list[int] = field(default_factory=list)
+    total: float = 0.0
+    count: int = 0
+    samples: list[float] = field(default_factory=list)
+
+    def __post_init__(self):
+        """Histogram post init, one counter per bucket and one for +Inf."""
+        self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float, max_samples: int, rng: random.Random) -> None:
+        """Adds one observation, keeping a uniform reservoir sample of max_samples values."""
+        self.count += 1
+        self.total += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        if len(self.samples) < max_samples:
+            self.samples.append(value)
+        else:
+            slot = rng.randrange(self.count)
+            if slot < max_samples:
+                self.samples[slot] = value
+
+    def percentile(self, percent: float) -> float | None:
+        """Returns the nearest rank percentile of the sample, None without observations."""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        rank = max(1, math.ceil(percent / 100.0 * len(ordered)))
+        return ordered[rank - 1]
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """Returns (upper bound, observations up to the bound) including +Inf."""
+        running = 0
+        result = []
+        for bound, count in zip(
+            [*map(format_value, self.buckets), "+Inf"], self.counts, strict=True
+        ):
+            running += count
+            result.append((bound, running))
+        return result
+
+
+def format_value(value: float) -> str:
+    """Formats a number for the Prometheus text format."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class MetricsRegistry:
+    """MetricsRegistry collects the counters, gauges and histograms of one epr run.
+
+    Stages (scan, exiftool, classify, rename, convert, verify, delete) report their wall
+    clock time, files and bytes through stage or add_stage, from which the JSON export
+    derives files/s and bytes/s. The Prometheus export writes the node exporter textfile
+    format, replacing the file atomically, so a collector never reads a partial file.
+    Updates are guarded by a lock, stages report from worker threads as well.
+    """
+
+    JSON, PROMETHEUS = METRICS_FORMATS
+    FORMATS = [JSON, PROMETHEUS]
+    PROMETHEUS_SUFFIX = ".prom"
+    SCHEMA_VERSION = 1
+    DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+    MAX_SAMPLES = 10000
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self):
+        """MetricsRegistry init."""
+        self._lock = threading.Lock()
+        # name -> labels -> value
+        self._values: dict[str, dict[tuple[tuple[str, str], ...], float]] = {}
+        self._histograms: dict[str, dict[tuple[tuple[str, str], ...], Histogram]] = {}
+        self._rng = random.Random(0)  # noqa: S311
+        self._started_at = timeit.default_timer()
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """Adds value to a counter."""
+        key = self._key(name, labels)
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        """Sets a gauge."""
+        key = self._key(name, labels)
+        with self._lock:
+            self._values.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Adds an observation to a histogram."""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.setdefault(name, {}).get(key)
+            if histogram is None:
+                histogram = Histogram(self.DEFAULT_BUCKETS)
+                self._histograms[name][key] = histogram
+            histogram.observe(value, self.MAX_SAMPLES, self._rng)
+
+    def add_stage(
+        self, stage: str, seconds: float = 0.0, files: int = 0, byte_count: int = 0
+    ) -> None:
+        """Adds time, files and bytes to a stage."""
+        self.inc("epr_stage_seconds_total", seconds, stage=stage)
+        if files:
+            self.inc("epr_stage_files_total", files, stage=stage)
+        if byte_count:
+            self.inc("epr_stage_bytes_total", byte_count, stage=stage)
+
+    @contextmanager
+    def stage(self, stage: str) -> Generator[StageCounts]:
+        """Times the block as stage, the block fills in the files and bytes it handled."""
+        counts = StageCounts()
+        start = timeit.default_timer()
+        try:
+            with tracer.span(f"stage {stage}", category="stage"):
+                yield counts
+        finally:
+            self.add_stage(stage, timeit.default_timer() - start, counts.files, counts.bytes)
+
+    def value(self, name: str, **labels: str) -> float:
+        """Returns the value of a counter or gauge, 0 if it was never set."""
+        with self._lock:
+            return self._values.get(name, {}).get(self._key(name, labels), 0.0)
+
+    def histogram(self, name: str, **labels: str) -> Histogram | None:
+        """Returns a histogram, None if it has no observations."""
+        with self._lock:
+            return self._histograms.get(name, {}).get(self._key(name, labels))
+
+    def finish(self) -> None:
+        """Records the run time and the time the run finished."""
+        self.set("epr_run_seconds", timeit.default_timer() - self._started_at)
+        self.set("epr_last_run_timestamp_seconds", time.time())
+
+    def to_dict(self) -> dict:
+        """Returns all metrics, the per stage throughput and the latency percentiles."""
+        with self._lock:
+            values = {name: dict(series) for name, series in self._values.items()}
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+        stages: dict[str, dict] = {}
+        for field_name, metric in [
+            ("seconds", "epr_stage_seconds_total"),
+            ("files", "epr_stage_files_total"),
+            ("bytes", "epr_stage_bytes_total"),
+        ]:
+            for key, value in values.get(metric, {}).items():
+                stage = stages.setdefault(
+                    dict(key)["stage"], {"seconds": 0.0, "files": 0, "bytes": 0}
+                )
+                stage[field_name] = value if field_name == "seconds" else int(value)
+        for stage in stages.values():
+            seconds = stage["seconds"]
+            stage["files_per_second"] = stage["files"] / seconds if seconds > 0 else None
+            stage["bytes_per_second"] = stage["bytes"] / seconds if seconds > 0 else None
+        return {
+            "schema": self.SCHEMA_VERSION,
+            "stages": stages,
+            "metrics": [
+                {"name": name, "type": METRICS[name][0], "labels": dict(key), "value": value}
+                for name, series in sorted(values.items())
+                for key, value in sorted(series.items())
+            ],
+            "histograms": [
+                {
+                    "name": name,
+                    "labels": dict(key),
+                    "count": histogram.count,
+                    "sum": histogram.total,
+                    "buckets": dict(histogram.cumulative()),
+                    **{f"p{p}": histogram.percentile(p) for p in self.PERCENTILES},
+                }
+                for name, series in sorted(histograms.items())
+                for key, histogram in sorted(series.items())
+            ],
+        }
+
+    def to_prometheus(self) -> str:
+        """Returns all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            values = {name: dict(series) for name, series in self._values.items()}
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+        lines = []
+        for name in sorted(values.keys() | histograms.keys()):
+            metric_type, help_text = METRICS[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for key, value in sorted(values.get(name, {}).items()):
+                lines.append(f"{name}{self._labels(key)} {format_value(value)}")
+            for key, histogram in sorted(histograms.get(name, {}).items()):
+                for bound, count in histogram.cumulative():
+                    lines.append(f"{name}_bucket{self._labels((*key, ('le', bound)))} {count}")
+                lines.append(f"{name}_sum{self._labels(key)} {format_value(histogram.total)}")
+                lines.append(f"{name}_count{self._labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str, output_format: str | None = None) -> None:
+        """Writes the metrics atomically, as Prometheus text for .prom files, JSON otherwise.
+
+        Args:
+            path (str): file to write
+            output_format (str | None): json or prometheus, None to choose by the suffix
+        """
+        if output_format is None:
+            output_format = (
+                self.PROMETHEUS if path.endswith(self.PROMETHEUS_SUFFIX) else self.JSON
+            )
+        if output_format == self.PROMETHEUS:
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_dict(), indent=2) + "\n"
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics_", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as metrics_file:
+                # mkstemp creates the file 0600, node_exporter may run as another user
+                os.fchmod(metrics_file.fileno(), 0o644)
+                metrics_file.write(content)
+            os.replace(tmp_path, path)
+        finally:
+            with suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+
+    @staticmethod
+    def _key(name: str, labels: dict[str, str]) -> tuple[tuple[str, str], ...]:
+        """Returns the series key of a metric, rejecting unknown metric names."""
+        if name not in METRICS:
+            raise KeyError(f"unknown metric: {name}")
+        return tuple(sorted(labels.items()))
+
+    @staticmethod
+    def _labels(key: tuple[tuple[str, str], ...]) -> str:
+        """Formats a series key as Prometheus label set."""
+        if not key:
+            return ""
+        pairs = []
+        for label, value in key:
+            value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            pairs.append(f'{label}="{value}"')
+        return "{" + ",".join(pairs) + "}"
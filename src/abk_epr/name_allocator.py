@@ -0,0 +1,63 @@
+"""Collision free allocation of new file names per target directory."""
+
+# Standard library imports
+import os
+
+
+class NameAllocator:
+    """NameAllocator hands out file names that exist neither on disk nor earlier in the run.
+
+    The stems of the files in a target directory are read once with os.scandir, the first
+    time the directory is used, and every allocated stem is added to the same set, so a
+    collision check is one set lookup. A RAW directory shares its stems with its DNG
+    directory, because the converted files keep the stem of the RAW file. A stem that is
+    taken gets the next free sequence suffix, _1, _2, ..., in the order names are
+    allocated, which is deterministic for a sorted list of files.
+    """
+
+    def __init__(self):
+        """NameAllocator init."""
+        # directory -> lower case stems taken in the directory
+        self._stems: dict[str, set[str]] = {}
+        # (directory, stem) -> last sequence suffix handed out
+        self._sequences: dict[tuple[str, str], int] = {}
+
+    def allocate(
+        self, directory: str, stem: str, ext: str, sibling_dir: str | None = None
+    ) -> str:
+        """Returns a free path directory/stem[_n].ext and reserves it.
+
+        Args:
+            directory (str): target directory
+            stem (str): preferred file name without extension
+            ext (str): file extension without dot
+            sibling_dir (str | None): directory sharing the stems, e.g. the DNG directory
+
+        Returns:
+            str: path of the allocated file
+        """
+        directory = os.path.normpath(directory)
+        stems = self._stems.get(directory)
+        if stems is None:
+            stems = self._read_stems(directory)
+            if sibling_dir is not None:
+                stems |= self._read_stems(sibling_dir)
+            self._stems[directory] = stems
+        new_stem = stem.lower()
+        if new_stem in stems:
+            sequence = self._sequences.get((directory, new_stem), 0) + 1
+            while f"{new_stem}_{sequence}" in stems:
+                sequence += 1
+            self._sequences[(directory, new_stem)] = sequence
+            new_stem = f"{new_stem}_{sequence}"
+        stems.add(new_stem)
+        return os.path.join(directory, f"{new_stem}.{ext}")
+
+    @staticmethod
+    def _read_stems(directory: str) -> set[str]:
+        """Returns lower case stems of the files in directory, empty if it does not exist."""
+        try:
+            with os.scandir(directory) as entries:
+                return {entry.name.rsplit(".", 1)[0].lower() for entry in entries}
+        except FileNotFoundError:
+            return set()
@@ -0,0 +1,85 @@
+"""Rename, convert and delete plan of a project directory, written by epr plan."""
+
+# Standard library imports
+import json
+import os
+from dataclasses import dataclass, field
+
+
+# Local application imports
+from abk_epr.constants import PLAN_FILE_NAME
+from abk_epr.journal import JournalOp
+
+
+@dataclass(slots=True)
+class PlanRecord:
+    """One planned operation, paths are relative to the project directory.
+
+    For a rename dst is the new file name and size the size of src when planned, for a
+    conversion dst is the directory of the DNG file, a deletion has dst equal to src.
+    """
+
+    op: JournalOp
+    src: str
+    dst: str
+    size: int = -1
+
+
+@dataclass(slots=True)
+class OperationPlan:
+    """OperationPlan is a JSON Lines file with a header line followed by one line per operation.
+
+    The header holds the format version and the project directory the plan was made
+    for. Records are written in the order they are applied: all renames, then the
+    conversions and the deletions of the converted RAW files.
+    """
+
+    FILE_NAME = PLAN_FILE_NAME
+    VERSION = 1
+
+    project_dir: str
+    records: list[PlanRecord] = field(default_factory=list)
+
+    def operations(self, op: JournalOp) -> list[PlanRecord]:
+        """Returns the records of one kind of operation, in plan order."""
+        return [record for record in self.records if record.op == op]
+
+    def write(self, path: str) -> None:
+        """Writes the plan to path."""
+        header = {"version": self.VERSION, "project_dir": self.project_dir}
+        lines = [json.dumps(header, separators=(",", ":"))]
+        lines.extend(
+            json.dumps(
+                {
+                    "op": record.op.value,
+                    "src": record.src,
+                    "dst": record.dst,
+                    "size": record.size,
+                },
+                separators=(",", ":"),
+            )
+            for record in self.records
+        )
+        with open(path, "w", encoding="utf-8") as plan_file:
+            plan_file.write("\n".join(lines) + "\n")
+
+    @classmethod
+    def read(cls, path: str) -> "OperationPlan":
+        """Reads a plan written by write."""
+        with open(path, encoding="utf-8") as plan_file:
+            header = json.loads(plan_file.readline() or "{}")
+            if header.get("version") != cls.VERSION:
+                raise Exception(f"{path}: not an epr plan of version {cls.VERSION}")
+            records = []
+            for line in plan_file:
+                if line.strip():
+                    record = json.loads(line)
+                    records.append(
+                        PlanRecord(
+                            JournalOp(record["op"]),
+                            os.path.normpath(record["src"]),
+                            os.path.normpath(record["dst"]),
+                            record.get("size", -1),
+                        )
+                    )
+        return cls(header["project_dir"], records)
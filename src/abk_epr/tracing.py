@@ -0,0 +1,283 @@
+"""Tracing spans of sync and async code, exported as Chrome trace / Perfetto JSON."""
+
+# Standard library imports
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+
+
+# Local application imports
+from abk_epr.constants import LOOP_BLOCK_THRESHOLD_SECONDS
+
+
+# name of the innermost open span, copied into tasks created inside the span
+_current_span: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "current_span", default=None
+)
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class _Span:
+    """Context manager recording one complete event when it exits."""
+
+    __slots__ = ("_tracer", "_name", "_category", "_args", "_start_ns", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, args: dict):
+        """_Span init."""
+        self._tracer = tracer
+        self._name = name
+        self._category = category
+        self._args = args
+        self._start_ns = 0
+        self._token: contextvars.Token | None = None
+
+    def __enter__(self):
+        """Enter for span, starts the clock."""
+        parent = _current_span.get()
+        if parent is not None:
+            self._args["parent"] = parent
+        self._token = _current_span.set(self._name)
+        self._start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        """Exit for span, records the event."""
+        end_ns = time.perf_counter_ns()
+        _current_span.reset(self._token)  # type: ignore
+        if exc_type is not None:
+            self._args["error"] = exc_type.__name__
+        self._tracer.add_complete(self._name, self._category, self._start_ns, end_ns, self._args)
+
+
+class Tracer:
+    """Tracer records spans as Chrome trace events, when enabled.
+
+    Disabled, span returns a shared no-op context manager, so instrumented code pays
+    one attribute lookup. Enabled, every span becomes a complete ("X") event on the
+    lane of the asyncio task or thread it ran in, so overlapping coroutines do not
+    break the nesting of each other. The events load in chrome://tracing and Perfetto.
+    """
+
+    MAX_EVENTS = 1_000_000
+
+    def __init__(self):
+        """Tracer init."""
+        self.enabled = False
+        self.dropped = 0
+        self._events: list[dict] = []
+        self._lanes: dict[tuple[str, int], tuple[int, str]] = {}
+        self._lock = threading.Lock()
+        self._origin_ns = time.perf_counter_ns()
+        self._pid = os.getpid()
+
+    def enable(self) -> None:
+        """Starts recording spans."""
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stops recording spans, recorded events are kept."""
+        self.enabled = False
+
+    def clear(self) -> None:
+        """Drops all recorded events."""
+        with self._lock:
+            self._events.clear()
+            self._lanes.clear()
+            self.dropped = 0
+
+    def span(self, name: str, category: str = "epr", **args):
+        """Returns a context manager timing the block as span name."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, category, args)
+
+    def add_complete(
+        self, name: str, category: str, start_ns: int, end_ns: int, args: dict | None = None
+    ) -> None:
+        """Records a complete event of the current task or thread."""
+        lane = self._lane()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start_ns - self._origin_ns) / 1000.0,
+            "dur": (end_ns - start_ns) / 1000.0,
+            "pid": self._pid,
+            "tid": lane,
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            if len(self._events) >= self.MAX_EVENTS:
+                self.dropped += 1
+                return
+            self._events.append(event)
+
+    def events(self) -> list[dict]:
+        """Returns a copy of the recorded events."""
+        with self._lock:
+            return list(self._events)
+
+    def to_chrome_trace(self) -> dict:
+        """Returns the recorded events in the Chrome trace JSON object format."""
+        with self._lock:
+            events = list(self._events)
+            lanes = list(self._lanes.values())
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self._pid,
+                "tid": lane,
+                "args": {"name": lane_name},
+            }
+            for lane, lane_name in lanes
+        ]
+        return {
+            "traceEvents": metadata + events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_events": self.dropped},
+        }
+
+    def write(self, path: str) -> None:
+        """Writes the Chrome trace JSON to path."""
+        with open(path, "w", encoding="utf-8") as trace_file:
+            json.dump(self.to_chrome_trace(), trace_file)
+
+    def _lane(self) -> int:
+        """Returns the trace lane of the current asyncio task, or of the thread outside tasks."""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is not None:
+            key, lane_name = ("task", id(task)), f"task {task.get_name()}"
+        else:
+            thread = threading.current_thread()
+            key, lane_name = ("thread", threading.get_ident()), f"thread {thread.name}"
+        with self._lock:
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = (len(self._lanes) + 1, lane_name)
+                self._lanes[key] = lane
+        return lane[0]
+
+
+tracer = Tracer()
+
+
+@dataclass(slots=True)
+class BlockedLoop:
+    """One stall of the event loop."""
+
+    start: float
+    seconds: float
+    stack: list[str] = field(default_factory=list)
+
+
+class LoopBlockMonitor:
+    """LoopBlockMonitor flags calls that block the event loop for longer than a threshold.
+
+    A heartbeat task wakes up every interval and measures how late it is. A watchdog
+    thread samples the stack of the event loop thread once the heartbeat is overdue,
+    so a stall is reported with the synchronous call that caused it. Every stall is
+    logged as a warning and recorded as "event loop blocked" span in the tracer.
+    """
+
+    DEFAULT_THRESHOLD = LOOP_BLOCK_THRESHOLD_SECONDS
+    STACK_LIMIT = 8
+
+    def __init__(
+        self,
+        logger: logging.Logger = None,  # type: ignore
+        threshold: float = DEFAULT_THRESHOLD,
+        trace: Tracer = None,  # type: ignore
+    ):
+        """LoopBlockMonitor init."""
+        self._logger = logger or logging.getLogger(__name__)
+        self._threshold = threshold
+        self._interval = threshold / 2
+        self._tracer = trace or tracer
+        self._last_beat = 0.0
+        self._stack: list[str] = []
+        self._loop_thread_id = 0
+        self._heartbeat: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.blocks: list[BlockedLoop] = []
+
+    def start(self) -> None:
+        """Starts the heartbeat on the running loop and the watchdog thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stop.clear()
+        self._heartbeat = asyncio.get_running_loop().create_task(
+            self._beat(), name="loop_block_monitor"
+        )
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop_block_watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        """Stops the heartbeat and the watchdog thread."""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._heartbeat
+            self._heartbeat = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _beat(self) -> None:
+        """Measures how late every wake up is and records the stalls."""
+        while True:
+            await asyncio.sleep(self._interval)
+            now = time.perf_counter()
+            late = now - self._last_beat - self._interval
+            if late > self._threshold:
+                self._record(self._last_beat + self._interval, late)
+            self._stack = []
+            self._last_beat = now
+
+    def _watch(self) -> None:
+        """Samples the stack of the loop thread while the heartbeat is overdue."""
+        while not self._stop.wait(self._interval):
+            overdue = time.perf_counter() - self._last_beat - self._interval
+            if overdue > self._threshold and not self._stack:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    self._stack = [
+                        f"{summary.filename}:{summary.lineno} in {summary.name}"
+                        for summary in traceback.extract_stack(frame)[-self.STACK_LIMIT :]
+                    ]
+
+    def _record(self, start: float, seconds: float) -> None:
+        """Logs a stall and adds it to the trace."""
+        stack = self._stack
+        block = BlockedLoop(start, seconds, stack)
+        self.blocks.append(block)
+        culprit = next((line for line in reversed(stack) if "abk_epr" in line), None)
+        self._logger.warning(
+            f"event loop blocked for {seconds * 1000.0:.0f} ms"
+            + (f" in {culprit or stack[-1]}" if stack else "")
+        )
+        if self._tracer.enabled:
+            start_ns = int(start * 1e9)
+            self._tracer.add_complete(
+                "event loop blocked",
+                "blocking",
+                start_ns,
+                start_ns + int(seconds * 1e9),
+                {"stack": stack},
+            )
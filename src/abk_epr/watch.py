@@ -0,0 +1,232 @@
+"""Watch mode, processing files as they land in a project directory."""
+
+# Standard library imports
+import asyncio
+import contextlib
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import timeit
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+
+# Local application imports
+from abk_epr.abk_common import function_trace
+from abk_epr.companion_index import CompanionIndex
+from abk_epr.constants import WATCH_SETTLE_SECONDS
+
+
+if TYPE_CHECKING:
+    from abk_epr.epr import ExifRename
+
+
+class DirectoryWatcher:
+    """DirectoryWatcher reports names of files created or written in one directory.
+
+    On Linux the directory is watched with inotify through libc, and the events are
+    read on the event loop without a thread. The callback gets the file name, or None
+    when the kernel event queue overflowed and the directory has to be rescanned.
+    Where inotify is not available, start returns False and the caller polls.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    EVENT_HEADER = struct.Struct("iIII")
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, logger: logging.Logger = None, directory: str = "."):  # type: ignore
+        """DirectoryWatcher init."""
+        self._logger = logger or logging.getLogger(__name__)
+        self._directory = directory
+        self._fd: int | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def uses_inotify(self) -> bool:
+        """True if the directory is watched with inotify."""
+        return self._fd is not None
+
+    def start(self, on_change: Callable[[str | None], None]) -> bool:
+        """Starts watching, returns False if inotify is not available."""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError) as exp:
+            self._logger.info(f"inotify not available, polling instead: {exp}")
+            return False
+        if fd < 0:
+            self._logger.info(f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+            return False
+        if libc.inotify_add_watch(fd, os.fsencode(self._directory), self.WATCH_MASK) < 0:
+            self._logger.info(f"inotify_add_watch failed: {os.strerror(ctypes.get_errno())}")
+            os.close(fd)
+            return False
+        self._fd = fd
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(fd, self._read_events, on_change)
+        self._logger.info(f"watching {self._directory} with inotify")
+        return True
+
+    def close(self) -> None:
+        """Stops watching."""
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)  # type: ignore
+            os.close(self._fd)
+            self._fd = None
+
+    def _read_events(self, on_change: Callable[[str | None], None]) -> None:
+        """Reads all pending inotify events and reports them."""
+        try:
+            data = os.read(self._fd, self.READ_SIZE)  # type: ignore
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            _, mask, _, name_len = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset : offset + name_len].rstrip(b"\0")
+            offset += name_len
+            if mask & self.IN_Q_OVERFLOW:
+                on_change(None)
+            elif name and not mask & self.IN_ISDIR:
+                on_change(os.fsdecode(name))
+
+
+class WatchRunner:
+    """WatchRunner processes files arriving in a project directory until it is stopped.
+
+    A file is processed once its size and modification time have not changed for
+    settle_seconds, so files still being copied from a card or a tethered camera are
+    left alone, and so are settled files sharing their stem with such a file. Ready
+    files are handed to ExifRename in small batches, the exiftool session and the
+    conversion stage stay running between batches. Files ExifRename does not move,
+    unsupported or failed ones, are only retried when they change.
+    """
+
+    DEFAULT_SETTLE_SECONDS = WATCH_SETTLE_SECONDS
+    DEFAULT_POLL_INTERVAL = 0.5
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        exif_rename: "ExifRename",
+        settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        watcher: DirectoryWatcher | None = None,
+    ):
+        """WatchRunner init."""
+        self._logger = logger or logging.getLogger(__name__)
+        self._exif_rename = exif_rename
+        self._settle_seconds = settle_seconds
+        self._poll_interval = poll_interval
+        self._watcher = watcher or DirectoryWatcher(logger=self._logger)
+        # file name -> (size, mtime_ns, time of last change)
+        self._pending: dict[str, tuple[int, int, float]] = {}
+        # file name -> (size, mtime_ns) of files left in place after processing
+        self._ignored: dict[str, tuple[int, int]] = {}
+        self._rescan = True
+        self.processed_count = 0
+
+    @function_trace
+    async def run(self, stop_event: asyncio.Event) -> int:
+        """Watches and processes files until stop_event is set.
+
+        Returns:
+            int: number of renamed files
+        """
+        self._exif_rename.open_image_dir()
+        finished = False
+        try:
+            polling = not self._watcher.start(self._on_change)
+            while not stop_event.is_set():
+                if polling or self._rescan:
+                    self._scan()
+                ready = self._ready_files(timeit.default_timer())
+                if ready:
+                    await self._process(ready)
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(stop_event.wait(), timeout=self._poll_interval)
+            finished = True
+        finally:
+            self._watcher.close()
+            self._exif_rename.close_image_dir(finished)
+        self._logger.info(f"watch: {self.processed_count} files processed")
+        return self.processed_count
+
+    def _on_change(self, file_name: str | None) -> None:
+        """Called by the watcher for every created or written file."""
+        if file_name is None:
+            self._rescan = True
+        elif self._is_candidate(file_name):
+            self._pending.setdefault(file_name, (-1, -1, 0.0))
+
+    def _is_candidate(self, file_name: str) -> bool:
+        """True if the file name is not excluded from processing."""
+        return not self._exif_rename.classification_rules.is_excluded(file_name)
+
+    def _scan(self) -> None:
+        """Adds all files of the directory to the pending files."""
+        self._rescan = False
+        with os.scandir(".") as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False) and self._is_candidate(entry.name):
+                    self._pending.setdefault(entry.name, (-1, -1, 0.0))
+
+    def _ready_files(self, now: float) -> list[str]:
+        """Returns pending files, whose size and mtime did not change for settle_seconds.
+
+        A settled file is held back while a file with the same stem is still changing,
+        so a JPEG or sidecar is processed together with its RAW file.
+        """
+        settled = []
+        changing = []
+        for file_name, (size, mtime_ns, changed_at) in list(self._pending.items()):
+            try:
+                stat = os.stat(file_name)
+            except FileNotFoundError:
+                del self._pending[file_name]
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self._ignored.get(file_name) == signature:
+                del self._pending[file_name]
+            elif signature != (size, mtime_ns):
+                self._pending[file_name] = (*signature, now)
+                changing.append(file_name)
+            elif now - changed_at >= self._settle_seconds:
+                settled.append(file_name)
+            else:
+                changing.append(file_name)
+        if changing and settled:
+            companions = CompanionIndex(
+                changing, self._exif_rename.classification_rules.raw_extensions
+            )
+            settled = [
+                file_name
+                for file_name in settled
+                if companions.group(file_name) is None and companions.raw_of(file_name) is None
+            ]
+        for file_name in settled:
+            del self._pending[file_name]
+        return sorted(settled)
+
+    async def _process(self, files: list[str]) -> None:
+        """Processes quiescent files, remembering the ones left in place."""
+        self._logger.info(f"watch: processing {len(files)} files")
+        try:
+            self.processed_count += await self._exif_rename.process_files(files)
+        except Exception as exp:
+            self._logger.error(f"watch: processing {files} failed: {exp}")
+        for file_name in files:
+            try:
+                stat = os.stat(file_name)
+            except FileNotFoundError:
+                continue
+            self._ignored[file_name] = (stat.st_size, stat.st_mtime_ns)
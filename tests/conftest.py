@@ -0,0 +1,18 @@
+"""Fixtures shared by the tests."""
+
+# Third-party
+import pytest
+
+# Local
+from tests.helpers import PROJECT_DIR
+
+
+@pytest.fixture
+def image_dir(tmp_path, monkeypatch):
+    """Project directory with a few images, a video and an unsupported file."""
+    project_dir = tmp_path / PROJECT_DIR
+    project_dir.mkdir()
+    for file_name in ["a.jpg", "b.jpg", "c.png", "d.mov", "notes.txt", ".hidden"]:
+        (project_dir / file_name).write_bytes(b"data")
+    monkeypatch.chdir(project_dir)
+    return project_dir
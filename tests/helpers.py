@@ -0,0 +1,68 @@
+"""Fakes and sample data shared by the tests."""
+
+# Standard library
+import asyncio
+import os
+import struct
+from pathlib import Path
+from unittest.mock import MagicMock
+
+
+PROJECT_DIR = "20240101_unittest_trip"
+SECONDS = {
+    "a.jpg": 0,
+    "b.jpg": 1,
+    "c.png": 2,
+    "d.mov": 3,
+    "notes.txt": 4,
+    "e.cr2": 5,
+    "f.cr2": 6,
+    "a.cr2": 0,
+}
+
+
+def fake_exiftool() -> MagicMock:
+    """Fake exiftool session returning Canon metadata for every file."""
+    session = MagicMock()
+    session.get_tags.side_effect = lambda files, tags: [
+        {
+            "SourceFile": f,
+            "EXIF:CreateDate": f"2024:01:01 10:00:{SECONDS[os.path.basename(f)]:02}",
+            "EXIF:Make": "Canon",
+            "EXIF:Model": "Canon EOS R5",
+        }
+        for f in files
+    ]
+    return session
+
+
+def minimal_dng_bytes(size: int = 2048, with_dng_version: bool = True) -> bytes:
+    """Little endian TIFF with one IFD pointing to strip data at the end of the file."""
+    entries = [(256, 3, 1, 1), (273, 4, 1, size - 16), (279, 4, 1, 16)]
+    if with_dng_version:
+        entries.append((50706, 1, 4, 0x00000401))
+    ifd = struct.pack("<H", len(entries))
+    ifd += b"".join(struct.pack("<HHII", *entry) for entry in entries)
+    ifd += struct.pack("<I", 0)
+    data = b"II*\x00" + struct.pack("<I", 8) + ifd
+    return data + b"\x00" * (size - len(data))
+
+
+async def fake_convert(raw_file: str, dng_dir: str) -> str:
+    """Writes an empty dng file, fails for files containing 'broken'."""
+    await asyncio.sleep(0)
+    if "broken" in raw_file:
+        raise RuntimeError("converter crashed")
+    os.makedirs(dng_dir, exist_ok=True)
+    dng_file = os.path.join(dng_dir, Path(raw_file).with_suffix(".dng").name)
+    Path(dng_file).write_bytes(minimal_dng_bytes())
+    return dng_file
+
+
+def file_tree(root) -> list[str]:
+    """Relative paths of all files below root."""
+    return sorted(
+        os.path.relpath(os.path.join(dir_path, f), root)
+        for dir_path, _, files in os.walk(root)
+        for f in files
+    )
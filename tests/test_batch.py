@@ -0,0 +1,120 @@
+"""Tests for the batch mode."""
+
+import logging
+import os
+
+import pytest
+
+from abk_epr.batch import BatchRunner
+from abk_epr.dng_conversion import DngConversionStage
+from abk_epr.epr import ExifRename
+from abk_epr.file_mover import FileMover
+from abk_epr.journal import JournalOp, OperationJournal
+from tests.helpers import fake_convert, fake_exiftool, file_tree
+
+
+def _make_projects(root) -> None:
+    """Two valid projects, one nested, plus directories that are not projects."""
+    for project in ["20240101_trip", "2024/20240202_party", "misc", ".trash/20240303_old"]:
+        project_dir = root / project
+        project_dir.mkdir(parents=True)
+        for file_name in ["a.jpg", "b.jpg"]:
+            (project_dir / file_name).write_bytes(b"data")
+
+
+def test_find_project_dirs(tmp_path):
+    """Test that only YYYYMMDD_name directories outside hidden directories are found."""
+    _make_projects(tmp_path)
+    (tmp_path / "20240101_trip" / "20240101_nested").mkdir()
+
+    assert BatchRunner.find_project_dirs(str(tmp_path)) == [  # noqa: S101
+        str(tmp_path / "2024" / "20240202_party"),
+        str(tmp_path / "20240101_trip"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_run_processes_all_projects_with_shared_workers(tmp_path, monkeypatch):
+    """Test that every project is renamed with one shared exiftool session and file mover."""
+    _make_projects(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    logger = logging.getLogger(__name__)
+    session = fake_exiftool()
+    file_mover = FileMover(logger=logger)
+
+    def make_exif_rename(op_dir: str) -> ExifRename:
+        return ExifRename(logger, op_dir, exiftool_session=session, file_mover=file_mover)
+
+    summaries = await BatchRunner(logger, str(tmp_path), make_exif_rename).run()
+    file_mover.close()
+
+    assert [(s.ok, s.renamed) for s in summaries] == [(True, 2), (True, 2)]  # noqa: S101
+    assert file_tree(tmp_path / "20240101_trip") == [  # noqa: S101
+        "canon_eosr5_jpg/20240101_100000_canon_eosr5_trip.jpg",
+        "canon_eosr5_jpg/20240101_100001_canon_eosr5_trip.jpg",
+    ]
+    assert sorted(os.listdir(tmp_path / "misc")) == ["a.jpg", "b.jpg"]  # noqa: S101
+    assert os.getcwd() == str(tmp_path)  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_run_reports_failed_project_and_continues(tmp_path, monkeypatch):
+    """Test that an empty project is reported as failed without stopping the batch."""
+    (tmp_path / "20240101_empty").mkdir()
+    (tmp_path / "20240102_trip").mkdir()
+    (tmp_path / "20240102_trip" / "a.jpg").write_bytes(b"data")
+    monkeypatch.chdir(tmp_path)
+    logger = logging.getLogger(__name__)
+    session = fake_exiftool()
+
+    summaries = await BatchRunner(
+        logger, str(tmp_path), lambda d: ExifRename(logger, d, exiftool_session=session)
+    ).run()
+
+    assert [s.ok for s in summaries] == [False, True]  # noqa: S101
+    assert summaries[1].renamed == 1  # noqa: S101
+    assert os.getcwd() == str(tmp_path)  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_run_converts_all_projects_on_one_stage_joined_once(tmp_path, monkeypatch):
+    """Test that conversions overlap the next projects and every project gets its DNGs."""
+    for project, raw_file in [("20240101_trip", "e.cr2"), ("20240202_party", "f.cr2")]:
+        (tmp_path / project).mkdir()
+        (tmp_path / project / raw_file).write_bytes(b"raw")
+    monkeypatch.chdir(tmp_path)
+    logger = logging.getLogger(__name__)
+    session = fake_exiftool()
+    stage = DngConversionStage(workers=1)
+    monkeypatch.setattr(stage, "_convert_file", fake_convert)
+    joins = []
+    join = stage.join
+    monkeypatch.setattr(stage, "join", lambda: joins.append(stage.submitted) or join())
+
+    def make_exif_rename(op_dir: str) -> ExifRename:
+        journal_path = os.path.join(op_dir, OperationJournal.FILE_NAME)
+        return ExifRename(
+            logger,
+            op_dir,
+            exiftool_session=session,
+            conversion_stage=stage,
+            journal=OperationJournal(logger=logger, path=journal_path),
+        )
+
+    summaries = await BatchRunner(logger, str(tmp_path), make_exif_rename).run()
+
+    assert joins == [2]  # noqa: S101
+    assert [(s.ok, s.renamed, s.converted) for s in summaries] == [(True, 1, 1)] * 2  # noqa: S101
+    assert file_tree(tmp_path / "20240202_party") == [  # noqa: S101
+        ".epr_journal.jsonl.done",
+        "canon_eosr5_dng/20240101_100006_canon_eosr5_party.dng",
+    ]
+    journal = OperationJournal(path=str(tmp_path / "20240101_trip" / OperationJournal.FILE_NAME))
+    journal.load_last_run()
+    assert journal.completed_operations(JournalOp.CONVERT) == [  # noqa: S101
+        (
+            "canon_eosr5_cr2/20240101_100005_canon_eosr5_trip.cr2",
+            "canon_eosr5_dng/20240101_100005_canon_eosr5_trip.dng",
+        )
+    ]
+    assert os.getcwd() == str(tmp_path)  # noqa: S101
@@ -0,0 +1,130 @@
+"""Tests for the benchmark suite."""
+
+import asyncio
+import json
+import logging
+import os
+
+import pytest
+
+from abk_epr.epr import ExifRename
+from abk_epr.exif_session import ExifToolSession
+from benchmarks import bench_dedup, bench_epr, bench_memory, bench_startup
+from benchmarks.corpus import make_project
+from benchmarks.stub_dng import StubDngConversionStage
+
+
+@pytest.mark.skipif(os.name == "nt", reason="the stub exiftool is started by a shell script")
+def test_stub_exiftool_reads_like_exiftool(tmp_path):
+    """Test that the stub exiftool answers PyExifTool requests with the corpus metadata."""
+    project_dir, _ = make_project(str(tmp_path), 30, seed=3)
+    files = sorted(os.path.join(project_dir, f) for f in os.listdir(project_dir))
+    executable = bench_epr.write_stub_exiftool(str(tmp_path))
+
+    with ExifToolSession(executable=executable) as session:
+        metadata_list = session.get_tags(files, ExifRename.EXIF_TAGS)
+
+    assert [m["SourceFile"] for m in metadata_list] == files  # noqa: S101
+    assert any(m.get("EXIF:Model") == "iPhone 15 Pro" for m in metadata_list)  # noqa: S101
+    assert any("QuickTime:CreateDate" in m for m in metadata_list)  # noqa: S101
+
+
+def test_corpus_is_deterministic(tmp_path):
+    """Test that the same seed writes the same files."""
+    _, first = make_project(str(tmp_path / "a"), 200, seed=7)
+    _, second = make_project(str(tmp_path / "b"), 200, seed=7)
+
+    assert first == second  # noqa: S101
+    assert first.total == 200  # noqa: S101
+    assert sorted(os.listdir(tmp_path / "a" / "20240101_benchmark")) == sorted(  # noqa: S101
+        os.listdir(tmp_path / "b" / "20240101_benchmark")
+    )
+
+
+@pytest.mark.skipif(os.name == "nt", reason="the stub exiftool is started by a shell script")
+def test_run_phases_renames_converts_and_deletes(tmp_path, monkeypatch):
+    """Test that the timed phases leave the same tree as a normal run would."""
+    project_dir, stats = make_project(str(tmp_path), 120, seed=1)
+    executable = bench_epr.write_stub_exiftool(str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    exif_rename = ExifRename(
+        logger=logging.getLogger(__name__),
+        op_dir=project_dir,
+        exiftool_session=bench_epr.make_exif_session("native", 1, executable),
+        conversion_stage=StubDngConversionStage(),
+    )
+    timer = bench_epr.PhaseTimer()
+
+    renamed = asyncio.run(bench_epr.run_phases(exif_rename, timer))
+
+    left_over = sorted(os.listdir(project_dir))
+    assert renamed == stats.total - stats.unsupported - stats.excluded  # noqa: S101
+    assert set(timer.seconds) == set(bench_epr.PHASES)  # noqa: S101
+    assert not [d for d in left_over if d.endswith(("_cr2", "_nef", "_arw"))]  # noqa: S101
+    assert [d for d in left_over if d.endswith("_dng")]  # noqa: S101
+
+
+@pytest.mark.skipif(os.name == "nt", reason="the stub exiftool is started by a shell script")
+def test_main_writes_machine_readable_results(tmp_path, monkeypatch):
+    """Test that every size and phase has a record in the JSON results."""
+    output = tmp_path / "results.json"
+    monkeypatch.setattr(logging, "basicConfig", lambda **kwargs: None)
+
+    bench_epr.main(["--sizes", "50", "80", "--work-dir", str(tmp_path), "-o", str(output)])
+
+    document = json.loads(output.read_text())
+    assert document["schema"] == bench_epr.SCHEMA_VERSION  # noqa: S101
+    assert [(r["files"], r["phase"]) for r in document["results"]] == [  # noqa: S101
+        (files, phase) for files in [50, 80] for phase in bench_epr.PHASES
+    ]
+    assert all(r["seconds"] >= 0 for r in document["results"])  # noqa: S101
+
+
+def test_startup_benchmark_writes_machine_readable_results(tmp_path, monkeypatch):
+    """Test that every startup case has a timed record with its slowest imports."""
+    output = tmp_path / "startup.json"
+    monkeypatch.setattr(logging, "basicConfig", lambda **kwargs: None)
+
+    bench_startup.main(
+        ["--cases", "python", "version", "--repeat", "2", "--top-imports", "3", "-o", str(output)]
+    )
+
+    document = json.loads(output.read_text())
+    assert document["schema"] == bench_startup.SCHEMA_VERSION  # noqa: S101
+    assert [r["case"] for r in document["results"]] == ["python", "version"]  # noqa: S101
+    assert all(0 < r["min_ms"] <= r["median_ms"] for r in document["results"])  # noqa: S101
+    assert len(document["results"][1]["slowest_imports"]) == 3  # noqa: S101
+
+
+@pytest.mark.skipif(os.name == "nt", reason="the stub exiftool is started by a shell script")
+def test_memory_benchmark_records_take_less_than_exiftool_dicts(tmp_path, monkeypatch):
+    """Test that the record layout is measured smaller than the exiftool dicts it replaces."""
+    output = tmp_path / "memory.json"
+    monkeypatch.setattr(logging, "basicConfig", lambda **kwargs: None)
+
+    bench_memory.main(["--sizes", "200", "--work-dir", str(tmp_path), "-o", str(output)])
+
+    document = json.loads(output.read_text())
+    per_file = {r["layout"]: r["bytes_per_file"] for r in document["results"]}
+    assert document["schema"] == bench_memory.SCHEMA_VERSION  # noqa: S101
+    assert set(per_file) == set(bench_memory.LAYOUTS)  # noqa: S101
+    assert 0 < per_file["record"] < per_file["exiftool_dict"]  # noqa: S101
+
+
+def test_dedup_benchmark_finds_the_copy_and_reads_little_of_new_files(tmp_path, monkeypatch):
+    """Test that the copy of the card is all duplicates and the new card is let through."""
+    output = tmp_path / "dedup.json"
+    monkeypatch.setattr(logging, "basicConfig", lambda **kwargs: None)
+
+    bench_dedup.main(
+        ["--sizes", "20", "--mean-kb", "256", "--work-dir", str(tmp_path), "-o", str(output)]
+    )
+
+    document = json.loads(output.read_text())
+    by_case = {r["case"]: r for r in document["results"]}
+    assert document["schema"] == bench_dedup.SCHEMA_VERSION  # noqa: S101
+    assert list(by_case) == bench_dedup.CASES  # noqa: S101
+    assert by_case["same_card"]["duplicates"] == 20  # noqa: S101
+    assert by_case["same_card"]["hashed_bytes"] >= by_case["same_card"]["card_bytes"]  # noqa: S101
+    assert by_case["new_card"]["duplicates"] == 0  # noqa: S101
+    assert by_case["new_card"]["hashed_bytes"] < by_case["new_card"]["card_bytes"] / 2  # noqa: S101
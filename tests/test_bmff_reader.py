@@ -0,0 +1,122 @@
+"""Tests for the ISO base media box parser."""
+
+import struct
+import time
+from datetime import datetime
+
+import pytest
+
+from abk_epr.bmff_reader import BmffReader
+from abk_epr.exif_reader import ExifReader
+from tests.test_exif_reader import TAGS, tiff_with_exif
+
+
+ALL_TAGS = [*TAGS, BmffReader.CREATE_DATE]
+CREATED = datetime(2024, 1, 1, 10, 0, 0)
+
+
+def box(box_type: bytes, payload: bytes) -> bytes:
+    """Box with a 32 bit size header."""
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def mvhd(created: datetime = CREATED, version: int = 0) -> bytes:
+    """Movie header box with the creation time in seconds since 1904."""
+    seconds = int((created - BmffReader.QUICKTIME_EPOCH).total_seconds())
+    time_fields = struct.pack(">QQ" if version == 1 else ">II", seconds, seconds)
+    return box(b"mvhd", bytes([version, 0, 0, 0]) + time_fields + b"\x00" * 80)
+
+
+def tiff_exif_ifd(create_date: str = "2024:01:01 10:00:00") -> bytes:
+    """TIFF structure whose first IFD is an Exif IFD, as in CR3 CMT2 boxes."""
+    value = create_date.encode() + b"\x00"
+    entry = struct.pack("<HHII", 0x9004, 2, len(value), 8 + 2 + 12 + 4)
+    return b"II" + struct.pack("<HI", 42, 8) + struct.pack("<H", 1) + entry + b"\x00" * 4 + value
+
+
+def cr3() -> bytes:
+    """Canon CR3 with CMT1/CMT2 in the Canon uuid box of moov."""
+    canon_uuid = box(
+        b"uuid",
+        BmffReader.CANON_UUID
+        + box(b"CMT1", tiff_with_exif(sub_sec=None))
+        + box(b"CMT2", tiff_exif_ifd()),
+    )
+    return box(b"ftyp", b"crx \x00\x00\x00\x01crx isom") + box(b"moov", mvhd() + canon_uuid)
+
+
+def heic() -> bytes:
+    """HEIC with an Exif item located by meta/iloc."""
+    ftyp = box(b"ftyp", b"heic\x00\x00\x00\x00mif1heic")
+    exif_item = struct.pack(">I", 0) + tiff_with_exif(model="iPhone 15", make="Apple")
+    infe = box(b"infe", bytes([2, 0, 0, 0]) + struct.pack(">HH", 1, 0) + b"Exif" + b"\x00")
+    iinf = box(b"iinf", bytes(4) + struct.pack(">H", 1) + infe)
+
+    def meta(exif_offset: int) -> bytes:
+        iloc = box(
+            b"iloc",
+            bytes([1, 0, 0, 0])
+            + bytes([0x44, 0x00])
+            + struct.pack(">H", 1)
+            + struct.pack(">HHH", 1, 0, 0)
+            + struct.pack(">H", 1)
+            + struct.pack(">II", exif_offset, len(exif_item)),
+        )
+        return box(b"meta", bytes(4) + box(b"hdlr", bytes(24)) + iinf + iloc)
+
+    exif_offset = len(ftyp) + len(meta(0)) + 8
+    return ftyp + meta(exif_offset) + box(b"mdat", exif_item)
+
+
+def test_cr3_reads_cmt_boxes(tmp_path):
+    """Test that make and model come from CMT1 and the create date from CMT2."""
+    (tmp_path / "img.cr3").write_bytes(cr3())
+
+    assert ExifReader().read(str(tmp_path / "img.cr3"), ALL_TAGS) == {  # noqa: S101
+        "SourceFile": str(tmp_path / "img.cr3"),
+        "EXIF:CreateDate": "2024:01:01 10:00:00",
+        "EXIF:Make": "Canon",
+        "EXIF:Model": "Canon EOS R5",
+        "QuickTime:CreateDate": "2024:01:01 10:00:00",
+    }
+
+
+def test_heic_reads_exif_item(tmp_path):
+    """Test that the Exif item of a HEIC file is found through iinf and iloc."""
+    (tmp_path / "img.heic").write_bytes(heic())
+
+    metadata = ExifReader().read(str(tmp_path / "img.heic"), ALL_TAGS)
+
+    assert metadata["EXIF:Make"] == "Apple"  # noqa: S101
+    assert metadata["EXIF:Model"] == "iPhone 15"  # noqa: S101
+    assert metadata["EXIF:SubSecTimeOriginal"] == 50  # noqa: S101
+
+
+@pytest.mark.parametrize("version", [0, 1])
+def test_large_video_reads_only_the_movie_header(tmp_path, version):
+    """Test that the movie header behind a multi GB mdat box is read in milliseconds."""
+    video = tmp_path / "clip.mov"
+    mdat_size = 3 * 1024 * 1024 * 1024
+    with open(video, "wb") as video_file:
+        video_file.write(box(b"ftyp", b"qt  \x00\x00\x00\x00qt  "))
+        video_file.write(struct.pack(">I4sQ", 1, b"mdat", mdat_size))
+        video_file.truncate(video_file.tell() - 16 + mdat_size)
+        video_file.seek(0, 2)
+        video_file.write(box(b"moov", mvhd(version=version)))
+
+    start = time.perf_counter()
+    metadata = ExifReader().read(str(video), ALL_TAGS)
+    elapsed = time.perf_counter() - start
+
+    assert metadata == {  # noqa: S101
+        "SourceFile": str(video),
+        "QuickTime:CreateDate": "2024:01:01 10:00:00",
+    }
+    assert elapsed < 0.1  # noqa: S101
+
+
+def test_broken_box_structure_falls_back(tmp_path):
+    """Test that a box running past the end of the file makes exiftool read the file."""
+    (tmp_path / "broken.mp4").write_bytes(cr3()[:-10])
+
+    assert ExifReader().read(str(tmp_path / "broken.mp4"), ALL_TAGS) is None  # noqa: S101
@@ -0,0 +1,106 @@
+"""Tests for classification.py."""
+
+# Third-party
+import pytest
+
+# Local
+from abk_epr.classification import ClassificationRules, ExtensionRule, ListType
+
+
+@pytest.fixture
+def rules() -> ClassificationRules:
+    """Built in classification rules."""
+    return ClassificationRules()
+
+
+def test_rule_for_built_in_formats(rules):
+    """Test that RAW, image and video extensions map to their rule, ignoring case."""
+    assert rules.rule_for("IMG_0001.CR2") == ExtensionRule(  # noqa: S101
+        ListType.RAW_IMAGE_DICT, "cr2", "Canon"
+    )
+    assert rules.rule_for("a.heic").list_type == ListType.COMPRESSED_IMAGE_DICT  # noqa: S101
+    assert rules.rule_for("a.MOV").list_type == ListType.COMPRESSED_VIDEO_DICT  # noqa: S101
+    assert rules.rule_for("notes.txt") is None  # noqa: S101
+    assert rules.rule_for("README") is None  # noqa: S101
+
+
+def test_vendor_is_looked_up_by_exact_extension(rules):
+    """Test that every RAW extension has exactly the vendor it is listed under."""
+    for vendor, exts in ClassificationRules.RAW_IMAGE_EXT.items():
+        for ext in exts:
+            assert rules.rule(ext).vendor == vendor  # noqa: S101
+    assert rules.raw_extensions == {  # noqa: S101
+        ext for exts in ClassificationRules.RAW_IMAGE_EXT.values() for ext in exts
+    }
+
+
+def test_jpg_has_thumbnail_companion_rule(rules):
+    """Test that only jpg files become thumbnails next to a RAW file."""
+    assert rules.rule("jpg").companion == ExtensionRule(  # noqa: S101
+        ListType.THUMB_IMAGE_DICT, "thmb"
+    )
+    assert rules.rule("jpeg").companion is None  # noqa: S101
+
+
+@pytest.mark.parametrize(
+    "file_name, excluded",
+    [
+        (".DS_Store", True),
+        ("Thumbs.db", True),
+        ("Adobe Bridge Cache.bc", True),
+        ("IMG_0001.CR2", False),
+        ("my.Thumbs.db", False),
+    ],
+)
+def test_is_excluded(rules, file_name, excluded):
+    """Test that exclusion expressions match at the start of the file name."""
+    assert rules.is_excluded(file_name) is excluded  # noqa: S101
+
+
+def test_load_extends_and_replaces_built_in_rules(tmp_path):
+    """Test that a rules file adds formats and exclusions and overrides extensions."""
+    rules_file = tmp_path / "rules.toml"
+    rules_file.write_text(
+        'compressed_image = [".WebP"]\n'
+        'compressed_video = ["mkv", "dng"]\n'
+        "exclude = ['.*\\.tmp$']\n"
+        "[raw]\n"
+        'Hasselblad = ["3fr", "fff"]\n'
+    )
+
+    rules = ClassificationRules.load(str(rules_file))
+
+    assert rules.rule_for("a.webp") == ExtensionRule(  # noqa: S101
+        ListType.COMPRESSED_IMAGE_DICT, "webp"
+    )
+    assert rules.rule_for("a.mkv").list_type == ListType.COMPRESSED_VIDEO_DICT  # noqa: S101
+    assert rules.rule_for("a.dng").list_type == ListType.COMPRESSED_VIDEO_DICT  # noqa: S101
+    assert rules.rule_for("a.fff").vendor == "Hasselblad"  # noqa: S101
+    assert "dng" not in rules.raw_extensions  # noqa: S101
+    assert "3fr" in rules.raw_extensions  # noqa: S101
+    assert rules.is_excluded("upload.tmp")  # noqa: S101
+    assert rules.is_excluded(".hidden")  # noqa: S101
+
+
+def test_load_without_path_returns_built_in_rules():
+    """Test that no rules file means the built in rules."""
+    assert ClassificationRules.load().rule("cr3").vendor == "Canon"  # noqa: S101
+
+
+@pytest.mark.parametrize(
+    "content, message",
+    [
+        ("formats = []\n", "unknown keys: formats"),
+        ('compressed_video = "mkv"\n', "compressed_video must be a list of strings"),
+        ('raw = ["3fr"]\n', "raw must map vendors to lists of extensions"),
+        ("exclude = ['(']\n", "invalid exclude expression"),
+        ("exclude = [\n", "rules.toml"),
+    ],
+)
+def test_load_rejects_invalid_rules_file(tmp_path, content, message):
+    """Test that an invalid rules file raises ValueError naming the problem."""
+    rules_file = tmp_path / "rules.toml"
+    rules_file.write_text(content)
+
+    with pytest.raises(ValueError, match=message):
+        ClassificationRules.load(str(rules_file))
@@ -0,0 +1,58 @@
+"""Tests for the epr entry point."""
+
+import os
+import subprocess  # noqa: S404
+import sys
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+import abk_epr
+from abk_epr import cli
+
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(abk_epr.__file__)))
+HEAVY_MODULES = [
+    "asyncio",
+    "exiftool",
+    "pydngconverter",
+    "yaml",
+    "importlib.metadata",
+    "abk_epr.epr",
+    "abk_epr.dng_conversion",
+]
+
+
+def test_main_parses_options_once():
+    """Test that main hands the parsed options to epr instead of parsing again."""
+    with (
+        patch.object(cli.clo.CommandLineOptions, "handle_options") as handle_options,
+        patch("abk_epr.epr.epr", new_callable=AsyncMock) as epr,
+    ):
+        cli.main()
+
+    handle_options.assert_called_once_with()
+    (command_line_options,), _ = epr.call_args
+    assert isinstance(command_line_options, cli.clo.CommandLineOptions)  # noqa: S101
+
+
+@pytest.mark.parametrize("option", ["--version", "--about"])
+def test_info_options_do_not_import_stages(option):
+    """Test that --version and --about exit before the stages and their libraries load."""
+    loaded = f"' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules)"
+    script = (
+        "import atexit, sys\n"
+        f"atexit.register(lambda: print({loaded}))\n"
+        "from abk_epr.cli import main\n"
+        "main()\n"
+    )
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", script, option],
+        capture_output=True,
+        check=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": SRC_DIR},
+    )
+
+    assert "version" in result.stdout.lower()  # noqa: S101
+    assert result.stdout.splitlines()[-1] == ""  # noqa: S101
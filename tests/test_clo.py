@@ -82,3 +82,128 @@ def test_handle_options_parse_args(mock_configure, mock_get_logger, cmd_options)
     assert cmd_options.options.quiet is False  # noqa: S101
     mock_configure.assert_called_once_with(log_into_file=True, quiet=False)
     mock_get_logger.assert_called_once_with("abk_epr.clo")
+
+
+@patch("abk_epr.clo.LoggerManager.get_logger", return_value=MagicMock())
+@patch("abk_epr.clo.LoggerManager.configure")
+def test_handle_options_jobs(mock_configure, mock_get_logger, cmd_options):
+    """Test that the number of exiftool workers is parsed as integer."""
+    testargs = ["prog", "-j", "4"]
+    with patch.object(sys, "argv", testargs):
+        cmd_options.handle_options()
+
+    assert cmd_options.options.jobs == 4  # noqa: S101
+
+
+@patch("abk_epr.clo.LoggerManager.get_logger", return_value=MagicMock())
+@patch("abk_epr.clo.LoggerManager.configure")
+def test_handle_options_watch_command(mock_configure, mock_get_logger, cmd_options):
+    """Test that the watch command takes the directory and the settle time."""
+    testargs = ["prog", "-j", "2", "watch", "20240101_trip", "--settle", "0.5"]
+    with patch.object(sys, "argv", testargs):
+        cmd_options.handle_options()
+
+    assert cmd_options.options.command == "watch"  # noqa: S101
+    assert cmd_options.options.dir == "20240101_trip"  # noqa: S101
+    assert cmd_options.options.settle == 0.5  # noqa: S101
+    assert cmd_options.options.jobs == 2  # noqa: S101
+
+
+@pytest.mark.parametrize(
+    ("args", "expected_dir"),
+    [
+        (["-d", "20240101_trip", "plan"], "20240101_trip"),
+        (["plan", "20240101_trip"], "20240101_trip"),
+        (["-d", "20240101_trip", "plan", "20240101_trip"], "20240101_trip"),
+        (["plan"], "."),
+        (["-d", "20240101_trip", "watch"], "20240101_trip"),
+        (["apply", "plan.json"], None),
+        (["-d", "20240101_trip", "apply", "plan.json"], "20240101_trip"),
+    ],
+)
+@patch("abk_epr.clo.LoggerManager.get_logger", return_value=MagicMock())
+@patch("abk_epr.clo.LoggerManager.configure")
+def test_handle_options_command_keeps_directory_option(
+    mock_configure, mock_get_logger, cmd_options, args, expected_dir
+):
+    """Test that -d before a command is not replaced by the default of the command."""
+    with patch.object(sys, "argv", ["prog", *args]):
+        cmd_options.handle_options()
+
+    assert cmd_options.options.dir == expected_dir  # noqa: S101
+
+
+@patch("abk_epr.clo.LoggerManager.get_logger", return_value=MagicMock())
+@patch("abk_epr.clo.LoggerManager.configure")
+def test_handle_options_rejects_two_directories(mock_configure, mock_get_logger, cmd_options):
+    """Test that -d and a different command directory are an error."""
+    args = ["prog", "-d", "20240101_trip", "plan", "20240202_party"]
+    with patch.object(sys, "argv", args), pytest.raises(SystemExit):
+        cmd_options.handle_options()
+
+
+@patch("abk_epr.clo.LoggerManager.get_logger", return_value=MagicMock())
+@patch("abk_epr.clo.LoggerManager.configure")
+def test_handle_options_metrics_out(mock_configure, mock_get_logger, cmd_options):
+    """Test that the metrics file is optional and its format is chosen by suffix by default."""
+    testargs = ["prog", "--metrics-out", "/var/lib/node_exporter/epr.prom"]
+    with patch.object(sys, "argv", testargs):
+        cmd_options.handle_options()
+
+    assert cmd_options.options.metrics_out == "/var/lib/node_exporter/epr.prom"  # noqa: S101
+    assert cmd_options.options.metrics_format is None  # noqa: S101
+
+
+@patch("abk_epr.clo.LoggerManager.get_logger", return_value=MagicMock())
+@patch("abk_epr.clo.LoggerManager.configure")
+def test_handle_options_trace(mock_configure, mock_get_logger, cmd_options):
+    """Test that tracing is off by default and the block threshold is given in ms."""
+    testargs = ["prog", "--trace", "epr_trace.json", "--trace-block-ms", "250"]
+    with patch.object(sys, "argv", testargs):
+        cmd_options.handle_options()
+
+    assert cmd_options.options.trace == "epr_trace.json"  # noqa: S101
+    assert cmd_options.options.trace_block_ms == 250.0  # noqa: S101
+
+
+@patch("abk_epr.clo.LoggerManager.get_logger", return_value=MagicMock())
+@patch("abk_epr.clo.LoggerManager.configure")
+def test_handle_options_rules(mock_configure, mock_get_logger, cmd_options):
+    """Test that the built in rules are used unless a rules file is given."""
+    with patch.object(sys, "argv", ["prog"]):
+        cmd_options.handle_options()
+    assert cmd_options.options.rules is None  # noqa: S101
+
+    with patch.object(sys, "argv", ["prog", "--rules", "epr_rules.toml"]):
+        cmd_options.handle_options()
+    assert cmd_options.options.rules == "epr_rules.toml"  # noqa: S101
+
+
+@patch("abk_epr.clo.LoggerManager.get_logger", return_value=MagicMock())
+@patch("abk_epr.clo.LoggerManager.configure")
+def test_handle_options_recursive(mock_configure, mock_get_logger, cmd_options):
+    """Test that sub directories are only scanned with --recursive, up to --max-depth."""
+    with patch.object(sys, "argv", ["prog"]):
+        cmd_options.handle_options()
+    assert cmd_options.options.recursive is False  # noqa: S101
+    assert cmd_options.options.max_depth is None  # noqa: S101
+
+    with patch.object(sys, "argv", ["prog", "-r", "--max-depth", "3"]):
+        cmd_options.handle_options()
+    assert cmd_options.options.recursive is True  # noqa: S101
+    assert cmd_options.options.max_depth == 3  # noqa: S101
+
+
+@patch("abk_epr.clo.LoggerManager.get_logger", return_value=MagicMock())
+@patch("abk_epr.clo.LoggerManager.configure")
+def test_handle_options_dedup(mock_configure, mock_get_logger, cmd_options):
+    """Test that duplicate detection is off by default and takes an action and an index."""
+    with patch.object(sys, "argv", ["prog"]):
+        cmd_options.handle_options()
+    assert cmd_options.options.dedup is None  # noqa: S101
+
+    testargs = ["prog", "--dedup", "link", "--dedup-index", "/srv/epr/imports.sqlite3"]
+    with patch.object(sys, "argv", testargs):
+        cmd_options.handle_options()
+    assert cmd_options.options.dedup == "link"  # noqa: S101
+    assert cmd_options.options.dedup_index == "/srv/epr/imports.sqlite3"  # noqa: S101
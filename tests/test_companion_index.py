@@ -0,0 +1,62 @@
+"""Tests for the RAW/JPEG companion index."""
+
+import timeit
+
+from abk_epr.companion_index import CompanionIndex
+
+
+RAW_EXTS = ["cr2", "cr3", "nef", "arw", "dng"]
+
+
+def test_grouping_by_lowercase_stem():
+    """Test that RAW, JPEG, sidecar and other files are grouped by lowercase stem."""
+    index = CompanionIndex(
+        ["IMG_0001.CR2", "img_0001.JPG", "IMG_0001.CR2.xmp", "IMG_0002.jpg", "IMG_0003.xmp"],
+        RAW_EXTS,
+    )
+
+    group = index.group("img_0001.jpg")
+    assert group.raw == ["IMG_0001.CR2"]  # noqa: S101
+    assert group.jpeg == ["img_0001.JPG"]  # noqa: S101
+    assert group.sidecar == ["IMG_0001.CR2.xmp"]  # noqa: S101
+    assert index.has_raw("img_0001.JPG")  # noqa: S101
+    assert not index.has_raw("IMG_0002.jpg")  # noqa: S101
+    assert index.raw_of("IMG_0001.CR2.xmp") == "IMG_0001.CR2"  # noqa: S101
+    assert index.raw_of("IMG_0003.xmp") is None  # noqa: S101
+    assert index.group("IMG_9999.jpg") is None  # noqa: S101
+
+
+def _build_and_classify(file_count: int) -> float:
+    """Best time to index file_count RAW+JPEG pairs and look up every JPEG."""
+    files = [f"IMG_{i:06}.{ext}" for i in range(file_count // 2) for ext in ("CR2", "JPG")]
+
+    def run():
+        index = CompanionIndex(files, RAW_EXTS)
+        for file_name in files:
+            index.has_raw(file_name)
+
+    return min(timeit.repeat(run, number=1, repeat=3))
+
+
+def test_scales_linearly_up_to_100k_files():
+    """Test that 10x more files cost roughly 10x more time, not 100x."""
+    small = _build_and_classify(10_000)
+    large = _build_and_classify(100_000)
+
+    assert large / small < 25  # noqa: S101
+
+
+def test_grouping_keeps_the_directory():
+    """Test that files of the same name in different card directories are not companions."""
+    index = CompanionIndex(
+        [
+            "DCIM/100CANON/IMG_0001.CR2",
+            "DCIM/100CANON/IMG_0001.JPG",
+            "DCIM/101CANON/IMG_0001.JPG",
+        ],
+        RAW_EXTS,
+    )
+
+    assert index.has_raw("DCIM/100CANON/IMG_0001.JPG")  # noqa: S101
+    assert not index.has_raw("DCIM/101CANON/IMG_0001.JPG")  # noqa: S101
+    assert len(index) == 2  # noqa: S101
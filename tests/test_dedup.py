@@ -0,0 +1,269 @@
+"""Tests for content hash duplicate detection."""
+
+import os
+import sqlite3
+
+import pytest
+
+from abk_epr import dedup
+from abk_epr.dedup import (
+    PARTIAL_HASH_BYTES,
+    DedupStage,
+    Duplicate,
+    FileDigest,
+    ImportIndex,
+    full_hash,
+    partial_hash,
+)
+from abk_epr.metrics import MetricsRegistry
+
+
+# same size, first and last 64 KiB, different in the middle
+HEAD, TAIL = b"h" * PARTIAL_HASH_BYTES, b"t" * PARTIAL_HASH_BYTES
+CONTENT_A = HEAD + b"a" * 1000 + TAIL
+CONTENT_B = HEAD + b"b" * 1000 + TAIL
+
+
+@pytest.fixture
+def index(tmp_path):
+    """Import index in a temporary directory."""
+    with ImportIndex(db_path=tmp_path / "index" / "imports.sqlite3") as index:
+        yield index
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    """Directory to write test files in, as current directory."""
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    monkeypatch.chdir(work_dir)
+    return work_dir
+
+
+def _write(path, content: bytes) -> str:
+    """Writes content to path and returns it as str."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as media_file:
+        media_file.write(content)
+    return str(path)
+
+
+def _import(stage: DedupStage, *paths: str, full: bool = False) -> None:
+    """Records paths as imported."""
+    for path in paths:
+        stage.record(path, path, full=full)
+    stage.finish()
+
+
+def test_partial_hash_covers_size_head_and_tail(files):
+    """Test that the partial hash ignores the middle and the full hash does not."""
+    a, b = _write("a", CONTENT_A), _write("b", CONTENT_B)
+    c = _write("c", CONTENT_A[:-1] + b"x")
+    small = _write("small", b"abc")
+
+    assert partial_hash(a, len(CONTENT_A)) == partial_hash(b, len(CONTENT_B))  # noqa: S101
+    assert partial_hash(a, len(CONTENT_A)) != partial_hash(c, len(CONTENT_A))  # noqa: S101
+    assert full_hash(a) != full_hash(b)  # noqa: S101
+    assert full_hash(small) == full_hash(_write("small_copy", b"abc"))  # noqa: S101
+    assert full_hash(_write("empty", b"")) != full_hash(small)  # noqa: S101
+
+
+def test_index_finds_imports_oldest_first_and_persists(tmp_path):
+    """Test that imports are found by size and partial hash after reopening the index."""
+    db_path = tmp_path / "imports.sqlite3"
+    with ImportIndex(db_path=db_path) as index:
+        index.add_many(
+            [
+                (FileDigest(10, "p", "f1"), "/photos/a.cr2"),
+                (FileDigest(10, "p"), "/photos/copy.cr2"),
+                (FileDigest(20, "q"), "/photos/b.cr2"),
+            ]
+        )
+        index.set_full_hashes([("/photos/copy.cr2", "f1")])
+    with ImportIndex(db_path=db_path) as index:
+        assert index.known_sizes([10, 30]) == {10}  # noqa: S101
+        assert index.find(10, "p") == [  # noqa: S101
+            ("/photos/a.cr2", "f1"),
+            ("/photos/copy.cr2", "f1"),
+        ]
+        index.forget(["/photos/a.cr2", "/photos/copy.cr2"])
+        assert index.find(10, "p") == []  # noqa: S101
+        assert index.known_sizes(range(1000)) == {20}  # noqa: S101
+
+
+def test_index_of_older_schema_is_rebuilt(tmp_path):
+    """Test that an index of another schema version is dropped."""
+    db_path = tmp_path / "imports.sqlite3"
+    connection = sqlite3.connect(db_path)
+    connection.executescript("CREATE TABLE imports (x); PRAGMA user_version=0;")
+    connection.close()
+
+    with ImportIndex(db_path=db_path) as index:
+        assert index.known_sizes([1]) == set()  # noqa: S101
+
+
+def test_given_index_uses_rollback_journal(tmp_path, monkeypatch):
+    """Test that a given index path avoids WAL, which is unsafe on network file systems."""
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    with ImportIndex(db_path=tmp_path / "shared.sqlite3") as shared, ImportIndex() as local:
+        for index, journal_mode in [(shared, "delete"), (local, "wal")]:
+            connection = index._ensure_open()
+            assert connection.execute("PRAGMA journal_mode").fetchone() == (journal_mode,)  # noqa: S101
+
+
+def test_find_duplicates_of_imported_files_and_within_the_run(files, index):
+    """Test that full hashes decide, with the first file of the run as original."""
+    stage = DedupStage(index=index)
+    imported = _write("imported/a.cr2", CONTENT_A)
+    _import(stage, imported)
+    card = [
+        _write("DCIM/1.cr2", CONTENT_A),
+        _write("DCIM/2.cr2", CONTENT_B),
+        _write("DCIM/3.cr2", CONTENT_B),
+        _write("DCIM/4.jpg", b"unique"),
+    ]
+
+    assert stage.find_duplicates(card) == [  # noqa: S101
+        Duplicate("DCIM/1.cr2", os.path.abspath(imported)),
+        Duplicate("DCIM/3.cr2", "DCIM/2.cr2"),
+    ]
+    stage.close()
+
+
+def test_imports_are_hashed_in_full_only_on_collision(files, index):
+    """Test that the full hash of an import is computed and stored once a file matches."""
+    stage = DedupStage(index=index)
+    imported = os.path.abspath(_write("imported.cr2", CONTENT_A))
+    _import(stage, imported, _write("other.cr2", b"other"))
+    assert index.find(len(CONTENT_A), partial_hash(imported, len(CONTENT_A))) == [  # noqa: S101
+        (imported, None)
+    ]
+    assert stage.hashed_bytes == 0  # noqa: S101
+
+    assert stage.find_duplicates([_write("1.cr2", CONTENT_B)]) == []  # noqa: S101
+
+    assert stage.hashed_bytes == 2 * len(CONTENT_A) + 2 * PARTIAL_HASH_BYTES  # noqa: S101
+    assert index.find(len(CONTENT_A), partial_hash(imported, len(CONTENT_A))) == [  # noqa: S101
+        (imported, full_hash(imported))
+    ]
+    stage.close()
+
+
+def test_gone_import_is_compared_only_with_full_hash(files, index):
+    """Test that a deleted import matches only if it was hashed in full before."""
+    stage = DedupStage(index=index)
+    _import(stage, _write("gone.cr2", CONTENT_A))
+    _import(stage, _write("converted.cr2", CONTENT_B), full=True)
+    os.remove("gone.cr2")
+    os.remove("converted.cr2")
+
+    assert stage.find_duplicates(  # noqa: S101
+        [_write("1.cr2", CONTENT_A), _write("2.cr2", CONTENT_B)]
+    ) == [Duplicate("2.cr2", os.path.abspath("converted.cr2"))]
+    stage.close()
+
+
+def test_files_of_unique_size_are_not_hashed(files, index, monkeypatch):
+    """Test that only sizes found in the index or the run are read at all."""
+    stage = DedupStage(index=index)
+    _import(stage, _write("imported.cr2", CONTENT_A))
+    hashed = []
+    monkeypatch.setattr(dedup, "partial_hash", lambda f, size: hashed.append(f) or str(size))
+    monkeypatch.setattr(dedup, "full_hash", lambda f: hashed.append(f) or f)
+
+    stage.find_duplicates([_write("new.cr2", b"x" * 100), _write("other.cr2", b"y" * 200)])
+
+    assert hashed == []  # noqa: S101
+    assert stage.hashed_bytes == 0  # noqa: S101
+    stage.close()
+
+
+def test_filter_skips_duplicates(files, index):
+    """Test that skipped duplicates are left in place and counted."""
+    metrics = MetricsRegistry()
+    stage = DedupStage(index=index, metrics=metrics)
+    _import(stage, _write("imported.cr2", CONTENT_A))
+    card = [_write("1.cr2", CONTENT_A), _write("2.cr2", CONTENT_B)]
+
+    assert stage.filter(card) == ["2.cr2"]  # noqa: S101
+    assert os.path.isfile("1.cr2")  # noqa: S101
+    assert stage.duplicate_count == 1  # noqa: S101
+    assert metrics.value("epr_duplicates_total", action="skip") == 1  # noqa: S101
+    assert metrics.value("epr_stage_files_total", stage="dedup") == 2  # noqa: S101
+    stage.close()
+
+
+def test_filter_passes_unreadable_files_through(files, index, monkeypatch):
+    """Test that a file failing to hash is imported as not a duplicate."""
+    stage = DedupStage(index=index)
+    _import(stage, _write("imported.cr2", CONTENT_A))
+    card = [_write("1.cr2", CONTENT_A), _write("2.cr2", CONTENT_A), _write("3.cr2", CONTENT_A)]
+    partial, full = dedup.partial_hash, dedup.full_hash
+
+    def _unreadable(hash_function, bad_file):
+        def _hash(file_name, *args):
+            if file_name == bad_file:
+                raise PermissionError(f"{file_name} not readable")
+            return hash_function(file_name, *args)
+
+        return _hash
+
+    monkeypatch.setattr(dedup, "partial_hash", _unreadable(partial, "1.cr2"))
+    monkeypatch.setattr(dedup, "full_hash", _unreadable(full, "2.cr2"))
+
+    assert stage.filter(card) == ["1.cr2", "2.cr2"]  # noqa: S101
+    assert stage.duplicate_count == 1  # noqa: S101
+    stage.close()
+
+
+def test_filter_reports_duplicates(files, index):
+    """Test that reported duplicates are imported anyway."""
+    stage = DedupStage(index=index, action=DedupStage.REPORT)
+    _import(stage, _write("imported.cr2", CONTENT_A))
+    card = [_write("1.cr2", CONTENT_A)]
+
+    assert stage.filter(card) == card  # noqa: S101
+    assert stage.duplicate_count == 1  # noqa: S101
+    stage.close()
+
+
+def test_filter_links_duplicates(files, index):
+    """Test that a duplicate becomes a hard link, unless dry run or the original is gone."""
+    stage = DedupStage(index=index, action=DedupStage.LINK)
+    imported = _write("imported.cr2", CONTENT_A)
+    _import(stage, imported, _write("gone.cr2", CONTENT_B), full=True)
+    os.remove("gone.cr2")
+    card = [_write("1.cr2", CONTENT_A), _write("2.cr2", CONTENT_B)]
+
+    assert stage.filter(card, dry_run=True) == []  # noqa: S101
+    assert not os.path.samefile("1.cr2", imported)  # noqa: S101
+    assert stage.filter(card) == []  # noqa: S101
+    assert os.path.samefile("1.cr2", imported)  # noqa: S101
+    assert (files / "2.cr2").read_bytes() == CONTENT_B  # noqa: S101
+    assert sorted(os.listdir(".")) == ["1.cr2", "2.cr2", "imported.cr2"]  # noqa: S101
+    stage.close()
+
+
+def test_record_reuses_hashes_of_filter(files, index, monkeypatch):
+    """Test that recording a file hashed by filter does not hash it again."""
+    stage = DedupStage(index=index)
+    _import(stage, _write("imported.cr2", CONTENT_A))
+    card = [_write("1.cr2", CONTENT_B), _write("2.cr2", CONTENT_B)]
+    expected_hash = full_hash("1.cr2")
+    stage.filter(card)
+    monkeypatch.setattr(dedup, "full_hash", lambda f: pytest.fail(f"{f} hashed again"))
+    os.rename("1.cr2", "renamed.cr2")
+
+    stage.record("1.cr2", "renamed.cr2")
+
+    assert stage.finish() == 1  # noqa: S101
+    imports = index.find(len(CONTENT_B), partial_hash("renamed.cr2", len(CONTENT_B)))
+    # CONTENT_A and CONTENT_B share size and partial hash
+    assert (os.path.abspath("renamed.cr2"), expected_hash) in imports  # noqa: S101
+    stage.close()
+
+
+def test_unknown_action_is_rejected():
+    """Test that an unknown action raises ValueError."""
+    with pytest.raises(ValueError, match="action must be one of"):
+        DedupStage(action="delete")
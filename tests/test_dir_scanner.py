@@ -0,0 +1,96 @@
+"""Tests for dir_scanner.py."""
+
+# Standard library
+import os
+
+# Third-party
+import pytest
+
+# Local
+from abk_epr.dir_scanner import DirectoryScanner
+
+
+@pytest.fixture
+def card_tree(tmp_path):
+    """Card copy with nested camera folders, a hidden folder and a link back to the root."""
+    for file_name in [
+        "DCIM/100CANON/IMG_0001.CR2",
+        "DCIM/100CANON/IMG_0001.JPG",
+        "DCIM/101CANON/IMG_0002.CR2",
+        "MISC/.hidden/keep.txt",
+        "top.jpg",
+        "canon_eosr5_cr2/old.cr2",
+    ]:
+        (tmp_path / file_name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / file_name).write_bytes(b"data")
+    os.symlink(tmp_path, tmp_path / "DCIM" / "loop")
+    return tmp_path
+
+
+def test_top_level_only_by_default(card_tree):
+    """Test that only the files of the directory itself are listed by default."""
+    scanner = DirectoryScanner()
+
+    assert not scanner.recursive  # noqa: S101
+    assert scanner.files(str(card_tree)) == ["top.jpg"]  # noqa: S101
+
+
+def test_recursive_scan_yields_relative_paths_and_entries(card_tree):
+    """Test that the scan descends without limit, skipping the pruned directories and links."""
+    scanner = DirectoryScanner(
+        max_depth=None,
+        exclude=lambda name: name.startswith("."),
+        prune=lambda name: name == "canon_eosr5_cr2",
+    )
+
+    scanned = dict(scanner.scan(str(card_tree)))
+
+    assert sorted(scanned) == [  # noqa: S101
+        os.path.join("DCIM", "100CANON", "IMG_0001.CR2"),
+        os.path.join("DCIM", "100CANON", "IMG_0001.JPG"),
+        os.path.join("DCIM", "101CANON", "IMG_0002.CR2"),
+        "top.jpg",
+    ]
+    entry = scanned[os.path.join("DCIM", "101CANON", "IMG_0002.CR2")]
+    assert entry.name == "IMG_0002.CR2"  # noqa: S101
+    assert entry.stat().st_size == 4  # noqa: S101
+
+
+@pytest.mark.parametrize("max_depth, count", [(0, 1), (1, 2), (2, 6)])
+def test_max_depth_limits_the_levels(card_tree, max_depth, count):
+    """Test that max_depth is the number of directory levels below the root."""
+    assert len(DirectoryScanner(max_depth=max_depth).files(str(card_tree))) == count  # noqa: S101
+
+
+def test_scan_is_lazy(card_tree, monkeypatch):
+    """Test that the first file is yielded before sub directories are opened."""
+    opened = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: opened.append(path) or scandir(path))
+
+    next(DirectoryScanner(max_depth=None).scan(str(card_tree)))
+
+    assert opened == [str(card_tree)]  # noqa: S101
+
+
+def test_unreadable_sub_directory_is_skipped(card_tree, monkeypatch):
+    """Test that a sub directory failing to open is logged and skipped, the root raises."""
+    scandir = os.scandir
+
+    def failing_scandir(path):
+        if os.path.basename(path) == "MISC":
+            raise PermissionError(13, "Permission denied", path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", failing_scandir)
+    scanner = DirectoryScanner(max_depth=None)
+
+    assert "top.jpg" in scanner.files(str(card_tree))  # noqa: S101
+    with pytest.raises(FileNotFoundError):
+        scanner.files(str(card_tree / "missing"))
+
+
+def test_negative_max_depth_is_rejected():
+    """Test that a negative depth raises ValueError."""
+    with pytest.raises(ValueError, match="must not be negative"):
+        DirectoryScanner(max_depth=-1)
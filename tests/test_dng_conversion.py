@@ -0,0 +1,93 @@
+"""Tests for the per file DNG conversion stage."""
+
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+from abk_epr.dng_conversion import DngConversionStage
+from tests.helpers import fake_convert
+
+
+@pytest.mark.asyncio
+async def test_files_are_converted_as_they_arrive(tmp_path, monkeypatch):
+    """Test that queued files are converted one by one and reported individually."""
+    monkeypatch.chdir(tmp_path)
+    stage = DngConversionStage(workers=2)
+    monkeypatch.setattr(stage, "_convert_file", fake_convert)
+
+    await stage.put("nikon_z9_nef/a.nef", "nikon_z9_dng")
+    await asyncio.sleep(0.01)
+    converted_before_join = len(stage.results)
+    await stage.put("nikon_z9_nef/broken.nef", "nikon_z9_dng")
+    results = await stage.join()
+
+    assert converted_before_join == 1  # noqa: S101
+    assert [(r.source, r.ok) for r in results] == [  # noqa: S101
+        ("nikon_z9_nef/a.nef", True),
+        ("nikon_z9_nef/broken.nef", False),
+    ]
+    assert os.listdir("nikon_z9_dng") == ["a.dng"]  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_paths_are_relative_to_the_directory_they_were_queued_from(tmp_path, monkeypatch):
+    """Test that changing directory while files wait does not change what is converted."""
+    for project in ["first", "second"]:
+        (tmp_path / project).mkdir()
+    monkeypatch.chdir(tmp_path / "first")
+    stage = DngConversionStage(workers=1)
+    monkeypatch.setattr(stage, "_convert_file", fake_convert)
+
+    await stage.put("nikon_z9_nef/a.nef", "nikon_z9_dng")
+    monkeypatch.chdir(tmp_path / "second")
+    results = await stage.join()
+
+    assert [(r.source, r.destination, r.directory) for r in results] == [  # noqa: S101
+        ("nikon_z9_nef/a.nef", "nikon_z9_dng/a.dng", str(tmp_path / "first"))
+    ]
+    assert os.listdir(tmp_path / "first" / "nikon_z9_dng") == ["a.dng"]  # noqa: S101
+    assert os.listdir(tmp_path / "second") == []  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_largest_file_first_and_bytes_in_flight_cap(tmp_path, monkeypatch):
+    """Test that waiting files are converted largest first and within the bytes budget."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("canon_r5_cr3")
+    os.makedirs("nikon_z9_nef")
+    sizes = {
+        "canon_r5_cr3/small.cr3": 10,
+        "nikon_z9_nef/big.nef": 300,
+        "canon_r5_cr3/mid.cr3": 200,
+    }
+    for raw_file, size in sizes.items():
+        Path(raw_file).write_bytes(b"x" * size)
+
+    order = []
+    in_flight = 0
+    peak_in_flight = 0
+
+    async def tracking_convert(raw_file, dng_dir):
+        nonlocal in_flight, peak_in_flight
+        raw_file = os.path.relpath(raw_file)
+        order.append(raw_file)
+        in_flight += sizes[raw_file]
+        peak_in_flight = max(peak_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= sizes[raw_file]
+        return await fake_convert(raw_file, dng_dir)
+
+    async def run_stage(workers: int) -> None:
+        stage = DngConversionStage(workers=workers, max_bytes_in_flight=400)
+        monkeypatch.setattr(stage, "_convert_file", tracking_convert)
+        for raw_file in sizes:
+            dng_dir = raw_file.split("/")[0].rsplit("_", 1)[0] + "_dng"
+            await stage.put(raw_file, dng_dir)
+        await stage.join()
+
+    await run_stage(workers=1)
+    assert order == ["nikon_z9_nef/big.nef", "canon_r5_cr3/mid.cr3", "canon_r5_cr3/small.cr3"]  # noqa: S101
+    await run_stage(workers=3)
+    assert peak_in_flight <= 400  # noqa: S101
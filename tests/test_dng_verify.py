@@ -0,0 +1,42 @@
+"""Tests for the DNG integrity checks."""
+
+import struct
+
+import pytest
+
+from abk_epr.dng_verify import DngVerifier
+from tests.helpers import minimal_dng_bytes
+
+
+@pytest.mark.parametrize(
+    "content, ok",
+    [
+        (minimal_dng_bytes(), True),
+        (minimal_dng_bytes()[:1500], False),
+        (minimal_dng_bytes(with_dng_version=False), False),
+        (b"\x00" * 2048, False),
+        (b"", False),
+    ],
+    ids=["valid", "truncated", "no_dng_version", "no_tiff_header", "empty"],
+)
+def test_verify(tmp_path, content, ok):
+    """Test that valid DNGs pass and truncated, empty or non DNG files fail."""
+    dng_file = tmp_path / "image.dng"
+    dng_file.write_bytes(content)
+
+    result = DngVerifier().verify(str(dng_file))
+
+    assert result.ok is ok  # noqa: S101
+    assert bool(result.reason) is not ok  # noqa: S101
+
+
+def test_truncated_ifd_offset(tmp_path):
+    """Test that an IFD offset pointing past the end of the file is rejected."""
+    content = bytearray(minimal_dng_bytes())
+    content[4:8] = struct.pack("<I", 4096)
+    dng_file = tmp_path / "image.dng"
+    dng_file.write_bytes(bytes(content))
+
+    results = DngVerifier(workers=2).verify_many([str(dng_file), str(tmp_path / "missing.dng")])
+
+    assert [r.ok for r in results.values()] == [False, False]  # noqa: S101
@@ -0,0 +1,465 @@
+"""Tests for epr.py."""
+
+# Standard library
+import logging
+import os
+from unittest.mock import MagicMock
+
+# Third-party
+import pytest
+
+# Local
+from abk_epr.classification import ClassificationRules
+from abk_epr.companion_index import CompanionIndex
+from abk_epr.dedup import DedupStage, ImportIndex
+from abk_epr.dng_conversion import DngConversionStage
+from abk_epr.epr import ExifRename
+from abk_epr.journal import JournalOp, OperationJournal
+from abk_epr.metadata_record import MetadataRecord
+from abk_epr.metrics import MetricsRegistry
+from tests.helpers import PROJECT_DIR, fake_convert, fake_exiftool, file_tree
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stream_window", [0, 2])
+async def test_move_rename_convert_images(image_dir, stream_window):
+    """Test that batch and stream mode rename files into make_model_ext directories."""
+    mut = ExifRename(
+        logger=logging.getLogger(__name__),
+        op_dir=".",
+        exiftool_session=fake_exiftool(),
+        stream_window=stream_window,
+    )
+    await mut.move_rename_convert_images()
+
+    assert file_tree(image_dir) == [  # noqa: S101
+        ".hidden",
+        "canon_eosr5_jpg/20240101_100000_canon_eosr5_unittest_trip.jpg",
+        "canon_eosr5_jpg/20240101_100001_canon_eosr5_unittest_trip.jpg",
+        "canon_eosr5_mov/20240101_100003_canon_eosr5_unittest_trip.mov",
+        "canon_eosr5_png/20240101_100002_canon_eosr5_unittest_trip.png",
+        "notes.txt",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_mode_reads_metadata_in_windows(image_dir):
+    """Test that stream mode never asks exiftool for more than one window of files."""
+    session = fake_exiftool()
+    mut = ExifRename(
+        logger=logging.getLogger(__name__), op_dir=".", exiftool_session=session, stream_window=2
+    )
+    await mut.move_rename_convert_images()
+
+    assert [len(c.kwargs["files"]) for c in session.get_tags.call_args_list] == [2, 2, 1]  # noqa: S101
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stream_window", [0, 2])
+async def test_raw_files_are_converted_and_deleted(image_dir, stream_window, monkeypatch):
+    """Test that renamed raw files go through the conversion stage and are deleted after."""
+    for file_name in ["e.cr2", "f.cr2"]:
+        (image_dir / file_name).write_bytes(b"raw")
+    stage = DngConversionStage(workers=2)
+    monkeypatch.setattr(stage, "_convert_file", fake_convert)
+    mut = ExifRename(
+        logger=logging.getLogger(__name__),
+        op_dir=".",
+        exiftool_session=fake_exiftool(),
+        stream_window=stream_window,
+        conversion_stage=stage,
+    )
+    await mut.move_rename_convert_images()
+
+    assert stage.submitted == 2  # noqa: S101
+    assert not os.path.exists("canon_eosr5_cr2")  # noqa: S101
+    assert sorted(os.listdir("canon_eosr5_dng")) == [  # noqa: S101
+        "20240101_100005_canon_eosr5_unittest_trip.dng",
+        "20240101_100006_canon_eosr5_unittest_trip.dng",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_undo_restores_original_names(image_dir):
+    """Test that undo moves journaled renames back and removes the created directories."""
+    before = file_tree(image_dir)
+    journal_path = str(image_dir / OperationJournal.FILE_NAME)
+    mut = ExifRename(
+        logger=logging.getLogger(__name__),
+        op_dir=".",
+        exiftool_session=fake_exiftool(),
+        journal=OperationJournal(path=journal_path),
+    )
+    await mut.move_rename_convert_images()
+    await mut.undo()
+
+    assert file_tree(image_dir) == sorted([*before, f"{OperationJournal.FILE_NAME}.undone"])  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_undo_reverts_only_the_last_run(image_dir):
+    """Test that a second run reusing a source name is undone without the first run."""
+
+    def make_exif_rename() -> ExifRename:
+        return ExifRename(
+            logger=logging.getLogger(__name__),
+            op_dir=".",
+            exiftool_session=fake_exiftool(),
+            journal=OperationJournal(path=str(image_dir / OperationJournal.FILE_NAME)),
+        )
+
+    await make_exif_rename().move_rename_convert_images()
+    first_run = file_tree(image_dir)
+    # the camera counter starts over on the next card
+    (image_dir / "a.jpg").write_bytes(b"next card")
+    await make_exif_rename().move_rename_convert_images()
+    await make_exif_rename().undo()
+
+    assert file_tree(image_dir) == sorted(  # noqa: S101
+        [
+            *(f for f in first_run if f != f"{OperationJournal.FILE_NAME}.done"),
+            "a.jpg",
+            f"{OperationJournal.FILE_NAME}.undone",
+        ]
+    )
+    assert (image_dir / "a.jpg").read_bytes() == b"next card"  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_resume_converts_raw_files_renamed_by_interrupted_run(image_dir, monkeypatch):
+    """Test that resume converts raw files an interrupted run renamed but did not convert."""
+    for file_name in ["a.jpg", "b.jpg", "c.png", "d.mov"]:
+        os.remove(file_name)
+    os.makedirs("canon_eosr5_cr2")
+    (image_dir / "canon_eosr5_cr2" / "x.cr2").write_bytes(b"raw")
+    journal_path = str(image_dir / OperationJournal.FILE_NAME)
+    with OperationJournal(path=journal_path) as journal:
+        journal.done(JournalOp.RENAME, "e.cr2", "./canon_eosr5_cr2/x.cr2")
+    stage = DngConversionStage(workers=1)
+    monkeypatch.setattr(stage, "_convert_file", fake_convert)
+    session = fake_exiftool()
+    mut = ExifRename(
+        logger=logging.getLogger(__name__),
+        op_dir=".",
+        exiftool_session=session,
+        conversion_stage=stage,
+        journal=OperationJournal(path=journal_path),
+        resume=True,
+    )
+    await mut.move_rename_convert_images()
+
+    assert os.path.exists("notes.txt")  # noqa: S101
+    assert os.listdir("canon_eosr5_dng") == ["x.dng"]  # noqa: S101
+    assert not os.path.exists("canon_eosr5_cr2")  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_raw_file_is_kept_when_dng_fails_verification(image_dir, monkeypatch):
+    """Test that only raw files with a verified DNG are deleted."""
+    for file_name in ["e.cr2", "f.cr2"]:
+        (image_dir / file_name).write_bytes(b"raw")
+
+    async def convert_with_truncated_dng(raw_file, dng_dir):
+        dng_file = await fake_convert(raw_file, dng_dir)
+        if raw_file.endswith("100006_canon_eosr5_unittest_trip.cr2"):
+            with open(dng_file, "r+b") as dng:
+                dng.truncate(100)
+        return dng_file
+
+    stage = DngConversionStage(workers=1)
+    monkeypatch.setattr(stage, "_convert_file", convert_with_truncated_dng)
+    mut = ExifRename(
+        logger=logging.getLogger(__name__),
+        op_dir=".",
+        exiftool_session=fake_exiftool(),
+        conversion_stage=stage,
+    )
+    await mut.move_rename_convert_images()
+
+    assert os.listdir("canon_eosr5_cr2") == ["20240101_100006_canon_eosr5_unittest_trip.cr2"]  # noqa: S101
+    assert sorted(r.ok for r in mut.verify_results) == [False, True]  # noqa: S101
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stream_window", [0, 2])
+async def test_burst_of_one_second_keeps_every_frame(image_dir, stream_window):
+    """Test that frames of the same second get sub second or sequence names."""
+    for file_name in ["a.jpg", "b.jpg", "c.png", "d.mov", "notes.txt"]:
+        os.remove(file_name)
+    os.makedirs("canon_eosr5_jpg")
+    (image_dir / "canon_eosr5_jpg" / "20240101_100000_canon_eosr5_unittest_trip.jpg").write_bytes(
+        b"earlier run"
+    )
+    sub_secs = {"burst_1.jpg": 25, "burst_2.jpg": 75}
+    for file_name in ["burst_1.jpg", "burst_2.jpg", "burst_3.jpg", "burst_4.jpg"]:
+        (image_dir / file_name).write_bytes(b"frame")
+    session = MagicMock()
+    session.get_tags.side_effect = lambda files, tags: [
+        {
+            "SourceFile": f,
+            "EXIF:CreateDate": "2024:01:01 10:00:00",
+            "EXIF:Make": "Canon",
+            "EXIF:Model": "Canon EOS R5",
+            **({"EXIF:SubSecTimeOriginal": sub_secs[f]} if f in sub_secs else {}),
+        }
+        for f in files
+    ]
+    mut = ExifRename(
+        logger=logging.getLogger(__name__),
+        op_dir=".",
+        exiftool_session=session,
+        stream_window=stream_window,
+    )
+    await mut.move_rename_convert_images()
+
+    assert file_tree(image_dir) == [  # noqa: S101
+        ".hidden",
+        "canon_eosr5_jpg/20240101_100000_25_canon_eosr5_unittest_trip.jpg",
+        "canon_eosr5_jpg/20240101_100000_75_canon_eosr5_unittest_trip.jpg",
+        "canon_eosr5_jpg/20240101_100000_canon_eosr5_unittest_trip.jpg",
+        "canon_eosr5_jpg/20240101_100000_canon_eosr5_unittest_trip_1.jpg",
+        "canon_eosr5_jpg/20240101_100000_canon_eosr5_unittest_trip_2.jpg",
+    ]
+    assert (  # noqa: S101
+        image_dir / "canon_eosr5_jpg" / "20240101_100000_canon_eosr5_unittest_trip.jpg"
+    ).read_bytes() == b"earlier run"
+
+
+@pytest.mark.asyncio
+async def test_video_without_exif_date_uses_quicktime_create_date(image_dir):
+    """Test that a video is named after its movie header creation time."""
+    session = MagicMock()
+    session.get_tags.side_effect = lambda files, tags: [
+        {"SourceFile": f, "QuickTime:CreateDate": "2024:01:01 10:00:03"}
+        if f == "d.mov"
+        else {"SourceFile": f, "QuickTime:CreateDate": "0000:00:00 00:00:00"}
+        for f in files
+    ]
+    mut = ExifRename(logger=logging.getLogger(__name__), op_dir=".", exiftool_session=session)
+    await mut.move_rename_convert_images()
+
+    tree = file_tree(image_dir)
+    assert "unknown_unknown_mov/20240101_100003_unknown_unknown_unittest_trip.mov" in tree  # noqa: S101
+    assert "unknown_unknown_jpg/unknown_unknown_unknown_unittest_trip.jpg" in tree  # noqa: S101
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stream_window", [0, 2])
+async def test_run_records_stage_metrics(image_dir, stream_window, monkeypatch):
+    """Test that a run reports every stage and the per file conversion latency."""
+    for file_name in ["e.cr2", "f.cr2"]:
+        (image_dir / file_name).write_bytes(b"raw")
+    metrics = MetricsRegistry()
+    stage = DngConversionStage(workers=1, metrics=metrics)
+    monkeypatch.setattr(stage, "_convert_file", fake_convert)
+    mut = ExifRename(
+        logger=logging.getLogger(__name__),
+        op_dir=".",
+        exiftool_session=fake_exiftool(),
+        stream_window=stream_window,
+        conversion_stage=stage,
+        metrics=metrics,
+    )
+    await mut.move_rename_convert_images()
+
+    stages = metrics.to_dict()["stages"]
+    assert set(stages) == {  # noqa: S101
+        "scan",
+        "exiftool",
+        "classify",
+        "rename",
+        "convert",
+        "verify",
+        "delete",
+    }
+    assert stages["scan"]["files"] == 7  # noqa: S101
+    assert stages["rename"]["files"] == 6  # noqa: S101
+    assert stages["convert"]["bytes"] == 6  # noqa: S101
+    assert metrics.value("epr_files_renamed_total") == 6  # noqa: S101
+    assert metrics.value("epr_raw_files_deleted_total") == 2  # noqa: S101
+    assert metrics.histogram("epr_conversion_seconds").count == 2  # noqa: S101
+
+
+def test_read_image_dir_skips_debug_formatting_above_debug(image_dir, monkeypatch):
+    """Test that the list collection is only dumped as JSON when debug logging is on."""
+    logger = logging.getLogger("epr_info_only")
+    logger.setLevel(logging.INFO)
+    dumps = MagicMock(return_value="{}")
+    monkeypatch.setattr("abk_epr.epr.json.dumps", dumps)
+    mut = ExifRename(logger=logger, op_dir=".", exiftool_session=fake_exiftool())
+
+    list_collection = mut._read_image_dir()
+
+    assert len(list_collection) > 0  # noqa: S101
+    dumps.assert_not_called()
+    logger.setLevel(logging.DEBUG)
+    mut._read_image_dir()
+    dumps.assert_called_once()
+
+
+def test_group_metadata_keeps_records_and_leaves_exiftool_metadata_alone(image_dir):
+    """Test that classification builds records without changing the exiftool dicts."""
+    mut = ExifRename(logger=logging.getLogger(__name__), op_dir=".", exiftool_session=MagicMock())
+    metadata_list = [
+        {
+            "SourceFile": "d.mov",
+            "QuickTime:CreateDate": "2024:01:01 10:00:03",
+            "EXIF:Make": "Canon",
+            "EXIF:Model": "Canon EOS R5",
+        },
+        {"SourceFile": "notes.txt"},
+    ]
+    original = [dict(metadata) for metadata in metadata_list]
+
+    list_collection = mut._group_metadata(metadata_list, CompanionIndex(["d.mov"], []))
+
+    assert metadata_list == original  # noqa: S101
+    assert list_collection == {  # noqa: S101
+        "compressed_video_dict": {
+            "canon_eosr5_mov": [MetadataRecord("d.mov", "20240101_100003", "Canon", "EOSR5")]
+        }
+    }
+
+
+def test_group_metadata_uses_rules_from_config(tmp_path):
+    """Test that formats of a rules file are classified and RAW files get the rule vendor."""
+    rules_file = tmp_path / "rules.toml"
+    rules_file.write_text('compressed_image = ["webp"]\n[raw]\nHasselblad = ["3fr"]\n')
+    mut = ExifRename(
+        logger=logging.getLogger(__name__),
+        op_dir=".",
+        exiftool_session=MagicMock(),
+        classification_rules=ClassificationRules.load(str(rules_file)),
+    )
+    metadata_list = [
+        {"SourceFile": "a.webp", "EXIF:CreateDate": "2024:01:01 10:00:00", "EXIF:Make": "Google"},
+        {"SourceFile": "b.3FR", "EXIF:CreateDate": "2024:01:01 10:00:01", "EXIF:Model": "X2D"},
+        {"SourceFile": "b.jpg", "EXIF:CreateDate": "2024:01:01 10:00:01", "EXIF:Model": "X2D"},
+    ]
+
+    list_collection = mut._group_metadata(
+        metadata_list,
+        CompanionIndex(["a.webp", "b.3FR", "b.jpg"], mut._supported_raw_image_ext_list),
+    )
+
+    assert list_collection == {  # noqa: S101
+        "compressed_image_dict": {
+            "google_unknown_webp": [
+                MetadataRecord("a.webp", "20240101_100000", "Google", "unknown")
+            ]
+        },
+        "raw_image_dict": {
+            "hasselblad_x2d_3fr": [
+                MetadataRecord("b.3FR", "20240101_100001", "Hasselblad", "X2D")
+            ]
+        },
+        "thumb_image_dict": {
+            "unknown_x2d_thmb": [MetadataRecord("b.jpg", "20240101_100001", "unknown", "X2D")]
+        },
+    }
+
+
+@pytest.fixture
+def card_dir(tmp_path, monkeypatch):
+    """Project directory holding a card copy and a camera directory of an earlier run."""
+    project_dir = tmp_path / PROJECT_DIR
+    for file_name in [
+        "DCIM/100CANON/a.cr2",
+        "DCIM/100CANON/a.jpg",
+        "DCIM/101CANON/a.jpg",
+        "MISC/notes.txt",
+        "c.png",
+        "canon_eosr5_jpg/20231231_235959_canon_eosr5_unittest_trip.jpg",
+    ]:
+        (project_dir / file_name).parent.mkdir(parents=True, exist_ok=True)
+        (project_dir / file_name).write_bytes(b"data")
+    monkeypatch.chdir(project_dir)
+    return project_dir
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stream_window", [0, 2])
+async def test_recursive_scan_moves_card_files_into_camera_directories(
+    card_dir, stream_window, monkeypatch
+):
+    """Test that files of a card tree are renamed into the camera directories of the project.
+
+    The JPEG next to the RAW file is its thumbnail, the JPEG of the same name in another
+    card directory is not, and the camera directory of the earlier run is not scanned.
+    """
+    stage = DngConversionStage(workers=1)
+    monkeypatch.setattr(stage, "_convert_file", fake_convert)
+    mut = ExifRename(
+        logger=logging.getLogger(__name__),
+        op_dir=".",
+        exiftool_session=fake_exiftool(),
+        stream_window=stream_window,
+        conversion_stage=stage,
+        scan_depth=None,
+    )
+    await mut.move_rename_convert_images()
+
+    assert file_tree(card_dir) == [  # noqa: S101
+        "MISC/notes.txt",
+        "canon_eosr5_dng/20240101_100000_canon_eosr5_unittest_trip.dng",
+        "canon_eosr5_jpg/20231231_235959_canon_eosr5_unittest_trip.jpg",
+        "canon_eosr5_jpg/20240101_100000_canon_eosr5_unittest_trip.jpg",
+        "canon_eosr5_png/20240101_100002_canon_eosr5_unittest_trip.png",
+        "canon_eosr5_thmb/20240101_100000_canon_eosr5_unittest_trip.thmb",
+    ]
+
+
+def test_scan_depth_limits_the_scanned_levels(card_dir):
+    """Test that the top level is scanned by default and scan_depth adds levels."""
+    files = {
+        depth: ExifRename(
+            logger=logging.getLogger(__name__), op_dir=".", scan_depth=depth
+        )._scan_image_dir()
+        for depth in [0, 1, 2]
+    }
+
+    assert files[0] == ["c.png"]  # noqa: S101
+    assert files[1] == ["MISC/notes.txt", "c.png"]  # noqa: S101
+    assert files[2] == [  # noqa: S101
+        "DCIM/100CANON/a.cr2",
+        "DCIM/100CANON/a.jpg",
+        "DCIM/101CANON/a.jpg",
+        "MISC/notes.txt",
+        "c.png",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_second_import_of_a_card_skips_duplicates(tmp_path, monkeypatch):
+    """Test that files imported before, RAW files converted and deleted included, are skipped."""
+    index = ImportIndex(db_path=tmp_path / "imports.sqlite3")
+    project_dirs = [tmp_path / "first" / PROJECT_DIR, tmp_path / "second" / PROJECT_DIR]
+    for project_dir in project_dirs:
+        project_dir.mkdir(parents=True)
+        for file_name in ["a.jpg", "e.cr2"]:
+            (project_dir / file_name).write_bytes(f"content of {file_name}".encode())
+    (project_dirs[1] / "b.jpg").write_bytes(b"new content")
+    renamed = []
+    for project_dir in project_dirs:
+        monkeypatch.chdir(project_dir)
+        stage = DngConversionStage(workers=1)
+        monkeypatch.setattr(stage, "_convert_file", fake_convert)
+        dedup_stage = DedupStage(index=index)
+        mut = ExifRename(
+            logger=logging.getLogger(__name__),
+            op_dir=".",
+            exiftool_session=fake_exiftool(),
+            conversion_stage=stage,
+            dedup_stage=dedup_stage,
+        )
+        await mut.move_rename_convert_images()
+        dedup_stage.close()
+        renamed.append(mut.renamed_count)
+
+    assert renamed == [2, 1]  # noqa: S101
+    assert not os.path.exists(project_dirs[0] / "canon_eosr5_cr2")  # noqa: S101
+    assert file_tree(project_dirs[1]) == [  # noqa: S101
+        "a.jpg",
+        "canon_eosr5_jpg/20240101_100001_canon_eosr5_unittest_trip.jpg",
+        "e.cr2",
+    ]
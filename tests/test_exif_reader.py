@@ -0,0 +1,169 @@
+"""Tests for the native exif reader."""
+
+import shutil
+import struct
+from unittest.mock import MagicMock
+
+import pytest
+
+from abk_epr.exif_reader import ExifReader, NativeExifSession
+from abk_epr.exif_session import ExifToolSession
+
+
+TAGS = ["EXIF:CreateDate", "EXIF:SubSecTimeOriginal", "EXIF:Make", "EXIF:Model"]
+
+
+def tiff_with_exif(
+    make: str = "Canon",
+    model: str = "Canon EOS R5",
+    create_date: str = "2024:01:01 10:00:00",
+    sub_sec: str | None = "50",
+    endian: str = "<",
+    magic: int = 42,
+) -> bytes:
+    """Minimal TIFF structure with Make/Model in IFD0 and CreateDate/SubSec in the Exif IFD."""
+
+    def ascii_value(text: str) -> bytes:
+        return text.encode() + b"\x00"
+
+    ifd0_entries = [(0x010F, ascii_value(make)), (0x0110, ascii_value(model))]
+    exif_entries = [(0x9004, ascii_value(create_date))]
+    if sub_sec is not None:
+        exif_entries.append((0x9291, ascii_value(sub_sec)))
+    ifd0_offset = 8
+    ifd0_size = 2 + 12 * (len(ifd0_entries) + 1) + 4
+    exif_offset = ifd0_offset + ifd0_size
+    exif_size = 2 + 12 * len(exif_entries) + 4
+    data_offset = exif_offset + exif_size
+    data = b""
+
+    def ifd(entries, extra: list[tuple[int, int, int, int]]) -> bytes:
+        nonlocal data
+        body = struct.pack(f"{endian}H", len(entries) + len(extra))
+        for tag, value in entries:
+            if len(value) <= 4:
+                field = value.ljust(4, b"\x00")
+            else:
+                field = struct.pack(f"{endian}I", data_offset + len(data))
+                data += value
+            body += struct.pack(f"{endian}HHI", tag, 2, len(value)) + field
+        for tag, field_type, count, value in extra:
+            body += struct.pack(f"{endian}HHII", tag, field_type, count, value)
+        return body + struct.pack(f"{endian}I", 0)
+
+    ifd0 = ifd(ifd0_entries, [(0x8769, 4, 1, exif_offset)])
+    exif_ifd = ifd(exif_entries, [])
+    byte_order = b"II" if endian == "<" else b"MM"
+    header = byte_order + struct.pack(f"{endian}HI", magic, ifd0_offset)
+    return header + ifd0 + exif_ifd + data
+
+
+def jpeg_with_exif(**kwargs) -> bytes:
+    """Minimal JPEG with a JFIF APP0 segment and the Exif APP1 segment."""
+    app0 = b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    app1 = b"Exif\x00\x00" + tiff_with_exif(**kwargs)
+    return (
+        b"\xff\xd8"
+        + b"\xff\xe0"
+        + struct.pack(">H", len(app0) + 2)
+        + app0
+        + b"\xff\xe1"
+        + struct.pack(">H", len(app1) + 2)
+        + app1
+        + b"\xff\xda\x00\x02"
+        + b"\x00" * 64
+        + b"\xff\xd9"
+    )
+
+
+EXPECTED = {
+    "EXIF:CreateDate": "2024:01:01 10:00:00",
+    "EXIF:SubSecTimeOriginal": 50,
+    "EXIF:Make": "Canon",
+    "EXIF:Model": "Canon EOS R5",
+}
+
+
+@pytest.mark.parametrize(
+    ("file_name", "content"),
+    [
+        ("img.cr2", tiff_with_exif()),
+        ("img.nef", tiff_with_exif(endian=">")),
+        ("img.orf", tiff_with_exif(magic=0x4F52)),
+        ("img.rw2", tiff_with_exif(magic=0x55)),
+        ("img.jpg", jpeg_with_exif()),
+    ],
+    ids=["tiff_le", "tiff_be", "orf", "rw2", "jpeg"],
+)
+def test_read_tiff_based_and_jpeg_files(tmp_path, file_name, content):
+    """Test that the tags are read in the exiftool -j -G -n format."""
+    (tmp_path / file_name).write_bytes(content)
+
+    metadata = ExifReader().read(str(tmp_path / file_name), TAGS)
+
+    assert metadata == {"SourceFile": str(tmp_path / file_name), **EXPECTED}  # noqa: S101
+
+
+def test_read_values_like_exiftool(tmp_path):
+    """Test that leading zeros keep a value a string and missing tags are left out."""
+    (tmp_path / "a.jpg").write_bytes(jpeg_with_exif(model="EOS 5D   ", sub_sec="050"))
+    (tmp_path / "b.jpg").write_bytes(jpeg_with_exif(sub_sec=None))
+
+    reader = ExifReader()
+
+    assert reader.read(str(tmp_path / "a.jpg"), TAGS)["EXIF:Model"] == "EOS 5D"  # noqa: S101
+    assert reader.read(str(tmp_path / "a.jpg"), TAGS)["EXIF:SubSecTimeOriginal"] == "050"  # noqa: S101
+    assert "EXIF:SubSecTimeOriginal" not in reader.read(str(tmp_path / "b.jpg"), TAGS)  # noqa: S101
+
+
+@pytest.mark.parametrize(
+    "content",
+    [b"\x89PNG\r\n\x1a\n" + b"\x00" * 32, tiff_with_exif()[:20], b"", b"\xff\xd8\x00\x00garbage"],
+    ids=["png", "truncated_tiff", "empty", "broken_jpeg"],
+)
+def test_unsupported_or_broken_files_return_none(tmp_path, content):
+    """Test that exiftool is asked for files the reader can not parse."""
+    (tmp_path / "file").write_bytes(content)
+
+    assert ExifReader().read(str(tmp_path / "file"), TAGS) is None  # noqa: S101
+
+
+def test_native_session_falls_back_for_unsupported_files(tmp_path):
+    """Test that only files the reader can not parse go to exiftool, in the original order."""
+    files = []
+    for file_name, content in [
+        ("a.jpg", jpeg_with_exif()),
+        ("b.mov", b"\x00\x00\x00\x14ftypqt  "),
+        ("c.cr2", tiff_with_exif()),
+    ]:
+        (tmp_path / file_name).write_bytes(content)
+        files.append(str(tmp_path / file_name))
+    fallback = MagicMock()
+    fallback.get_tags.side_effect = lambda files, tags: [{"SourceFile": f} for f in files]
+
+    session = NativeExifSession(fallback_session=fallback)
+    metadata_list = session.get_tags(files=files, tags=TAGS)
+
+    assert [m["SourceFile"] for m in metadata_list] == files  # noqa: S101
+    assert metadata_list[2]["EXIF:Make"] == "Canon"  # noqa: S101
+    fallback.get_tags.assert_called_once_with(files=[files[1]], tags=TAGS)
+    assert (session.native_count, session.fallback_count) == (2, 1)  # noqa: S101
+
+
+@pytest.mark.skipif(shutil.which("exiftool") is None, reason="exiftool is not installed")
+def test_output_matches_exiftool(tmp_path):
+    """Test that the native reader returns exactly what exiftool returns."""
+    files = []
+    for file_name, content in [
+        ("le.cr2", tiff_with_exif()),
+        ("be.nef", tiff_with_exif(endian=">", make="NIKON CORPORATION", model="NIKON Z 9")),
+        ("zero.jpg", jpeg_with_exif(sub_sec="050")),
+        ("no_sub_sec.jpg", jpeg_with_exif(sub_sec=None)),
+    ]:
+        (tmp_path / file_name).write_bytes(content)
+        files.append(str(tmp_path / file_name))
+
+    with ExifToolSession() as exiftool_session:
+        expected = exiftool_session.get_tags(files=files, tags=TAGS)
+
+    assert [ExifReader().read(f, TAGS) for f in files] == expected  # noqa: S101
@@ -0,0 +1,108 @@
+"""Tests for the shared exiftool session."""
+
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from abk_epr.exif_session import ExifToolPool, ExifToolSession
+
+
+@pytest.fixture
+def mock_helper():
+    """Mocked ExifToolHelper instance, echoing the requested file names."""
+    helper = MagicMock()
+    helper.running = True
+    helper.get_tags.side_effect = lambda files, tags: [{"SourceFile": f} for f in files]
+    return helper
+
+
+def test_session_starts_one_process_for_all_calls(mock_helper):
+    """Test that health check and metadata reads reuse a single exiftool process."""
+    with (
+        patch("abk_epr.exif_session.exiftool.ExifToolHelper", return_value=mock_helper) as ctor,
+        ExifToolSession(chunk_size=2) as session,
+    ):
+        _ = session.executable
+        session.get_tags(["a.jpg", "b.jpg"], ["EXIF:Make"])
+        session.get_tags(["c.jpg"], ["EXIF:Make"])
+
+    ctor.assert_called_once_with(auto_start=False)
+    mock_helper.run.assert_called_once()
+    mock_helper.terminate.assert_called_once()
+
+
+def test_get_tags_is_chunked_and_keeps_order(mock_helper):
+    """Test that big file lists are sent in bounded chunks and merged in input order."""
+    files = [f"img_{i:04}.nef" for i in range(7)]
+    with patch("abk_epr.exif_session.exiftool.ExifToolHelper", return_value=mock_helper):
+        session = ExifToolSession(chunk_size=3)
+        metadata = session.get_tags(files, ["EXIF:Make"])
+
+    assert [m["SourceFile"] for m in metadata] == files  # noqa: S101
+    chunk_sizes = [len(c.kwargs["files"]) for c in mock_helper.get_tags.call_args_list]
+    assert chunk_sizes == [3, 3, 1]  # noqa: S101
+
+
+def test_invalid_chunk_size():
+    """Test that a non positive chunk size is rejected."""
+    with pytest.raises(ValueError):
+        ExifToolSession(chunk_size=0)
+
+
+def test_pool_shards_by_count_and_merges_in_input_order(tmp_path, mock_helper):
+    """Test that the pool balances shards of small files by count and keeps the order."""
+    files = []
+    for i in range(64):
+        file_path = tmp_path / f"img_{i:04}.nef"
+        file_path.write_bytes(b"x" * (i + 1) * 10)
+        files.append(str(file_path))
+
+    with (
+        patch("abk_epr.exif_session.exiftool.ExifToolHelper", return_value=mock_helper),
+        ExifToolPool(workers=4) as pool,
+    ):
+        metadata = pool.get_tags(files, ["EXIF:Make"])
+
+    assert [m["SourceFile"] for m in metadata] == files  # noqa: S101
+    shards = ExifToolPool._balanced_shards(files, 4)
+    assert [len(shard) for shard in shards] == [16, 16, 16, 16]  # noqa: S101
+    assert all(shard == sorted(shard) for shard in shards)  # noqa: S101
+
+
+def test_large_video_counts_little_more_than_a_small_file(tmp_path):
+    """Test that one large video does not leave its shard with a single file."""
+    video = tmp_path / "mvi_0001.mp4"
+    with open(video, "wb") as video_file:
+        video_file.truncate(8 * ExifToolPool.FILE_COST_BYTES)
+    files = [str(video)]
+    for i in range(63):
+        file_path = tmp_path / f"img_{i:04}.jpg"
+        file_path.write_bytes(b"x" * 1000)
+        files.append(str(file_path))
+
+    shards = ExifToolPool._balanced_shards(files, 4)
+
+    assert sorted(len(shard) for shard in shards) == [10, 18, 18, 18]  # noqa: S101
+
+
+def test_pool_uses_single_worker_for_small_lists(mock_helper):
+    """Test that a handful of files does not spin up extra exiftool processes."""
+    with patch("abk_epr.exif_session.exiftool.ExifToolHelper", return_value=mock_helper) as ctor:
+        pool = ExifToolPool(workers=8)
+        pool.get_tags(["a.jpg", "b.jpg"], ["EXIF:Make"])
+        pool.close()
+
+    ctor.assert_called_once()
+
+
+def test_relative_files_are_sent_as_absolute_paths(mock_helper, tmp_path, monkeypatch):
+    """Test that a process started in another directory finds files relative to the caller."""
+    with patch("abk_epr.exif_session.exiftool.ExifToolHelper", return_value=mock_helper):
+        session = ExifToolSession()
+        session.start()
+        monkeypatch.chdir(tmp_path)
+        metadata = session.get_tags(["a.jpg", "b.jpg"], ["EXIF:Make"])
+
+    sent = mock_helper.get_tags.call_args.kwargs["files"]
+    assert sent == [str(tmp_path / "a.jpg"), str(tmp_path / "b.jpg")]  # noqa: S101
+    assert [m["SourceFile"] for m in metadata] == ["a.jpg", "b.jpg"]  # noqa: S101
@@ -0,0 +1,153 @@
+"""Tests for the asynchronous file mover."""
+
+import errno
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from abk_epr.file_mover import FileMover, rename_no_replace
+
+
+@pytest.mark.asyncio
+async def test_move_many_moves_files(tmp_path):
+    """Test that files are moved and failing moves are reported, not raised."""
+    pairs = []
+    for i in range(10):
+        src = tmp_path / f"src_{i}.jpg"
+        src.write_bytes(b"jpg")
+        pairs.append((str(src), str(tmp_path / f"dst_{i}.jpg")))
+    pairs.append((str(tmp_path / "missing.jpg"), str(tmp_path / "dst_missing.jpg")))
+
+    mover = FileMover(max_in_flight=4)
+    moved = await mover.move_many(pairs)
+    mover.close()
+
+    assert moved == 10  # noqa: S101
+    assert sorted(os.listdir(tmp_path)) == sorted(f"dst_{i}.jpg" for i in range(10))  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_in_flight_limit():
+    """Test that no more than max_in_flight moves run at the same time."""
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def slow_move(src, dst):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.01)
+        with lock:
+            running -= 1
+
+    mover = FileMover(max_in_flight=3)
+    with patch.object(mover, "move_sync", side_effect=slow_move):
+        await mover.move_many((f"src_{i}", f"dst_{i}") for i in range(12))
+    mover.close()
+
+    assert peak == 3  # noqa: S101
+
+
+def test_cross_device_fallback_copies_and_removes_source(tmp_path):
+    """Test that EXDEV falls back to copy, atomic rename into place and source removal."""
+    src = tmp_path / "src.nef"
+    src.write_bytes(os.urandom(200_000))
+    content = src.read_bytes()
+    dst = tmp_path / "dst.nef"
+    real_rename = rename_no_replace
+
+    def rename_exdev(old, new):
+        if old == str(src):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        real_rename(old, new)
+
+    with patch("abk_epr.file_mover.rename_no_replace", side_effect=rename_exdev):
+        FileMover().move_sync(str(src), str(dst))
+
+    assert not src.exists()  # noqa: S101
+    assert dst.read_bytes() == content  # noqa: S101
+    assert os.listdir(tmp_path) == ["dst.nef"]  # noqa: S101
+
+
+def _copy_across_devices(src, dst) -> None:
+    """Moves src to dst as if they were on different filesystems."""
+    real_rename = rename_no_replace
+
+    def rename_exdev(old, new):
+        if old == str(src):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        real_rename(old, new)
+
+    with patch("abk_epr.file_mover.rename_no_replace", side_effect=rename_exdev):
+        FileMover().move_sync(str(src), str(dst))
+
+
+def test_read_write_fallback_completes_short_writes(tmp_path, monkeypatch):
+    """Test that the read/write copy writes the rest of a chunk os.write left over."""
+    src = tmp_path / "src.nef"
+    src.write_bytes(os.urandom(200_000))
+    content = src.read_bytes()
+    monkeypatch.delattr(os, "copy_file_range", raising=False)
+    monkeypatch.delattr(os, "sendfile", raising=False)
+    real_write = os.write
+    monkeypatch.setattr(os, "write", lambda fd, data: real_write(fd, data[:1000]))
+
+    _copy_across_devices(src, tmp_path / "dst.nef")
+
+    assert (tmp_path / "dst.nef").read_bytes() == content  # noqa: S101
+    assert not src.exists()  # noqa: S101
+
+
+def test_truncated_copy_keeps_source(tmp_path, monkeypatch):
+    """Test that a copy shorter than its source is not renamed into place."""
+    src = tmp_path / "src.nef"
+    src.write_bytes(os.urandom(200_000))
+    monkeypatch.setattr(FileMover, "_copy_file_data", lambda self, src_fd, dst_fd: None)
+
+    with pytest.raises(OSError, match="copied 0 of 200000 bytes"):
+        _copy_across_devices(src, tmp_path / "dst.nef")
+
+    assert os.listdir(tmp_path) == ["src.nef"]  # noqa: S101
+
+
+@pytest.mark.parametrize("native", [True, False], ids=["native", "link_unlink"])
+def test_move_never_replaces_existing_file(tmp_path, native):
+    """Test that moving onto an existing file fails and keeps both files."""
+    src = tmp_path / "burst_2.nef"
+    src.write_bytes(b"second frame")
+    dst = tmp_path / "burst_1.nef"
+    dst.write_bytes(b"first frame")
+
+    with (
+        patch("abk_epr.file_mover._native_rename_no_replace", return_value=None)
+        if not native
+        else patch.object(os, "replace", side_effect=AssertionError),
+        pytest.raises(FileExistsError),
+    ):
+        FileMover().move_sync(str(src), str(dst))
+
+    assert src.read_bytes() == b"second frame"  # noqa: S101
+    assert dst.read_bytes() == b"first frame"  # noqa: S101
+
+
+def test_rename_no_replace_without_hard_links(tmp_path):
+    """Test the fallback for filesystems without hard links."""
+    src = tmp_path / "a.jpg"
+    src.write_bytes(b"a")
+    dst = tmp_path / "b.jpg"
+
+    with (
+        patch("abk_epr.file_mover._native_rename_no_replace", return_value=None),
+        patch("abk_epr.file_mover.os.link", side_effect=OSError(errno.EPERM, "no links")),
+    ):
+        rename_no_replace(str(src), str(dst))
+        src.write_bytes(b"new a")
+        with pytest.raises(FileExistsError):
+            rename_no_replace(str(src), str(dst))
+
+    assert dst.read_bytes() == b"a"  # noqa: S101
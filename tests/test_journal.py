@@ -0,0 +1,67 @@
+"""Tests for the operation journal."""
+
+import os
+
+from abk_epr.journal import JournalOp, OperationJournal
+
+
+def test_completed_operations_survive_reopen(tmp_path):
+    """Test that completed operations are read back, planned and broken ones are not."""
+    path = str(tmp_path / OperationJournal.FILE_NAME)
+    with OperationJournal(path=path, sync_every=2) as journal:
+        journal.plan(JournalOp.RENAME, "a.nef", "./nikon_z9_nef/x.nef")
+        journal.done(JournalOp.RENAME, "a.nef", "./nikon_z9_nef/x.nef")
+        journal.plan(JournalOp.RENAME, "b.nef", "./nikon_z9_nef/y.nef")
+    with open(path, "a", encoding="utf-8") as journal_file:
+        journal_file.write('{"op":"rename","state":"done","src":"c.nef"}\n["done"]\n7\n')
+        journal_file.write('{"op":"rename","state":"do')
+
+    reopened = OperationJournal(path=path)
+    reopened.load()
+
+    assert reopened.completed(JournalOp.RENAME, "a.nef") == "nikon_z9_nef/x.nef"  # noqa: S101
+    assert reopened.completed(JournalOp.RENAME, "b.nef") is None  # noqa: S101
+    assert reopened.completed(JournalOp.RENAME, "c.nef") is None  # noqa: S101
+    assert reopened.completed_operations(JournalOp.RENAME) == [  # noqa: S101
+        ("a.nef", "nikon_z9_nef/x.nef")
+    ]
+
+
+def test_records_are_written_in_batches(tmp_path):
+    """Test that records reach the file once a batch is full or on flush."""
+    path = tmp_path / OperationJournal.FILE_NAME
+    journal = OperationJournal(path=str(path), sync_every=3)
+    journal.open()
+    journal.plan(JournalOp.RENAME, "a.jpg", "b.jpg")
+    journal.done(JournalOp.RENAME, "a.jpg", "b.jpg")
+    lines_before_batch = path.read_text().count("\n")
+    journal.plan(JournalOp.RENAME, "c.jpg", "d.jpg")
+    lines_after_batch = path.read_text().count("\n")
+    journal.close()
+
+    assert (lines_before_batch, lines_after_batch) == (0, 3)  # noqa: S101
+
+
+def test_finished_run_is_archived_and_read_back_by_undo(tmp_path):
+    """Test that a fresh journal follows a finished run, which load_last_run still finds."""
+    path = str(tmp_path / OperationJournal.FILE_NAME)
+    with OperationJournal(path=path) as journal:
+        journal.done(JournalOp.RENAME, "a.jpg", "x.jpg")
+    OperationJournal(path=path).archive(OperationJournal.FINISHED)
+    with OperationJournal(path=path):
+        pass
+    # a run killed before it wrote a record
+    open(path, "w").close()  # noqa: SIM115
+
+    fresh = OperationJournal(path=path)
+    fresh.load()
+    last_run = OperationJournal(path=path)
+    last_run.load_last_run()
+
+    assert fresh.completed_operations(JournalOp.RENAME) == []  # noqa: S101
+    assert last_run.completed_operations(JournalOp.RENAME) == [("a.jpg", "x.jpg")]  # noqa: S101
+    assert last_run.archive("undone") == f"{path}.undone"  # noqa: S101
+    assert sorted(os.listdir(tmp_path)) == [  # noqa: S101
+        OperationJournal.FILE_NAME,
+        f"{OperationJournal.FILE_NAME}.undone",
+    ]
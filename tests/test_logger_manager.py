@@ -0,0 +1,88 @@
+"""Tests for the logger manager."""
+
+import logging
+import threading
+
+import pytest
+
+from abk_epr.logger_manager import LoggerManager
+
+
+LOGGING_YAML = """\
+version: 1
+disable_existing_loggers: False
+handlers:
+    recordingHandler:
+        class: tests.test_logger_manager.RecordingHandler
+        level: INFO
+loggers:
+    consoleLogger:
+        level: DEBUG
+        handlers: [recordingHandler]
+        propagate: no
+"""
+
+
+class RecordingHandler(logging.Handler):
+    """Handler remembering the messages and the threads that wrote them."""
+
+    records: list[tuple[str, str]] = []
+
+    def emit(self, record):
+        """Records the message and the current thread."""
+        self.records.append((self.format(record), threading.current_thread().name))
+
+
+@pytest.fixture
+def logger_manager(tmp_path, monkeypatch):
+    """Fresh LoggerManager reading a logging.yaml with a recording handler."""
+    (tmp_path / "logging.yaml").write_text(LOGGING_YAML)
+    monkeypatch.setattr(LoggerManager, "_instance", None)
+    monkeypatch.setattr(LoggerManager, "_find_project_root", lambda self: tmp_path)
+    RecordingHandler.records = []
+    manager = LoggerManager()
+    yield manager
+    manager.stop()
+    logging.getLogger("consoleLogger").handlers = []
+
+
+def test_queued_records_are_written_by_listener_thread(logger_manager):
+    """Test that the handlers run on a background thread and stop writes every record."""
+    logger_manager.configure()
+    logger = logger_manager.get_logger()
+
+    for index in range(100):
+        logger.info("renamed file %d", index)
+    logger.debug("below the handler level")
+    logger_manager.stop()
+
+    assert [message for message, _ in RecordingHandler.records] == [  # noqa: S101
+        f"renamed file {index}" for index in range(100)
+    ]
+    assert {thread for _, thread in RecordingHandler.records} != {  # noqa: S101
+        threading.current_thread().name
+    }
+    assert [type(h).__name__ for h in logger.handlers] == ["RecordingHandler"]  # noqa: S101
+
+
+def test_queued_record_keeps_arguments_of_logging_call(logger_manager):
+    """Test that arguments are merged when logging, not when the listener gets to them."""
+    logger_manager.configure()
+    files = ["a.jpg"]
+
+    logger_manager.get_logger().info("files = %s", files)
+    files.append("b.jpg")
+    logger_manager.stop()
+
+    assert RecordingHandler.records[0][0] == "files = ['a.jpg']"  # noqa: S101
+
+
+def test_unqueued_handlers_write_on_calling_thread(logger_manager):
+    """Test that queued=False keeps the configured handlers."""
+    logger_manager.configure(queued=False)
+
+    logger_manager.get_logger().info("renamed")
+
+    assert RecordingHandler.records == [  # noqa: S101
+        ("renamed", threading.current_thread().name)
+    ]
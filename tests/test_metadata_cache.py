@@ -0,0 +1,97 @@
+"""Tests for the persistent metadata cache."""
+
+import os
+import sqlite3
+
+import pytest
+
+from abk_epr.metadata_cache import MetadataCache
+from abk_epr.metadata_record import MetadataRecord
+
+
+def _metadata(file_name: str, create_date: str = "20240101_100000") -> MetadataRecord:
+    """Metadata record for a file."""
+    return MetadataRecord(file_name, create_date, "nikon", "z9")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Metadata cache in a temporary directory."""
+    with MetadataCache(db_path=tmp_path / "cache" / "metadata.sqlite3", max_entries=3) as cache:
+        yield cache
+
+
+def test_hit_after_put_and_after_rename(tmp_path, cache):
+    """Test that cached metadata is found again, also after the file has been renamed."""
+    file_path = tmp_path / "dsc_0001.nef"
+    file_path.write_bytes(b"raw")
+
+    assert cache.get_many([str(file_path)]) == {}  # noqa: S101
+    cache.put_many([_metadata(str(file_path))])
+    renamed_path = tmp_path / "renamed.nef"
+    os.rename(file_path, renamed_path)
+    found = cache.get_many([str(renamed_path)])
+
+    assert found[str(renamed_path)] == MetadataRecord(  # noqa: S101
+        str(renamed_path), "20240101_100000", "nikon", "z9"
+    )
+    assert (cache.hits, cache.misses) == (1, 1)  # noqa: S101
+
+
+def test_modified_file_misses(tmp_path, cache):
+    """Test that a file with a different size or mtime is not served from the cache."""
+    file_path = tmp_path / "dsc_0001.nef"
+    file_path.write_bytes(b"raw")
+    cache.put_many([_metadata(str(file_path))])
+    file_path.write_bytes(b"raw but longer")
+
+    assert cache.get_many([str(file_path)]) == {}  # noqa: S101
+
+
+def test_lru_eviction(tmp_path, cache):
+    """Test that the least recently used entries are evicted on flush."""
+    files = []
+    for i in range(5):
+        file_path = tmp_path / f"dsc_{i:04}.nef"
+        file_path.write_bytes(b"x" * (i + 1))
+        files.append(str(file_path))
+        cache.put_many([_metadata(str(file_path))])
+    cache.get_many(files[:2])
+    cache.flush()
+
+    assert sorted(cache.get_many(files)) == sorted([files[0], files[1], files[4]])  # noqa: S101
+
+
+def test_sub_seconds_are_cached_and_old_schema_is_rebuilt(tmp_path):
+    """Test that sub seconds round trip and a cache of an older schema is dropped."""
+    db_path = tmp_path / "metadata.sqlite3"
+    connection = sqlite3.connect(db_path)
+    connection.execute("CREATE TABLE metadata (dev INTEGER, create_date TEXT)")
+    connection.commit()
+    connection.close()
+    file_path = tmp_path / "dsc_0001.nef"
+    file_path.write_bytes(b"raw")
+
+    with MetadataCache(db_path=db_path) as cache:
+        record = _metadata(str(file_path))
+        record.sub_sec = "50"
+        cache.put_many([record])
+        found = cache.get_many([str(file_path)])
+
+    assert found[str(file_path)].sub_sec == "50"  # noqa: S101
+
+
+def test_put_many_is_committed_before_close(tmp_path, cache):
+    """Test that a run killed before close keeps the metadata it stored."""
+    file_path = tmp_path / "dsc_0001.nef"
+    file_path.write_bytes(b"raw")
+
+    cache.put_many([_metadata(str(file_path))])
+
+    # a second connection sees only committed rows
+    connection = sqlite3.connect(tmp_path / "cache" / "metadata.sqlite3")
+    try:
+        (count,) = connection.execute("SELECT COUNT(*) FROM metadata").fetchone()
+    finally:
+        connection.close()
+    assert count == 1  # noqa: S101
@@ -0,0 +1,23 @@
+"""Tests for the metadata record."""
+
+import sys
+
+from abk_epr.metadata_record import MetadataRecord
+
+
+def test_create_interns_make_and_model():
+    """Test that records of the same camera share their make and model strings."""
+    make, model = "".join(["Ca", "non"]), "".join(["EOS", "R5"])
+    first = MetadataRecord.create("a.cr2", "20240101_100000", make, model)
+    second = MetadataRecord.create("b.cr2", "20240101_100001", "Canon", "EOSR5", "12")
+
+    assert first.make is second.make is sys.intern("Canon")  # noqa: S101
+    assert first.model is second.model  # noqa: S101
+    assert (first.sub_sec, second.sub_sec) == ("", "12")  # noqa: S101
+
+
+def test_record_has_no_instance_dict():
+    """Test that the record is slotted."""
+    record = MetadataRecord("a.cr2", "20240101_100000", "Canon", "EOSR5")
+
+    assert not hasattr(record, "__dict__")  # noqa: S101
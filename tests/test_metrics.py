@@ -0,0 +1,135 @@
+"""Tests for the metrics registry."""
+
+import json
+import os
+import stat
+
+import pytest
+
+from abk_epr.metrics import MetricsRegistry
+
+
+def test_stage_throughput_and_counters():
+    """Test that stages add up and the JSON export derives files/s and bytes/s."""
+    metrics = MetricsRegistry()
+    metrics.add_stage("convert", 2.0, files=4, byte_count=400)
+    metrics.add_stage("convert", 2.0, files=4, byte_count=400)
+    with metrics.stage("scan") as stage:
+        stage.files = 10
+    metrics.inc("epr_conversions_total", 3, result="ok")
+    metrics.inc("epr_conversions_total", result="failed")
+
+    document = metrics.to_dict()
+
+    assert document["stages"]["convert"] == {  # noqa: S101
+        "seconds": 4.0,
+        "files": 8,
+        "bytes": 800,
+        "files_per_second": 2.0,
+        "bytes_per_second": 200.0,
+    }
+    assert document["stages"]["scan"]["files"] == 10  # noqa: S101
+    assert metrics.value("epr_conversions_total", result="ok") == 3  # noqa: S101
+    assert metrics.value("epr_conversions_total", result="failed") == 1  # noqa: S101
+
+
+def test_histogram_percentiles_and_buckets():
+    """Test that percentiles use the nearest rank and buckets are cumulative."""
+    metrics = MetricsRegistry()
+    for millisecond in range(1, 101):
+        metrics.observe("epr_conversion_seconds", millisecond / 10.0)
+
+    histogram = metrics.to_dict()["histograms"][0]
+
+    assert (histogram["p50"], histogram["p90"], histogram["p99"]) == (5.0, 9.0, 9.9)  # noqa: S101
+    assert histogram["count"] == 100  # noqa: S101
+    assert histogram["buckets"]["1"] == 10  # noqa: S101
+    assert histogram["buckets"]["+Inf"] == 100  # noqa: S101
+
+
+def test_histogram_sample_is_bounded(monkeypatch):
+    """Test that the percentile sample does not grow with the number of observations."""
+    monkeypatch.setattr(MetricsRegistry, "MAX_SAMPLES", 50)
+    metrics = MetricsRegistry()
+    for value in range(1000):
+        metrics.observe("epr_conversion_seconds", float(value))
+
+    histogram = metrics.histogram("epr_conversion_seconds")
+
+    assert len(histogram.samples) == 50  # noqa: S101
+    assert histogram.count == 1000  # noqa: S101
+
+
+def test_prometheus_text_format():
+    """Test the node exporter textfile format of counters, gauges and histograms."""
+    metrics = MetricsRegistry()
+    metrics.add_stage("rename", 0.5, files=3)
+    metrics.set("epr_exiftool_processes", 2)
+    metrics.observe("epr_conversion_seconds", 0.2)
+
+    lines = metrics.to_prometheus().splitlines()
+
+    assert "# TYPE epr_stage_seconds_total counter" in lines  # noqa: S101
+    assert 'epr_stage_seconds_total{stage="rename"} 0.5' in lines  # noqa: S101
+    assert 'epr_stage_files_total{stage="rename"} 3' in lines  # noqa: S101
+    assert "epr_exiftool_processes 2" in lines  # noqa: S101
+    assert 'epr_conversion_seconds_bucket{le="0.1"} 0' in lines  # noqa: S101
+    assert 'epr_conversion_seconds_bucket{le="0.25"} 1' in lines  # noqa: S101
+    assert 'epr_conversion_seconds_bucket{le="+Inf"} 1' in lines  # noqa: S101
+    assert "epr_conversion_seconds_count 1" in lines  # noqa: S101
+
+
+def test_unknown_metric_is_rejected():
+    """Test that a typo in a metric name fails instead of exporting a new series."""
+    with pytest.raises(KeyError):
+        MetricsRegistry().inc("epr_files_renamed")
+
+
+@pytest.mark.parametrize(
+    ("file_name", "output_format", "expected_json"),
+    [
+        ("metrics.json", None, True),
+        ("epr.prom", None, False),
+        ("metrics.txt", "prometheus", False),
+    ],
+)
+def test_write_chooses_format(tmp_path, file_name, output_format, expected_json):
+    """Test that .prom files get the text format and other files JSON, without temp files."""
+    metrics = MetricsRegistry()
+    metrics.inc("epr_files_renamed_total", 5)
+    path = tmp_path / file_name
+
+    metrics.write(str(path), output_format)
+
+    content = path.read_text()
+    if expected_json:
+        assert json.loads(content)["metrics"][0]["value"] == 5  # noqa: S101
+    else:
+        assert "epr_files_renamed_total 5" in content.splitlines()  # noqa: S101
+    assert [p.name for p in tmp_path.iterdir()] == [file_name]  # noqa: S101
+
+
+def test_write_leaves_file_readable_by_others(tmp_path):
+    """Test that the textfile is 0644 whatever the umask, not the 0600 of the temp file."""
+    umask = os.umask(0o077)
+    try:
+        MetricsRegistry().write(str(tmp_path / "epr.prom"))
+    finally:
+        os.umask(umask)
+
+    assert stat.S_IMODE(os.stat(tmp_path / "epr.prom").st_mode) == 0o644  # noqa: S101
+
+
+def test_failed_write_removes_temp_file(tmp_path, monkeypatch):
+    """Test that the temp file is removed and the old textfile kept if writing fails."""
+    (tmp_path / "epr.prom").write_text("old")
+
+    def _fail(fd, mode):
+        raise PermissionError("fchmod not permitted")
+
+    monkeypatch.setattr(os, "fchmod", _fail)
+    with pytest.raises(PermissionError):
+        MetricsRegistry().write(str(tmp_path / "epr.prom"))
+
+    assert os.listdir(tmp_path) == ["epr.prom"]  # noqa: S101
+    assert (tmp_path / "epr.prom").read_text() == "old"  # noqa: S101
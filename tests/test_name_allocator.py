@@ -0,0 +1,41 @@
+"""Tests for the name allocator."""
+
+import os
+
+from abk_epr.name_allocator import NameAllocator
+
+
+def test_allocate_appends_sequence_within_batch_and_against_existing_files(tmp_path):
+    """Test that taken names, on disk or allocated before, get the next free suffix."""
+    (tmp_path / "jpg").mkdir()
+    (tmp_path / "jpg" / "20240101_100000_trip.jpg").write_bytes(b"old")
+    (tmp_path / "jpg" / "20240101_100000_trip_2.jpg").write_bytes(b"old")
+    directory = str(tmp_path / "jpg")
+    allocator = NameAllocator()
+
+    names = [
+        os.path.basename(allocator.allocate(directory, "20240101_100000_TRIP", "jpg"))
+        for _ in range(3)
+    ]
+
+    assert names == [  # noqa: S101
+        "20240101_100000_trip_1.jpg",
+        "20240101_100000_trip_3.jpg",
+        "20240101_100000_trip_4.jpg",
+    ]
+    assert allocator.allocate(directory, "20240101_100001_trip", "jpg").endswith(  # noqa: S101
+        "/20240101_100001_trip.jpg"
+    )
+
+
+def test_raw_directory_shares_stems_with_dng_directory(tmp_path):
+    """Test that a RAW file does not get the stem of an already converted DNG file."""
+    (tmp_path / "canon_dng").mkdir()
+    (tmp_path / "canon_dng" / "20240101_100000_trip.dng").write_bytes(b"dng")
+    allocator = NameAllocator()
+
+    new_file = allocator.allocate(
+        str(tmp_path / "canon_cr2"), "20240101_100000_trip", "cr2", str(tmp_path / "canon_dng")
+    )
+
+    assert os.path.basename(new_file) == "20240101_100000_trip_1.cr2"  # noqa: S101
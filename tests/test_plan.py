@@ -0,0 +1,94 @@
+"""Tests for the plan and apply split."""
+
+import logging
+import os
+
+import pytest
+
+from abk_epr.dng_conversion import DngConversionStage
+from abk_epr.epr import ExifRename
+from abk_epr.journal import JournalOp
+from abk_epr.plan import OperationPlan, PlanRecord
+from tests.helpers import PROJECT_DIR, fake_convert, fake_exiftool, file_tree
+
+
+def _exif_rename(monkeypatch) -> ExifRename:
+    """ExifRename with fake exiftool and converter."""
+    stage = DngConversionStage(workers=1)
+    monkeypatch.setattr(stage, "_convert_file", fake_convert)
+    return ExifRename(
+        logging.getLogger(__name__), ".", exiftool_session=fake_exiftool(), conversion_stage=stage
+    )
+
+
+def test_plan_round_trip(tmp_path):
+    """Test that a written plan reads back unchanged."""
+    plan = OperationPlan(
+        "/photos/20240101_trip",
+        [
+            PlanRecord(JournalOp.RENAME, "e.cr2", "canon_cr2/e.cr2", 8),
+            PlanRecord(JournalOp.CONVERT, "canon_cr2/e.cr2", "canon_dng"),
+        ],
+    )
+    plan.write(str(tmp_path / "plan.jsonl"))
+
+    assert OperationPlan.read(str(tmp_path / "plan.jsonl")) == plan  # noqa: S101
+
+
+def test_read_rejects_other_files(tmp_path):
+    """Test that a file without plan header is rejected."""
+    (tmp_path / "journal.jsonl").write_text('{"op":"rename"}\n')
+
+    with pytest.raises(Exception, match="not an epr plan"):
+        OperationPlan.read(str(tmp_path / "journal.jsonl"))
+
+
+@pytest.mark.asyncio
+async def test_plan_does_not_touch_files_and_apply_carries_it_out(image_dir, monkeypatch):
+    """Test that plan leaves the directory unchanged and apply renames, converts and deletes."""
+    (image_dir / "e.cr2").write_bytes(b"raw")
+    (image_dir / "f.cr2").write_bytes(b"raw")
+    before = file_tree(image_dir)
+
+    plan = _exif_rename(monkeypatch).plan()
+
+    assert file_tree(image_dir) == before  # noqa: S101
+    assert [record.op for record in plan.records] == [JournalOp.RENAME] * 6 + [  # noqa: S101
+        JournalOp.CONVERT,
+        JournalOp.DELETE,
+    ] * 2
+
+    # keep the raw file of f.cr2 by removing its deletion from the plan
+    kept_raw = "canon_eosr5_cr2/20240101_100006_canon_eosr5_unittest_trip.cr2"
+    plan.records = [
+        r for r in plan.records if not (r.op == JournalOp.DELETE and r.src == kept_raw)
+    ]
+    exif_rename = _exif_rename(monkeypatch)
+    assert await exif_rename.apply_plan(plan) == 6  # noqa: S101
+
+    tree = file_tree(image_dir)
+    assert kept_raw in tree  # noqa: S101
+    assert "canon_eosr5_cr2/20240101_100005_canon_eosr5_unittest_trip.cr2" not in tree  # noqa: S101
+    assert "canon_eosr5_dng/20240101_100005_canon_eosr5_unittest_trip.dng" in tree  # noqa: S101
+    assert "canon_eosr5_jpg/20240101_100001_canon_eosr5_unittest_trip.jpg" in tree  # noqa: S101
+    assert "notes.txt" in tree  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_apply_skips_changed_files(image_dir, monkeypatch):
+    """Test that files changed since planning are skipped."""
+    plan = _exif_rename(monkeypatch).plan()
+    (image_dir / "a.jpg").write_bytes(b"changed data")
+
+    assert await _exif_rename(monkeypatch).apply_plan(plan) == 3  # noqa: S101
+    assert "a.jpg" in os.listdir(image_dir)  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_apply_rejects_plan_of_other_project(image_dir, monkeypatch):
+    """Test that a plan of another project directory is not applied."""
+    plan = OperationPlan("/photos/20240202_other", [])
+
+    with pytest.raises(Exception, match="plan was made for"):
+        await _exif_rename(monkeypatch).apply_plan(plan)
+    assert os.path.basename(os.getcwd()) == PROJECT_DIR  # noqa: S101
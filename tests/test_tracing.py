@@ -0,0 +1,112 @@
+"""Tests for the tracing spans and the event loop block monitor."""
+
+import asyncio
+import json
+import logging
+import time
+
+import pytest
+
+from abk_epr.abk_common import function_trace
+from abk_epr.tracing import LoopBlockMonitor, tracer
+
+
+@pytest.fixture
+def enabled_tracer():
+    """Global tracer recording spans for one test."""
+    tracer.clear()
+    tracer.enable()
+    yield tracer
+    tracer.disable()
+    tracer.clear()
+
+
+class Pipeline:
+    """Traced sync and async methods."""
+
+    def __init__(self):
+        """Pipeline init."""
+        self.log = logging.getLogger("pipeline")
+
+    @function_trace
+    def classify(self) -> str:
+        """Sync step."""
+        return "classified"
+
+    @function_trace
+    async def rename(self) -> str:
+        """Async step awaiting a nested sync step."""
+        await asyncio.sleep(0.01)
+        self.log.debug("renaming")
+        return self.classify()
+
+
+@pytest.mark.asyncio
+async def test_async_exit_is_traced_after_the_coroutine_ran(caplog):
+    """Test that the exit line of a coroutine comes after the work it awaited."""
+    with caplog.at_level(logging.DEBUG):
+        assert await Pipeline().rename() == "classified"  # noqa: S101
+
+    messages = [record.getMessage() for record in caplog.records]
+    rename_exit = next(i for i, m in enumerate(messages) if "<- rename" in m)
+    assert messages.index("renaming") < rename_exit  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_disabled_tracer_records_nothing():
+    """Test that without debug logging and tracer the wrappers only call the function."""
+    tracer.clear()
+    logging.getLogger("rename").setLevel(logging.INFO)
+
+    assert await Pipeline().rename() == "classified"  # noqa: S101
+    assert tracer.events() == []  # noqa: S101
+    assert tracer.span("anything") is tracer.span("other")  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_nested_spans_export_chrome_trace(enabled_tracer, tmp_path):
+    """Test that nested spans become complete events on the lane of their task."""
+    pipeline = Pipeline()
+    await asyncio.gather(
+        asyncio.create_task(pipeline.rename(), name="first"),
+        asyncio.create_task(pipeline.rename(), name="second"),
+    )
+    enabled_tracer.write(str(tmp_path / "trace.json"))
+
+    trace = json.loads((tmp_path / "trace.json").read_text())
+    spans = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+    lanes = {e["args"]["name"]: e["tid"] for e in trace["traceEvents"] if e["ph"] == "M"}
+    assert sorted(e["name"] for e in spans) == [  # noqa: S101
+        "Pipeline.classify",
+        "Pipeline.classify",
+        "Pipeline.rename",
+        "Pipeline.rename",
+    ]
+    for task_name in ["first", "second"]:
+        lane_spans = [e for e in spans if e["tid"] == lanes[f"task {task_name}"]]
+        outer = next(e for e in lane_spans if e["name"] == "Pipeline.rename")
+        inner = next(e for e in lane_spans if e["name"] == "Pipeline.classify")
+        assert inner["args"]["parent"] == "Pipeline.rename"  # noqa: S101
+        assert outer["ts"] <= inner["ts"]  # noqa: S101
+        assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_loop_block_monitor_flags_blocking_call(enabled_tracer, caplog):
+    """Test that a synchronous sleep on the loop is reported with its stack."""
+    monitor = LoopBlockMonitor(threshold=0.05)
+    monitor.start()
+    await asyncio.sleep(0.06)
+
+    def blocking_rename() -> None:
+        time.sleep(0.3)
+
+    blocking_rename()
+    await asyncio.sleep(0.06)
+    await monitor.stop()
+
+    assert len(monitor.blocks) == 1  # noqa: S101
+    assert monitor.blocks[0].seconds >= 0.2  # noqa: S101
+    assert any("blocking_rename" in line for line in monitor.blocks[0].stack)  # noqa: S101
+    assert [e["name"] for e in enabled_tracer.events()] == ["event loop blocked"]  # noqa: S101
+    assert "event loop blocked" in caplog.text  # noqa: S101
@@ -0,0 +1,106 @@
+"""Tests for the watch mode."""
+
+import asyncio
+import logging
+import sys
+
+import pytest
+
+from abk_epr.dng_conversion import DngConversionStage
+from abk_epr.epr import ExifRename
+from abk_epr.watch import DirectoryWatcher, WatchRunner
+from tests.helpers import fake_convert, fake_exiftool, file_tree
+
+
+async def _wait_for(condition, timeout: float = 5.0) -> None:
+    """Waits until condition() is true."""
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+async def test_directory_watcher_reports_new_files(tmp_path):
+    """Test that files created in the directory are reported, sub directories are not."""
+    changed: list[str | None] = []
+    watcher = DirectoryWatcher(directory=str(tmp_path))
+    assert watcher.start(changed.append)  # noqa: S101
+    (tmp_path / "a.jpg").write_bytes(b"data")
+    (tmp_path / "sub_dir").mkdir()
+    await _wait_for(lambda: "a.jpg" in changed)
+    watcher.close()
+
+    assert "sub_dir" not in changed  # noqa: S101
+    assert not watcher.uses_inotify  # noqa: S101
+
+
+def test_ready_files_waits_until_file_is_quiescent(image_dir):
+    """Test that a file is only ready after its size did not change for the settle time."""
+    runner = WatchRunner(
+        logging.getLogger(__name__),
+        ExifRename(logging.getLogger(__name__), ".", exiftool_session=fake_exiftool()),
+        settle_seconds=1.0,
+    )
+    runner._on_change("a.jpg")
+    runner._on_change(".hidden")
+
+    assert runner._ready_files(now=10.0) == []  # noqa: S101
+    (image_dir / "a.jpg").write_bytes(b"more data")
+    assert runner._ready_files(now=10.5) == []  # noqa: S101
+    assert runner._ready_files(now=11.0) == []  # noqa: S101
+    assert runner._ready_files(now=11.5) == ["a.jpg"]  # noqa: S101
+
+
+def test_ready_files_holds_back_companion_of_changing_raw(image_dir):
+    """Test that a settled JPEG waits for a RAW file landing after its settle time."""
+    runner = WatchRunner(
+        logging.getLogger(__name__),
+        ExifRename(logging.getLogger(__name__), ".", exiftool_session=fake_exiftool()),
+        settle_seconds=1.0,
+    )
+    (image_dir / "shot.jpg").write_bytes(b"jpeg data")
+    runner._on_change("shot.jpg")
+    assert runner._ready_files(now=10.0) == []  # noqa: S101
+
+    (image_dir / "shot.cr2").write_bytes(b"raw")
+    runner._on_change("shot.cr2")
+    assert runner._ready_files(now=11.5) == []  # noqa: S101
+    (image_dir / "shot.cr2").write_bytes(b"raw data")
+    assert runner._ready_files(now=12.0) == []  # noqa: S101
+    assert runner._ready_files(now=13.0) == ["shot.cr2", "shot.jpg"]  # noqa: S101
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_inotify", [True, False], ids=["inotify", "polling"])
+async def test_watch_processes_existing_and_arriving_files(image_dir, monkeypatch, use_inotify):
+    """Test that present and arriving files are renamed and converted by warm workers."""
+    session = fake_exiftool()
+    stage = DngConversionStage(workers=1)
+    monkeypatch.setattr(stage, "_convert_file", fake_convert)
+    exif_rename = ExifRename(
+        logging.getLogger(__name__), ".", exiftool_session=session, conversion_stage=stage
+    )
+    watcher = DirectoryWatcher()
+    if not use_inotify:
+        watcher.start = lambda on_change: False
+    runner = WatchRunner(
+        logging.getLogger(__name__),
+        exif_rename,
+        settle_seconds=0.05,
+        poll_interval=0.01,
+        watcher=watcher,
+    )
+    stop_event = asyncio.Event()
+    run_task = asyncio.create_task(runner.run(stop_event))
+
+    await _wait_for(lambda: runner.processed_count == 4)
+    (image_dir / "e.cr2").write_bytes(b"raw data")
+    await _wait_for(lambda: runner.processed_count == 5)
+    stop_event.set()
+    assert await run_task == 5  # noqa: S101
+
+    tree = file_tree(image_dir)
+    assert "canon_eosr5_dng/20240101_100005_canon_eosr5_unittest_trip.dng" in tree  # noqa: S101
+    assert "notes.txt" in tree  # noqa: S101
+    assert session.get_tags.call_count == 2  # noqa: S101